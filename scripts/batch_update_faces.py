@@ -4,15 +4,22 @@
 批次檢查 dataset 照片：
 1. 掃描來源資料夾 (預設 face-capture/dataset)
 2. 有臉 → good/、側臉 → sideface/、無臉 → bad/
-3. 可 --user 限制單一成員；--src 自訂來源路徑
+3. 可 --user 限制單一成員；--src 自訂來源路徑；--workers 平行行程數
 """
 
 import argparse
 import shutil
+import sys
 from pathlib import Path
 
 import cv2                               # ✅ 加入 cv2
-import face_recognition as fr            # ✅ 使用簡短別名 fr
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.facedb.enroll import EnrollEngine
+
+PROFILE_MODEL_PATH = "/usr/share/opencv4/haarcascades/haarcascade_profileface.xml"
 
 
 # ---------- CLI 參數 ----------
@@ -30,9 +37,37 @@ def parse_args():
         default=None,
         help="僅處理指定使用者（檔名前綴，例如 charlie）",
     )
+    p.add_argument("--workers", type=int, default=None, help="平行行程數（預設：CPU 核心數）")
     return p.parse_args()
 
 
+# ---------- worker：每個行程載入一次模型 ----------
+_fr = None
+_profile_cascade = None
+
+
+def init_worker(profile_model_path: str = PROFILE_MODEL_PATH):
+    global _fr, _profile_cascade
+    import face_recognition
+    _fr = face_recognition
+    # 側臉 Haar Cascade
+    _profile_cascade = cv2.CascadeClassifier(profile_model_path)
+    if _profile_cascade.empty():
+        raise RuntimeError("❌ 無法載入側臉模型 (haarcascade_profileface.xml)")
+
+
+def classify_image(img_path: Path) -> str:
+    """回傳 "good"（正臉）/ "side"（側臉）/ "bad"（無臉）"""
+    img = _fr.load_image_file(img_path)
+    if _fr.face_locations(img, model="hog"):
+        return "good"
+
+    # 若正面偵測不到 → 嘗試側臉
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    profiles = _profile_cascade.detectMultiScale(gray, 1.1, 5)
+    return "side" if len(profiles) else "bad"
+
+
 # ---------- 主流程 ----------
 def main():
     args = parse_args()
@@ -47,30 +82,22 @@ def main():
     bad_dir.mkdir(exist_ok=True)
     sideface_dir.mkdir(exist_ok=True)
 
-    # 側臉 Haar Cascade
-    profile_model_path = "/usr/share/opencv4/haarcascades/haarcascade_profileface.xml"
-    profile_cascade = cv2.CascadeClassifier(profile_model_path)
-    if profile_cascade.empty():
+    # 先在主行程確認模型存在，避免每個 worker 各自失敗
+    if cv2.CascadeClassifier(PROFILE_MODEL_PATH).empty():
         raise RuntimeError("❌ 無法載入側臉模型 (haarcascade_profileface.xml)")
 
     total_good = total_bad = total_side = 0
     pattern = "*.[jp][pn]g"
+    paths = [p for p in sorted(src.rglob(pattern)) if not args.user or p.name.startswith(args.user)]
 
-    for img_path in sorted(src.rglob(pattern)):
-        if args.user and not img_path.name.startswith(args.user):
-            continue
-
-        img = fr.load_image_file(img_path)
-        if fr.face_locations(img, model="hog"):
+    # 檔案複製在主行程做；偵測平行，完成順序不影響結果
+    engine = EnrollEngine(classify_image, workers=args.workers, ordered=False,
+                          initializer=init_worker, label="分類照片")
+    for img_path, kind in engine.map(paths):
+        if kind == "good":
             shutil.copy2(img_path, good_dir / img_path.name)
             total_good += 1
-            continue  # 已歸類為正臉，跳到下一張
-
-        # 若正面偵測不到 → 嘗試側臉
-        bgr = cv2.imread(str(img_path))
-        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-        profiles = profile_cascade.detectMultiScale(gray, 1.1, 5)
-        if len(profiles):
+        elif kind == "side":
             shutil.copy2(img_path, sideface_dir / img_path.name)
             print(f"👤 側臉 → {img_path.name}")
             total_side += 1
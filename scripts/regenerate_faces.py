@@ -2,43 +2,90 @@
 # scripts/regenerate_faces.py
 
 """
-從 face-capture/dataset 下所有人臉照片中萃取特徵並建立 faces.pkl
+從 face-capture/dataset 下所有人臉照片中萃取特徵並建立 faces.gallery / faces.pkl
+
+預設為增量模式：依 faces.manifest.json（路徑、大小、mtime、sha1、encoder 版本）
+只萃取新增或修改過的照片，刪除的照片自動移除；沒有變動時不會載入 face_recognition。
+    python scripts/regenerate_faces.py            # 增量
+    python scripts/regenerate_faces.py --full     # 全部重新萃取
+    python scripts/regenerate_faces.py --workers 8
 """
 
-import face_recognition as fr
+import argparse
+from functools import partial
+import os
 from pathlib import Path
 import pickle
 import sys
+import time
 
-DATASET_DIR = Path(__file__).resolve().parent.parent / "face-capture" / "dataset"
-PKL_PATH     = DATASET_DIR / "faces.pkl"
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
 
-def build_database(dataset_dir: Path, output_path: Path):
-    encodings = []
-    names = []
+from src.facedb import enroll
+from src.facedb.gallery import GALLERY_SUFFIX, Gallery, atomic_writer
+from src.facedb.manifest import update_gallery
+
+DATASET_DIR = ROOT / "face-capture" / "dataset"
+PKL_PATH     = DATASET_DIR / "faces.pkl"
 
-    print(f"📁 掃描資料夾：{dataset_dir}")
-    for img_path in sorted(dataset_dir.rglob("*.[jp][pn]g")):
-        name = img_path.stem.split("_")[0]
-        img = fr.load_image_file(img_path)
-        face_encs = fr.face_encodings(img)
 
-        if face_encs:
-            encodings.append(face_encs[0])
-            names.append(name)
-            print(f"  ✅ {img_path.name} → {name}")
+def encode_images(paths, workers=None):
+    """平行萃取第一張臉的特徵（依輸入順序）；沒有臉為 None"""
+    results = []
+    for img_path, vec in enroll.encode_images(paths, workers=workers):
+        if vec is not None:
+            print(f"  ✅ {img_path.name} → {img_path.stem.split('_')[0]}")
         else:
             print(f"  ⚠️ 無法辨識臉：{img_path.name}")
+        results.append(vec)
+    return results
 
-    if not encodings:
+
+def export_pkl(gallery_path: Path, output_path: Path) -> None:
+    """給舊程式用的 faces.pkl；mtime 對齊 gallery，load_db 仍會優先用 gallery"""
+    g = Gallery(gallery_path)
+    with atomic_writer(output_path) as f:
+        pickle.dump({"encodings": list(np.asarray(g.embeddings, dtype=np.float64)),
+                     "names": g.names}, f)
+    st = gallery_path.stat()
+    os.utime(output_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def build_database(dataset_dir: Path, output_path: Path, full: bool = False, write_pkl: bool = True,
+                   workers=None, dtype=None):
+    gallery_path = output_path.with_suffix(GALLERY_SUFFIX)
+    print(f"📁 掃描資料夾：{dataset_dir}（{'全量' if full else '增量'}）")
+    t0 = time.perf_counter()
+    stats = update_gallery(dataset_dir, gallery_path, partial(encode_images, workers=workers), full=full,
+                          dtype=dtype)
+    elapsed = time.perf_counter() - t0
+
+    if not stats.rows:
         print("❌ 沒有成功擷取任何人臉特徵，請檢查資料集！")
         sys.exit(1)
+    if not stats.written:
+        print(f"✅ 沒有變動（{stats.total} 張照片，{stats.rows} 筆特徵，{elapsed * 1000:.0f} ms）")
+        return
 
-    with open(output_path, "wb") as f:
-        pickle.dump({"encodings": encodings, "names": names}, f)
+    if write_pkl:
+        export_pkl(gallery_path, output_path)
+    print(f"\n✅ 已儲存特徵庫：{gallery_path}（共 {stats.rows} 筆）")
+    print(f"   萃取 {stats.encoded}（無臉 {stats.no_face}）、沿用 {stats.reused}、"
+          f"移除 {stats.removed}，耗時 {elapsed:.1f} s")
 
-    print(f"\n✅ 已儲存特徵庫：{output_path}（共 {len(encodings)} 筆）")
 
 if __name__ == "__main__":
-    build_database(DATASET_DIR, PKL_PATH)
-
+    parser = argparse.ArgumentParser(description="建立 / 增量更新人臉特徵庫")
+    parser.add_argument("--dataset", type=Path, default=DATASET_DIR, help="照片資料夾")
+    parser.add_argument("--output", type=Path, default=PKL_PATH, help="faces.pkl 路徑（gallery 與 manifest 放同目錄）")
+    parser.add_argument("--full", action="store_true", help="忽略 manifest，全部重新萃取")
+    parser.add_argument("--no-pkl", action="store_true", help="不輸出相容用的 faces.pkl")
+    parser.add_argument("--workers", type=int, default=None, help="平行行程數（預設：CPU 核心數）")
+    parser.add_argument("--dtype", choices=("float32", "float16", "int8"), default=None,
+                        help="特徵格式（預設：沿用既有 faces.gallery）")
+    args = parser.parse_args()
+    build_database(args.dataset, args.output, full=args.full, write_pkl=not args.no_pkl,
+                   workers=args.workers, dtype=args.dtype)
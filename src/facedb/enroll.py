@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""enroll.py – 多行程平行萃取人臉特徵（regenerate_faces / batch_update_faces / face_encoder 共用）
+
+    engine = EnrollEngine(encode_first_face, workers=8, initializer=init_face_recognition)
+    for path, vec in engine.map(paths):          # 依輸入順序串流回傳
+        ...
+
+• ProcessPoolExecutor；每個 worker 只在啟動時跑一次 initializer（載入 dlib 模型等）
+• 工作以 chunk 為單位送出，只傳路徑，影像在 worker 內解碼
+• 同時在途的 chunk 數有上限（max_inflight），記憶體用量與資料集大小無關
+• ordered=True 依輸入順序回傳；False 則誰先完成先回傳
+• workers=1 直接在本行程執行（除錯 / 測試用），行為相同
+• 預設用 spawn 啟動 worker，避免 fork 已載入 CUDA / OpenCV 執行緒的行程
+"""
+from __future__ import annotations
+
+import itertools
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+import numpy as np
+
+
+def default_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:                      # macOS / Windows
+        return os.cpu_count() or 1
+
+
+# ------------------------- worker 端 ------------------------- #
+_TASK: Callable[[Any], Any] | None = None
+
+
+def _worker_init(task, initializer, initargs) -> None:
+    global _TASK
+    _TASK = task
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_chunk(chunk: list) -> list:
+    return [_TASK(item) for item in chunk]
+
+
+# ------------------------- 進度 ------------------------- #
+class Progress:
+    """每 interval 秒印一次進度與吞吐量"""
+
+    def __init__(self, total: int | None = None, interval: float = 2.0, label: str = "處理"):
+        self.total = total
+        self.interval = interval
+        self.label = label
+        self.done = 0
+        self.t0 = self._last = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    @property
+    def rate(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def update(self, n: int = 1) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if self.interval and now - self._last >= self.interval:
+            self._last = now
+            print(f"⏳ {self.label} {self}")
+
+    def __str__(self) -> str:
+        total = f"/{self.total}" if self.total is not None else ""
+        return f"{self.done}{total} 張，{self.rate:.1f} 張/s，{self.elapsed:.1f} s"
+
+
+# ------------------------- 引擎 ------------------------- #
+class EnrollEngine:
+    """把 task(item) 平行套用到 items 上。
+
+    task        ─ 模組層級函式（需可 pickle），在 worker 內對每個 item 呼叫
+    workers     ─ 行程數；None＝可用 CPU 數，1＝本行程直接執行
+    chunksize   ─ 每次送給 worker 的 item 數
+    max_inflight─ 同時在途的 chunk 上限；None＝workers × 2
+    initializer ─ 每個 worker 啟動時呼叫一次 initializer(*initargs)
+    """
+
+    def __init__(self, task: Callable[[Any], Any], workers: int | None = None, chunksize: int = 8,
+                 max_inflight: int | None = None, ordered: bool = True,
+                 initializer: Callable | None = None, initargs: tuple = (),
+                 progress: bool | float = True, label: str = "處理", mp_context: str = "spawn"):
+        self.task = task
+        self.workers = max(1, int(workers or default_workers()))
+        self.chunksize = max(1, int(chunksize))
+        self.max_inflight = max(1, int(max_inflight or self.workers * 2))
+        self.ordered = ordered
+        self.initializer = initializer
+        self.initargs = initargs
+        self.interval = 2.0 if progress is True else float(progress or 0)
+        self.label = label
+        self.mp_context = mp_context
+        self.progress: Progress | None = None
+
+    def map(self, items: Iterable) -> Iterator[tuple[Any, Any]]:
+        """串流回傳 (item, task(item))"""
+        total = len(items) if hasattr(items, "__len__") else None
+        self.progress = Progress(total, self.interval, self.label)
+        if self.workers == 1:
+            yield from self._map_local(items)
+        else:
+            yield from self._map_pool(iter(items))
+        if self.interval:
+            print(f"✅ {self.label}完成：{self.progress}（{self.workers} workers）")
+
+    def _map_local(self, items: Iterable) -> Iterator[tuple[Any, Any]]:
+        _worker_init(self.task, self.initializer, self.initargs)
+        for item in items:
+            result = _TASK(item)
+            self.progress.update()
+            yield item, result
+
+    def _map_pool(self, items: Iterator) -> Iterator[tuple[Any, Any]]:
+        with ProcessPoolExecutor(self.workers, mp_context=mp.get_context(self.mp_context),
+                                 initializer=_worker_init,
+                                 initargs=(self.task, self.initializer, self.initargs)) as pool:
+            inflight: deque = deque()
+
+            def fill() -> None:
+                while len(inflight) < self.max_inflight:
+                    chunk = list(itertools.islice(items, self.chunksize))
+                    if not chunk:
+                        return
+                    inflight.append((chunk, pool.submit(_run_chunk, chunk)))
+
+            fill()
+            while inflight:
+                if self.ordered:
+                    chunk, fut = inflight.popleft()
+                else:
+                    done, _ = wait([f for _, f in inflight], return_when=FIRST_COMPLETED)
+                    chunk, fut = next(e for e in inflight if e[1] in done)
+                    inflight.remove((chunk, fut))
+                results = fut.result()
+                fill()                              # 先補上工作，再交給呼叫端處理結果
+                for item, result in zip(chunk, results):
+                    self.progress.update()
+                    yield item, result
+
+
+# ------------------------- 人臉萃取 task ------------------------- #
+_fr = None
+
+
+def init_face_recognition() -> None:
+    """worker initializer：載入 face_recognition（dlib 模型）一次"""
+    global _fr
+    import face_recognition
+    _fr = face_recognition
+
+
+def encode_first_face(path) -> np.ndarray | None:
+    """回傳照片中第一張臉的 128 維特徵；沒有臉回傳 None"""
+    encs = _fr.face_encodings(_fr.load_image_file(path))
+    return encs[0] if encs else None
+
+
+def encode_images(paths: Iterable[Path], workers: int | None = None, ordered: bool = True,
+                  **kwargs) -> Iterator[tuple[Path, np.ndarray | None]]:
+    """平行萃取 paths 的特徵，串流回傳 (path, 特徵或 None)"""
+    engine = EnrollEngine(encode_first_face, workers=workers, ordered=ordered,
+                          initializer=init_face_recognition, label="萃取特徵", **kwargs)
+    return engine.map(paths)
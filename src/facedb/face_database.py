@@ -1,21 +1,129 @@
 #!/usr/bin/env python3
 # jetsoncv.face_database
 
+from __future__ import annotations
+
 from pathlib import Path
 import pickle
 
+from src.facedb.face_matcher import FaceMatcher
+from src.facedb.gallery import GALLERY_SUFFIX, Gallery
+from src.facedb.index import INDEX_SUFFIX, load_index
+from src.facedb.prototypes import PROTO_SUFFIX, PrototypeMatcher, load_prototypes
+from src.facedb.shards import ShardedGallery
+from src.jetsoncv.startup import stage
+
 # 專案根目錄： .../test/
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 
 # faces.pkl 預設路徑
 DEFAULT_PKL = PROJECT_ROOT / "face-capture" / "dataset" / "faces.pkl"
 
+# 二進位特徵庫預設路徑（與 faces.pkl 同目錄）
+DEFAULT_GALLERY = DEFAULT_PKL.with_suffix(GALLERY_SUFFIX)
+
+# 多據點部署：切分後的 shard 目錄（shards.split_gallery）
+DEFAULT_SHARDS = DEFAULT_PKL.parent / "shards"
+
+
+def _gallery_for(path: Path) -> Path | None:
+    """path 本身是 .gallery，或同目錄有不比 faces.pkl 舊的 .gallery 時回傳它"""
+    if path.suffix == GALLERY_SUFFIX:
+        return path
+    gal = path.with_suffix(GALLERY_SUFFIX)
+    if gal.exists() and (not path.exists() or gal.stat().st_mtime >= path.stat().st_mtime):
+        return gal
+    return None
+
+
+def index_path(path: Path = DEFAULT_PKL) -> Path:
+    """特徵庫對應的索引檔（faces.pkl / faces.gallery → faces.index.npz）"""
+    return Path(path).with_suffix(INDEX_SUFFIX)
+
+
+def prototypes_path(path: Path = DEFAULT_PKL) -> Path:
+    """特徵庫對應的原型檔（faces.pkl / faces.gallery → faces.protos.npz）"""
+    return Path(path).with_suffix(PROTO_SUFFIX)
+
+
+def with_prototypes(matcher, path: Path = DEFAULT_PKL):
+    """原型檔存在且與特徵庫一致時回傳 PrototypeMatcher（先比原型、接近門檻才逐張比），否則原樣回傳"""
+    proto = prototypes_path(path)
+    if not proto.exists():
+        return matcher
+    try:
+        protos = load_prototypes(proto, matcher.gallery)
+    except ValueError as e:
+        print(f"⚠️ 略過原型：{e}")
+        return matcher
+    print(f"✅ 使用原型比對：{len(matcher)} 筆特徵 → {len(protos)} 個原型")
+    return PrototypeMatcher(protos, matcher)
+
+
+def attach_index(matcher, path: Path = DEFAULT_PKL, nprobe: int | None = None) -> bool:
+    """索引檔存在且與特徵庫一致時讓 matcher.match() 改走索引；回傳是否已套用"""
+    idx = index_path(path)
+    if not idx.exists():
+        return False
+    try:
+        with stage("index load"):
+            matcher.set_index(load_index(idx, matcher.gallery, nprobe))
+    except ValueError as e:
+        print(f"⚠️ 略過索引：{e}")
+        return False
+    print(f"✅ 使用 {matcher.index.kind} 索引：{idx.name}")
+    return True
+
+
+def watched_files(path: Path = DEFAULT_PKL) -> list[Path]:
+    """熱重載要監看的檔案：faces.pkl / .gallery / 索引 / 原型"""
+    path = Path(path)
+    return [path.with_suffix(".pkl"), path.with_suffix(GALLERY_SUFFIX), index_path(path), prototypes_path(path)]
+
+
+def load_matcher(path: Path = DEFAULT_PKL, tolerance: float = 0.45, prototypes: bool = False):
+    """load_db → FaceMatcher，有索引檔時一併套用。
+
+    prototypes=True 時有 faces.protos.npz 就先比原型；是否划算取決於特徵庫，
+    先用 `python -m src.facedb.prototypes eval` 量過 speedup 再開。
+    """
+    matcher = FaceMatcher.from_db(load_db(path), tolerance=tolerance)   # 有 .gallery 時以 memmap 開啟
+    attach_index(matcher, path)                  # 有 faces.index.npz（大型特徵庫）時改走近似索引
+    return with_prototypes(matcher, path) if prototypes else matcher
+
+
+def open_shards(directory: Path = DEFAULT_SHARDS, allow=None, tolerance: float = 0.45,
+                watch: float | None = 2.0) -> ShardedGallery:
+    """開啟 shard 目錄（只對應 allow 允許的 shard）；watch 秒數給定時背景熱重載"""
+    with stage("shards open"):
+        sg = ShardedGallery(directory, allow, tolerance)
+    if watch:
+        sg.watch(watch)
+    print(f"✅ 使用 shard：{', '.join(sg.shards)}（{directory}）")
+    return sg
+
+
+def open_gallery(path: Path = DEFAULT_GALLERY) -> Gallery:
+    """以 memmap 開啟 .gallery 特徵庫"""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"{path} 不存在，請先建立特徵庫或用 gallery.convert_pkl 轉換 faces.pkl")
+    return Gallery(path)
+
 
 def load_db(pkl_path: Path = DEFAULT_PKL):
-    """載入 faces.pkl，回傳 dict：{'encodings': …, 'names': …}"""
-    if not pkl_path.exists():
-        raise FileNotFoundError(f"{pkl_path} 不存在，請先建立特徵庫")
-    with open(pkl_path, "rb") as f:
-        return pickle.load(f)
+    """載入特徵庫，回傳 dict：{'encodings': …, 'names': …}
 
+    優先以 memmap 開啟同目錄的 .gallery（此時另附 'gallery' 鍵，encodings 為 (N,128) 唯讀陣列）；
+    沒有 .gallery 或 faces.pkl 較新時才 unpickle。
+    """
+    pkl_path = Path(pkl_path)
+    with stage("gallery load"):
+        gal = _gallery_for(pkl_path)
+        if gal is not None:
+            return open_gallery(gal).as_db()
+        if not pkl_path.exists():
+            raise FileNotFoundError(f"{pkl_path} 不存在，請先建立特徵庫")
+        with open(pkl_path, "rb") as f:
+            return pickle.load(f)
 
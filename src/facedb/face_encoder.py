@@ -1,83 +1,138 @@
 #!/usr/bin/env python3
 # file: face_recognizer.py
 # 功能：即時辨識多張臉，標示姓名
+"""
+FaceRecognizer：延遲初始化的辨識服務
+
+• import 本模組不做任何事（不讀照片、不載入 dlib），可放心被 smoke_imports / 服務啟動載入
+• 第一次呼叫 recognize() / matcher 時才開啟預先建好的特徵庫（faces.gallery，memmap），
+  並在第一次需要偵測 / 萃取時才 import face_recognition
+• 特徵庫由 scripts/regenerate_faces.py 建立；資料夾可用參數或環境變數 FACE_DATASET_DIR 指定
+"""
+from __future__ import annotations
 
-import glob
 import os
+import threading
+from functools import lru_cache
 from pathlib import Path
 
-import cv2
-import face_recognition as fr
-
-# === 1. 載入已知人臉特徵 ===
-DATA_DIR = Path("/home/user/test/face-capture/dataset")
-known_encodings = []
-known_names     = []
-
-print(f"⏳ 讀取資料夾: {DATA_DIR}")
-# 遞迴抓所有 jpg / png
-for img_path in DATA_DIR.rglob("*.[jp][pn]g"):           # 支援 jpg / png
-    name = img_path.stem.split("_")[0]      # 取檔名前綴
-    img  = fr.load_image_file(img_path)
-    encodings = fr.face_encodings(img)
-    if len(encodings):                                    # 確保有偵測到臉
-        known_encodings.append(encodings[0])
-        known_names.append(name)
-        print(f"  ✔ 讀取 {img_path} → {name}")
-    else:
-        print(f"  ⚠ 跳過 {img_path}（偵測不到臉）")
-
-if not known_encodings:
-    raise SystemExit("❌ 沒有任何有效的臉部特徵可供比對，請檢查資料夾")
+from src.facedb import face_database
+from src.facedb.face_matcher import FaceMatcher, Match
+
+DATA_DIR = Path(os.environ.get("FACE_DATASET_DIR", face_database.DEFAULT_PKL.parent))
+
+
+@lru_cache(maxsize=1)
+def _fr():
+    import face_recognition
+    return face_recognition
+
+
+class FaceRecognizer:
+    """偵測 + 萃取 + 比對；特徵庫與模型都在第一次使用時才載入。
+
+    dataset_dir ─ 放 faces.gallery / faces.pkl 的資料夾
+    tolerance   ─ 越低越嚴格 (0.4~0.6 常用)
+    model       ─ "hog"（節能）或 "cnn"（更準但慢）
+    """
+
+    def __init__(self, dataset_dir: Path | str = DATA_DIR, tolerance: float = 0.48, model: str = "hog"):
+        self.db_path = Path(dataset_dir) / face_database.DEFAULT_PKL.name
+        self.tolerance = tolerance
+        self.model = model
+        self._matcher: FaceMatcher | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._matcher is not None
+
+    @property
+    def matcher(self) -> FaceMatcher:
+        if self._matcher is None:
+            with self._lock:
+                if self._matcher is None:
+                    # 有 .gallery 時以 memmap 開啟；有索引檔才會用
+                    self._matcher = face_database.load_matcher(self.db_path, self.tolerance)
+                    print(f"✅ 特徵庫載入完成：{len(self._matcher)} 筆特徵（{self.db_path.parent}）")
+        return self._matcher
+
+    def detect(self, rgb, scale: float = 1.0) -> list[tuple[int, int, int, int]]:
+        """偵測人臉，回傳原圖座標的 (top, right, bottom, left)；scale < 1 時先縮小再偵測"""
+        fr = _fr()
+        if scale == 1.0:
+            return fr.face_locations(rgb, model=self.model)
+        import cv2
+        small = cv2.resize(rgb, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return [tuple(int(round(v / scale)) for v in box)
+                for box in fr.face_locations(small, model=self.model)]
+
+    def identify(self, rgb, boxes) -> list[Match]:
+        """萃取 boxes 的特徵並一次比對"""
+        if not boxes:
+            return []
+        return self.matcher.match(_fr().face_encodings(rgb, boxes))
+
+    def recognize(self, rgb, scale: float = 1.0) -> list[tuple[tuple[int, int, int, int], Match]]:
+        """RGB 影像 → [((top, right, bottom, left), Match), …]"""
+        boxes = self.detect(rgb, scale)
+        return list(zip(boxes, self.identify(rgb, boxes)))
+
 
 if __name__ == "__main__":
-    # === 2. 開啟攝影機 ===
+    import argparse
+
+    import cv2
+
+    from src.gui_main.scheduler import AdaptiveScheduler
+
+    parser = argparse.ArgumentParser(description="即時辨識多張臉")
+    parser.add_argument("--dataset", type=Path, default=DATA_DIR, help="特徵庫所在資料夾")
+    parser.add_argument("--tolerance", type=float, default=0.48)
+    parser.add_argument("--fps", type=float, default=20.0, help="目標顯示 FPS")
+    parser.add_argument("--max-latency-ms", type=float, default=150.0, help="辨識結果最大延遲")
+    args = parser.parse_args()
+
+    recognizer = FaceRecognizer(args.dataset, tolerance=args.tolerance)
+
+    # === 開啟攝影機 ===
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         raise SystemExit("❌ 無法開啟 /dev/video0")
 
     print("🟢 辨識開始：按 q 離開")
-    PROCESS_EVERY_N_FRAMES = 2   # 每 2 幀做一次比對，可提高 FPS
-    frame_idx = 0
+    # 依實測耗時決定每幾幀比對一次、偵測縮放，維持目標 FPS
+    sched = AdaptiveScheduler(args.fps, args.max_latency_ms)
+    results = []
 
     while True:
         ret, frame = cap.read()
         if not ret:
             break
 
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)          # face_recognition 用 RGB
-        names  = []
-        boxes  = []
-
-        # === 3. 每 N 幀做一次比對 ===
-        if frame_idx % PROCESS_EVERY_N_FRAMES == 0:
-            boxes  = fr.face_locations(rgb, model="hog")      # hog 節能，cnn 更準但慢
-            encods = fr.face_encodings(rgb, boxes)
-
-            names = []
-            for enc in encods:
-                # 與所有已知臉比對，取最小距離
-                matches  = fr.compare_faces(known_encodings, enc, tolerance=0.48)
-                # tolerance 越低越嚴格 (0.4~0.6 常用)
-                name = "Unknown"
-
-                # 取距離最近者
-                distances = fr.face_distance(known_encodings, enc)
-                best_match_idx = distances.argmin() if len(distances) else None
-                if best_match_idx is not None and matches[best_match_idx]:
-                    name = known_names[best_match_idx]
-                names.append(name)
-
-        # === 4. 畫框 + 姓名 ===
-        for ((top, right, bottom, left), name) in zip(boxes, names):
+        # === 排程器決定這幀要不要比對 ===
+        plan = sched.begin_frame()
+        if plan.detect:
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)      # face_recognition 用 RGB
+            with sched.measure("detect", scale=plan.scale):
+                boxes = recognizer.detect(rgb, plan.scale)
+            # 超過萃取預算時只萃取最大的幾張臉（離鏡頭最近）
+            boxes = sorted(boxes, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]), reverse=True)
+            boxes = boxes[:plan.encode_budget]
+            with sched.measure("encode", count=len(boxes)):
+                results = list(zip(boxes, recognizer.identify(rgb, boxes)))
+
+        # === 畫框 + 姓名 ===
+        for (top, right, bottom, left), m in results:
             cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
             cv2.rectangle(frame, (left, bottom - 22), (right, bottom), (0, 255, 0), cv2.FILLED)
-            cv2.putText(frame, name, (left + 4, bottom - 4),
+            cv2.putText(frame, m.name, (left + 4, bottom - 4),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
 
         cv2.imshow("Face Recognition", frame)
-        frame_idx += 1
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        key = cv2.waitKey(1) & 0xFF
+        sched.end_frame()
+        if key == ord('q'):
             break
 
     cap.release()
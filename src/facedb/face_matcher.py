@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""face_matcher.py – 向量化的人臉特徵比對
+
+    matcher = FaceMatcher.from_db(face_database.load_db(), tolerance=0.45)
+    for m in matcher.match(face_vecs):            # 一幀內所有臉一次比完
+        print(m.name, m.distance, m.margin)
+
+• 特徵庫存成一塊連續的 float32 (N,128) 矩陣，並預先算好每筆的平方範數
+• 距離用 |q|² + |g|² − 2·q·g 一次矩陣乘法算出 (M,N)，與 face_recognition.face_distance
+  的歐氏距離相同
+• 特徵依人名排序後連續存放，np.minimum.reduceat 一次取得「每個人」的最近距離，
+  best / second-best margin 與 top-k 都以人為單位（同一人多張照片不會互相擠掉）
+• set_index(index.IVFIndex…)：特徵庫很大時 match() 改由索引取前 candidates 筆候選，
+  不再掃描全部特徵（distances / identity_distances / topk 仍為精確全掃描）
+• from_gallery 遇到有量化特徵的 .gallery（int8 / float16）時自動掛上 quant.QuantizedIndex：
+  掃 codes 取候選、以 float32 重排
+"""
+from __future__ import annotations
+
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+UNKNOWN = "Unknown"
+
+
+class Match(NamedTuple):
+    name: str             # 通過門檻的人名，否則為 UNKNOWN
+    best: str             # 最近的人名（不論是否通過門檻）
+    distance: float       # 與 best 的最近距離
+    margin: float         # 第二近的人 − 最近的人；只有一個人時為 inf
+
+    @property
+    def known(self) -> bool:
+        return self.name != UNKNOWN
+
+
+class FaceMatcher:
+    """以矩陣運算比對人臉特徵。
+
+    encodings  ─ (N,D) 特徵，或 N 個 (D,) 向量的 list（faces.pkl 的格式）
+    names      ─ N 個人名
+    tolerance  ─ 距離 ≤ tolerance 才算認得（同 face_recognition.compare_faces）
+    min_margin ─ 另外要求與第二近的人至少差這麼多，0＝不檢查
+    """
+
+    def __init__(self, encodings, names: Sequence[str], tolerance: float = 0.45,
+                 min_margin: float = 0.0):
+        enc = np.asarray(encodings, dtype=np.float32)
+        if enc.ndim != 2 or len(enc) == 0:
+            raise ValueError(f"特徵庫需為非空的 (N,D) 陣列，收到 shape {enc.shape}")
+        if len(names) != len(enc):
+            raise ValueError(f"encodings 有 {len(enc)} 筆，names 有 {len(names)} 筆")
+        self.tolerance = float(tolerance)
+        self.min_margin = float(min_margin)
+
+        # 依人名排序，讓同一人的特徵連續存放
+        identities, labels = np.unique(np.asarray(names, dtype=object).astype(str),
+                                       return_inverse=True)
+        order = np.argsort(labels, kind="stable")
+        gallery = np.ascontiguousarray(enc[order])
+        self._bind(gallery, labels[order], identities,
+                   np.einsum("nd,nd->n", gallery, gallery))
+
+    def _bind(self, gallery: np.ndarray, labels: np.ndarray, identities, sq_norms: np.ndarray) -> None:
+        self.identities = np.asarray(identities, dtype=str)
+        self.labels = labels
+        self.gallery = gallery
+        self.sq_norms = sq_norms
+        self._starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        self.index = None
+        self.candidates = 32
+
+    @classmethod
+    def from_gallery(cls, gallery, tolerance: float = 0.45, min_margin: float = 0.0) -> "FaceMatcher":
+        """直接使用 gallery.Gallery 的 memmap（已依人名排序、已有平方範數），不複製"""
+        if not len(gallery):
+            raise ValueError(f"{gallery.path} 沒有任何特徵")
+        self = cls.__new__(cls)
+        self.tolerance = float(tolerance)
+        self.min_margin = float(min_margin)
+        self._bind(gallery.embeddings, gallery.labels, gallery.identities, gallery.sq_norms)
+        quantized = gallery.quantized_index()
+        if quantized is not None:
+            self.set_index(quantized)
+        return self
+
+    @classmethod
+    def from_db(cls, db: dict, **kwargs) -> "FaceMatcher":
+        """由 face_database.load_db() 的 {'encodings','names'} 建立；來源是 gallery 時不複製"""
+        if db.get("gallery") is not None:
+            return cls.from_gallery(db["gallery"], **kwargs)
+        return cls(db["encodings"], db["names"], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.gallery)
+
+    @property
+    def dim(self) -> int:
+        return self.gallery.shape[1]
+
+    # ------------------------- 距離 ------------------------- #
+    def _queries(self, queries) -> np.ndarray:
+        q = np.asarray(queries, dtype=np.float32)
+        if q.size == 0:                          # 這幀沒有臉
+            return np.empty((0, self.dim), np.float32)
+        if q.ndim == 1:
+            q = q[None]
+        if q.ndim != 2 or q.shape[1] != self.dim:
+            raise ValueError(f"查詢特徵需為 (M,{self.dim})，收到 shape {q.shape}")
+        return q
+
+    def distances(self, queries) -> np.ndarray:
+        """(M,N) 歐氏距離；欄位順序為 self.gallery（依人名排序後）的順序"""
+        q = self._queries(queries)
+        d2 = q @ self.gallery.T
+        d2 *= -2.0
+        d2 += self.sq_norms
+        d2 += np.einsum("md,md->m", q, q)[:, None]
+        np.maximum(d2, 0.0, out=d2)              # 抵銷浮點誤差造成的負值
+        return np.sqrt(d2, out=d2)
+
+    def identity_distances(self, queries) -> np.ndarray:
+        """(M,K) 每個查詢與每個人（self.identities）的最近距離"""
+        d = self.distances(queries)
+        if not len(d):
+            return np.empty((0, len(self.identities)), np.float32)
+        return np.minimum.reduceat(d, self._starts, axis=1)
+
+    # ------------------------- 索引 ------------------------- #
+    def set_index(self, index, candidates: int = 32) -> None:
+        """match() 改走 index（須以 self.gallery 的順序建立）；None＝回到全掃描。
+
+        candidates ─ 每個查詢從索引取幾筆候選，用來找最近的人與第二近的人
+        """
+        if index is not None and (len(index) != len(self) or index.dim != self.dim):
+            raise ValueError(f"索引有 {len(index)} 筆 / {index.dim} 維，特徵庫為 {len(self)} 筆 / {self.dim} 維")
+        self.index = index
+        self.candidates = max(2, int(candidates))
+
+    def _best_two_indexed(self, q: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """由索引候選求 (最近的人, 距離, margin)。候選中沒有第二個人時，
+        margin 取「最後一筆候選距離 − 最近距離」——只有 index.exact 時這才是真正 margin 的下界。
+        近似索引（IVF / 量化）沒掃到的特徵可能更近，margin 只是近似值。min_margin > 0 時，
+        距離在門檻內而 margin 不確定的列（近似索引，或只拿到下界且未達 min_margin）改以逐張比對重算"""
+        d, ids = self.index.search(q, self.candidates)
+        lab = np.where(ids >= 0, self.labels[np.maximum(ids, 0)], -1)
+        best = lab[:, 0]
+        best_d = d[:, 0]
+        other = (lab != best[:, None]) & (lab >= 0)
+        has = other.any(axis=1)
+        second = np.where(has, d[np.arange(len(d)), other.argmax(axis=1)], d[:, -1])
+        if len(self.identities) == 1:
+            second = np.full(len(d), np.inf, np.float32)
+        margin = second - best_d
+        if self.min_margin > 0 and len(self.identities) > 1:
+            unsure = ~has & (margin < self.min_margin) if self.index.exact else np.ones(len(d), bool)
+            rows = np.flatnonzero((best_d <= self.tolerance) & unsure)
+            if len(rows):
+                best, best_d, margin = best.copy(), best_d.copy(), margin.copy()
+                best[rows], best_d[rows], margin[rows] = self._best_two(self.identity_distances(q[rows]))
+        return best, best_d, margin
+
+    @staticmethod
+    def _best_two(d: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """每人最近距離 (M,K) → (最近的人, 距離, 與第二近的人的差距)"""
+        rows = np.arange(len(d))
+        if d.shape[1] > 1:
+            two = np.argpartition(d, 1, axis=1)[:, :2]
+            two_d = d[rows[:, None], two]
+            swap = two_d[:, 1] < two_d[:, 0]
+            best = np.where(swap, two[:, 1], two[:, 0])
+            best_d = two_d.min(axis=1)
+            return best, best_d, two_d.max(axis=1) - best_d
+        return np.zeros(len(d), np.intp), d[:, 0], np.full(len(d), np.inf, np.float32)
+
+    # ------------------------- 比對 ------------------------- #
+    def match(self, queries) -> list[Match]:
+        """一幀內所有臉一次比對，回傳與查詢同順序的 Match"""
+        if self.index is not None:
+            q = self._queries(queries)
+            if not len(q):
+                return []
+            best, best_d, margin = self._best_two_indexed(q)
+            return self._matches(best, best_d, margin)
+        d = self.identity_distances(queries)
+        if not len(d):
+            return []
+        return self._matches(*self._best_two(d))
+
+    def _matches(self, best: np.ndarray, best_d: np.ndarray, margin: np.ndarray) -> list[Match]:
+        ok = (best_d <= self.tolerance) & (margin >= self.min_margin)
+
+        return [Match(str(self.identities[b]) if k else UNKNOWN, str(self.identities[b]), float(bd), float(mg))
+                for b, bd, mg, k in zip(best, best_d, margin, ok)]
+
+    def topk(self, queries, k: int = 5) -> list[list[tuple[str, float]]]:
+        """每個查詢回傳最近的 k 個人 [(name, distance), …]，由近到遠"""
+        d = self.identity_distances(queries)
+        k = min(int(k), d.shape[1])
+        if not len(d) or k <= 0:
+            return [[] for _ in range(len(d))]
+        part = np.argpartition(d, k - 1, axis=1)[:, :k] if k < d.shape[1] else \
+            np.broadcast_to(np.arange(d.shape[1]), d.shape)
+        part_d = np.take_along_axis(d, part, axis=1)
+        order = np.argsort(part_d, axis=1, kind="stable")
+        idx = np.take_along_axis(part, order, axis=1)
+        dist = np.take_along_axis(part_d, order, axis=1)
+        return [[(str(self.identities[i]), float(v)) for i, v in zip(ri, rd)] for ri, rd in zip(idx, dist)]
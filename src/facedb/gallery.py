@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""gallery.py – 以 np.memmap 開啟的二進位人臉特徵庫（取代 faces.pkl）
+
+檔案格式（little-endian，所有區段 64 bytes 對齊）
+────────────────────────────────────────────────
+    preamble   "FGAL" | version u32 | header_len u32
+    header     UTF-8 JSON：dim / count / identities / 各區段 [offset, nbytes]
+               （offset 相對於 header 之後、對齊過的資料起點）
+    embeddings float32 (count, dim)，依人名排序後連續存放
+    sq_norms   float32 (count,)      每筆特徵的平方範數，比對時不必重算
+    labels     int32   (count,)      指向 identities 的索引
+    sources    UTF-8 JSON list       每筆特徵的來源照片（相對路徑），用到才解析
+    codes      float16 / int8 (count, dim)   dtype 非 float32 時才有（version 2），掃描用
+    scale      float32 (dim,)        int8 的逐維縮放
+    code_sq    float32 (count,)      還原後特徵的平方範數
+
+• 開啟只讀 preamble + header，特徵矩陣直接 mmap，啟動時間與筆數無關
+• 多個行程開同一個檔共用 OS page cache，不會各自複製一份
+• 寫入先寫暫存檔再 os.replace，讀的一方永遠看到完整的舊檔或新檔
+• dtype="int8" / "float16" 另存量化特徵（quant.py），比對只掃 codes，
+  float32 特徵留在磁碟上、只有重排到的列才會讀進記憶體
+
+    python -m src.facedb.gallery convert face-capture/dataset/faces.pkl --dtype int8
+    python -m src.facedb.gallery info    face-capture/dataset/faces.gallery
+"""
+from __future__ import annotations
+
+import json
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from functools import cached_property
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from src.facedb.quant import QUANT_DTYPES, QuantizedIndex, code_sq_norms, quantize
+
+MAGIC = b"FGAL"
+VERSION = 2
+_READABLE = (1, 2)              # version 1＝只有 float32 特徵
+GALLERY_SUFFIX = ".gallery"
+
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGN = 64
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+# ------------------------- 寫入 ------------------------- #
+@contextmanager
+def atomic_writer(path):
+    """寫到同目錄的暫存檔，成功後 os.replace 成 path；失敗則刪掉暫存檔"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def write_gallery(path, encodings, names: Sequence[str],
+                  sources: Sequence[str] | None = None, dtype: str = "float32") -> Path:
+    """寫出 gallery 檔（原子替換），回傳路徑；dtype 為 float16 / int8 時另存量化特徵"""
+    path = Path(path)
+    enc = np.asarray(encodings, dtype=np.float32)
+    if enc.ndim != 2:
+        raise ValueError(f"encodings 需為 (N,D)，收到 shape {enc.shape}")
+    if len(names) != len(enc):
+        raise ValueError(f"encodings 有 {len(enc)} 筆，names 有 {len(names)} 筆")
+    if dtype != "float32" and dtype not in QUANT_DTYPES:
+        raise ValueError(f"未知的 dtype：{dtype}（可用：float32 / {' / '.join(QUANT_DTYPES)}）")
+    sources = [str(s) for s in sources] if sources is not None else [""] * len(enc)
+    if len(sources) != len(enc):
+        raise ValueError(f"encodings 有 {len(enc)} 筆，sources 有 {len(sources)} 筆")
+
+    identities, labels = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+    order = np.argsort(labels, kind="stable")
+    enc = np.ascontiguousarray(enc[order])
+    blobs = {
+        "embeddings": enc.tobytes(),
+        "sq_norms": np.einsum("nd,nd->n", enc, enc).astype(np.float32).tobytes(),
+        "labels": labels[order].astype("<i4").tobytes(),
+        "sources": json.dumps([sources[i] for i in order], ensure_ascii=False).encode("utf-8"),
+    }
+    if dtype in QUANT_DTYPES:
+        codes, scale = quantize(enc, dtype)
+        blobs["codes"] = codes.tobytes()
+        if scale is not None:
+            blobs["scale"] = scale.tobytes()
+        blobs["code_sq"] = code_sq_norms(codes, scale).tobytes()
+    sections, off = {}, 0
+    for name, blob in blobs.items():
+        sections[name] = [off, len(blob)]
+        off = _align(off + len(blob))
+    header = json.dumps({"dim": int(enc.shape[1]), "count": len(enc), "dtype": dtype,
+                         "identities": identities.tolist(), "sections": sections},
+                        ensure_ascii=False).encode("utf-8")
+    base = _align(_PREAMBLE.size + len(header))
+
+    with atomic_writer(path) as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION if dtype in QUANT_DTYPES else 1, len(header)))
+        f.write(header)
+        for name, blob in blobs.items():
+            f.seek(base + sections[name][0])
+            f.write(blob)
+    return path
+
+
+# ------------------------- 讀取 ------------------------- #
+class Gallery:
+    """唯讀開啟 gallery 檔；embeddings / sq_norms / labels 為 memmap 上的 view"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} 不是 gallery 檔")
+            if version not in _READABLE:
+                raise ValueError(f"{self.path} 版本 {version} 不支援（需為 {' / '.join(map(str, _READABLE))}）")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        self.dim: int = header["dim"]
+        self.count: int = header["count"]
+        self.identities: list[str] = header["identities"]
+        self.dtype: str = header.get("dtype", "float32")
+        self._sections = header["sections"]
+        self._base = _align(_PREAMBLE.size + header_len)
+
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode="r") if self.count else None
+        self.embeddings = self._section("embeddings", np.float32, (self.count, self.dim))
+        self.sq_norms = self._section("sq_norms", np.float32, (self.count,))
+        self.labels = self._section("labels", np.dtype("<i4"), (self.count,))
+        self.codes = self.scale = self.code_sq = None
+        if self.dtype in QUANT_DTYPES:
+            self.codes = self._section("codes", np.dtype(self.dtype), (self.count, self.dim))
+            self.scale = self._section("scale", np.float32, (self.dim,)) if "scale" in self._sections else None
+            self.code_sq = self._section("code_sq", np.float32, (self.count,))
+
+    def _section(self, name: str, dtype, shape) -> np.ndarray:
+        if self._mm is None:
+            return np.empty(shape, dtype)
+        off, nbytes = self._sections[name]
+        return np.frombuffer(self._mm, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize,
+                             offset=self._base + off).reshape(shape)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def quantized_index(self, rerank: int = 4) -> QuantizedIndex | None:
+        """有量化特徵時回傳掃描 codes、以 embeddings 重排的索引（全是 memmap 上的 view）"""
+        if self.codes is None or not self.count:
+            return None
+        return QuantizedIndex(self.embeddings, self.codes, self.scale, self.code_sq, rerank)
+
+    @cached_property
+    def names(self) -> list[str]:
+        """每筆特徵的人名（與 embeddings 同順序）"""
+        return [self.identities[i] for i in self.labels]
+
+    @cached_property
+    def sources(self) -> list[str]:
+        """每筆特徵的來源照片；舊 faces.pkl 轉來的為空字串"""
+        off, nbytes = self._sections["sources"]
+        with open(self.path, "rb") as f:
+            f.seek(self._base + off)
+            return json.loads(f.read(nbytes).decode("utf-8"))
+
+    def as_db(self) -> dict:
+        """與 faces.pkl 相容的 {'encodings','names'}；另附 'gallery' 供新程式直接取用"""
+        return {"encodings": self.embeddings, "names": self.names, "gallery": self}
+
+
+def open_gallery(path) -> Gallery:
+    return Gallery(path)
+
+
+# ------------------------- faces.pkl 轉換 ------------------------- #
+def convert_pkl(pkl_path, out_path=None, dtype: str = "float32") -> Path:
+    """把舊的 faces.pkl 轉成同目錄的 .gallery（或 out_path）"""
+    import pickle
+
+    pkl_path = Path(pkl_path)
+    with open(pkl_path, "rb") as f:
+        db = pickle.load(f)
+    out_path = Path(out_path) if out_path else pkl_path.with_suffix(GALLERY_SUFFIX)
+    return write_gallery(out_path, db["encodings"], db["names"], db.get("sources"), dtype)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="人臉特徵庫 gallery 工具")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_conv = sub.add_parser("convert", help="faces.pkl → .gallery")
+    p_conv.add_argument("pkl", type=Path)
+    p_conv.add_argument("-o", "--output", type=Path, default=None)
+    p_conv.add_argument("--dtype", choices=("float32",) + QUANT_DTYPES, default="float32",
+                        help="另存量化特徵供比對掃描（int8 為 float32 的 1/4）")
+    p_info = sub.add_parser("info", help="顯示 gallery 內容摘要")
+    p_info.add_argument("gallery", type=Path)
+    args = parser.parse_args()
+
+    if args.cmd == "convert":
+        out = convert_pkl(args.pkl, args.output, args.dtype)
+        g = Gallery(out)
+        print(f"✅ 已轉換：{out}（{len(g)} 筆，{len(g.identities)} 人，{out.stat().st_size / 1024:.1f} KB）")
+    else:
+        g = Gallery(args.gallery)
+        print(f"📁 {g.path}：{len(g)} 筆 × {g.dim} 維（{g.dtype}）")
+        for i, name in enumerate(g.identities):
+            print(f"  • {name}：{int(np.count_nonzero(g.labels == i))} 筆")
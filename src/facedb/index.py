@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""index.py – 特徵庫的最近鄰索引（精確 flat / 近似 IVF）
+
+    index = build_index(matcher.gallery, "ivf", nlist=256)       # k-means 分桶
+    index.nprobe = 8                                            # 每次查幾個桶：召回率 ↔ 延遲
+    dist, ids = index.search(queries, k=32)                     # ids 為 gallery 的列號
+    index.save("faces.gallery.ivf.npz")
+    index = load_index("faces.gallery.ivf.npz", matcher.gallery)
+    matcher.set_index(index)                                     # FaceMatcher.match() 改走索引
+
+• FlatIndex：逐塊 |q|² + |g|² − 2·q·g 掃過全部特徵，結果與 FaceMatcher.distances 相同；
+  一幀的所有查詢每塊一次 (M, 塊) 矩陣乘法，各列以 argpartition 併入目前的前 k 名
+• IVFIndex：以 k-means 把特徵分成 nlist 個桶，特徵依桶重新排成連續記憶體；
+  查詢時只掃最近的 nprobe 個桶（同一個桶的所有查詢一起算）。nlist ≈ 4·√N 時每次查詢約掃
+  nprobe·√N/4 筆，查詢時間隨特徵庫大小次線性成長。沒掃到的桶裡可能有更近的人，
+  所以距離與 margin 都是近似值（exact=False）；FaceMatcher 在 min_margin > 0 時會逐張複查
+• 索引檔只存 centroid / 排列 / 分桶位置與特徵指紋（crc32），載入時重新接上特徵矩陣，
+  特徵庫改過（指紋不符）會丟出 ValueError，交給呼叫端重建
+• 全部純 NumPy，不需要 faiss
+
+    python -m src.facedb.index bench --sizes 5000 20000 50000 --nprobe 1 4 16
+    python -m src.facedb.index build faces.gallery --nlist 256
+"""
+from __future__ import annotations
+
+import math
+import time
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+INDEX_SUFFIX = ".index.npz"
+_CHUNK = 8192                       # flat 掃描 / k-means 指派時每塊的列數
+
+
+def fingerprint(vectors: np.ndarray) -> int:
+    return zlib.crc32(np.ascontiguousarray(vectors, np.float32).data)
+
+
+def _sq_norms(x: np.ndarray) -> np.ndarray:
+    return np.einsum("nd,nd->n", x, x)
+
+
+def _merge_topk(best_d2: np.ndarray, best_i: np.ndarray, d2: np.ndarray, ids: np.ndarray,
+                k: int) -> tuple[np.ndarray, np.ndarray]:
+    """(M,k) 目前的前 k 名（平方距離）併入一塊候選 d2 (M,C)、ids (C,)，回傳新的前 k 名（未排序）"""
+    n = min(k, d2.shape[1])
+    if n < d2.shape[1]:                                 # 先各列只留這塊的前 n 名，再與舊的 k 名合併
+        part = np.argpartition(d2, n - 1, axis=1)[:, :n]
+        d2, cand = np.take_along_axis(d2, part, axis=1), ids[part]
+    else:
+        cand = np.broadcast_to(ids, d2.shape)
+    all_d = np.concatenate([best_d2, d2], axis=1)
+    all_i = np.concatenate([best_i, cand], axis=1)
+    keep = np.argpartition(all_d, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(all_d, keep, axis=1), np.take_along_axis(all_i, keep, axis=1)
+
+
+def _finish_topk(best_d2: np.ndarray, best_i: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """由近到遠排序並開根號；沒填到的位置為 inf / -1"""
+    order = np.argsort(best_d2, axis=1, kind="stable")
+    d = np.sqrt(np.maximum(np.take_along_axis(best_d2, order, axis=1), 0.0)).astype(np.float32)
+    return d, np.take_along_axis(best_i, order, axis=1)
+
+
+def _queries(queries, dim: int) -> np.ndarray:
+    q = np.asarray(queries, np.float32)
+    if q.ndim == 1:
+        q = q[None]
+    if q.size == 0:
+        return np.empty((0, dim), np.float32)
+    if q.ndim != 2 or q.shape[1] != dim:
+        raise ValueError(f"查詢特徵需為 (M,{dim})，收到 shape {q.shape}")
+    return q
+
+
+# ------------------------- k-means ------------------------- #
+def _assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    c_sq = _sq_norms(centroids)
+    out = np.empty(len(x), np.int64)
+    for s in range(0, len(x), _CHUNK):
+        d2 = c_sq - 2.0 * (x[s:s + _CHUNK] @ centroids.T)      # |x|² 對 argmin 無影響
+        out[s:s + _CHUNK] = d2.argmin(axis=1)
+    return out
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = 20, sample: int | None = None,
+           seed: int = 0) -> np.ndarray:
+    """k-means++ 初始化 + Lloyd；sample 筆數上限預設 k × 64（訓練只用抽樣，指派才用全部）"""
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, np.float32)
+    k = max(1, min(int(k), len(x)))
+    n = min(len(x), sample or k * 64)
+    xs = x[np.sort(rng.choice(len(x), n, replace=False))] if n < len(x) else x
+
+    # k-means++：每次依「到最近中心的平方距離」加權抽下一個中心
+    centroids = np.empty((k, x.shape[1]), np.float32)
+    centroids[0] = xs[rng.integers(n)]
+    closest = np.sum((xs - centroids[0]) ** 2, axis=1)
+    for j in range(1, k):
+        total = closest.sum()
+        idx = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centroids[j] = xs[idx]
+        np.minimum(closest, np.sum((xs - centroids[j]) ** 2, axis=1), out=closest)
+
+    for _ in range(iters):
+        a = _assign(xs, centroids)
+        counts = np.bincount(a, minlength=k)
+        order = np.argsort(a, kind="stable")
+        nonempty = np.flatnonzero(counts)
+        starts = np.r_[0, np.cumsum(counts)[:-1]][nonempty]
+        sums = np.add.reduceat(xs[order], starts, axis=0)
+        new = centroids.copy()
+        new[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):                                          # 空桶：改放到隨機一筆上
+            new[empty] = xs[rng.choice(n, len(empty), replace=False)]
+        shift = float(np.max(np.abs(new - centroids)))
+        centroids = new
+        if shift < 1e-6:
+            break
+    return centroids
+
+
+# ------------------------- 索引 ------------------------- #
+class GalleryIndex(ABC):
+    """search(queries, k) → (distances (M,k), ids (M,k))；ids 為建索引時 vectors 的列號。
+
+    exact ─ True 表示前 k 名一定是真正最近的 k 筆（沒回傳的都不比第 k 名近）
+    """
+
+    kind = "base"
+    exact = False
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.dim = vectors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @abstractmethod
+    def search(self, queries, k: int = 1) -> tuple[np.ndarray, np.ndarray]: ...
+
+    def _arrays(self) -> dict:
+        return {}
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        np.savez(path, kind=self.kind, n=len(self), dim=self.dim,
+                 fingerprint=fingerprint(self.vectors), **self._arrays())
+        return path if path.suffix == ".npz" else path.with_name(path.name + ".npz")
+
+
+class FlatIndex(GalleryIndex):
+    """精確搜尋：逐塊掃過全部特徵"""
+
+    kind = "flat"
+    exact = True
+
+    def __init__(self, vectors: np.ndarray, sq_norms: np.ndarray | None = None):
+        super().__init__(np.asarray(vectors, np.float32))
+        self.sq_norms = _sq_norms(self.vectors) if sq_norms is None else sq_norms
+
+    def search(self, queries, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        q = _queries(queries, self.dim)
+        k = int(k)
+        best_d2 = np.full((len(q), k), np.inf, np.float32)
+        best_i = np.full((len(q), k), -1, np.int64)
+        if not len(q):
+            return best_d2, best_i
+        q_sq = _sq_norms(q)[:, None]
+        for s in range(0, len(self.vectors), _CHUNK):
+            d2 = self.sq_norms[s:s + _CHUNK] - 2.0 * (q @ self.vectors[s:s + _CHUNK].T) + q_sq
+            best_d2, best_i = _merge_topk(best_d2, best_i, d2, np.arange(s, s + d2.shape[1]), k)
+        return _finish_topk(best_d2, best_i)
+
+
+class IVFIndex(GalleryIndex):
+    """k-means 倒排索引。
+
+    nlist  ─ 桶數；None＝4·√N
+    nprobe ─ 每次查詢掃描的桶數（可在建好之後隨時調整）
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, order: np.ndarray,
+                 offsets: np.ndarray, nprobe: int = 8):
+        super().__init__(np.asarray(vectors, np.float32))
+        self.centroids = centroids.astype(np.float32)
+        self.order = order.astype(np.int64)
+        self.offsets = offsets.astype(np.int64)
+        self.nprobe = nprobe
+        # 依桶重新排列成連續記憶體，掃描一個桶就是一段連續切片
+        self.sorted = np.ascontiguousarray(self.vectors[self.order])
+        self.sorted_sq = _sq_norms(self.sorted)
+        self.centroid_sq = _sq_norms(self.centroids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int | None = None, nprobe: int = 8, iters: int = 20,
+              sample: int | None = None, seed: int = 0) -> "IVFIndex":
+        vectors = np.asarray(vectors, np.float32)
+        nlist = nlist or max(1, int(4 * math.sqrt(len(vectors))))
+        centroids = kmeans(vectors, nlist, iters, sample, seed)
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.r_[0, np.cumsum(np.bincount(assign, minlength=len(centroids)))]
+        return cls(vectors, centroids, order, offsets, nprobe)
+
+    def _arrays(self) -> dict:
+        return {"centroids": self.centroids, "order": self.order, "offsets": self.offsets,
+                "nprobe": self.nprobe}
+
+    def search(self, queries, k: int = 1, nprobe: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        q = _queries(queries, self.dim)
+        k = int(k)
+        nprobe = max(1, min(int(nprobe or self.nprobe), self.nlist))
+        if not len(q):
+            return np.full((0, k), np.inf, np.float32), np.full((0, k), -1, np.int64)
+        cd = self.centroid_sq - 2.0 * (q @ self.centroids.T)
+        probe = np.argpartition(cd, nprobe - 1, axis=1)[:, :nprobe] if nprobe < self.nlist else \
+            np.broadcast_to(np.arange(self.nlist), cd.shape)
+        q_sq = _sq_norms(q)
+        # 候選緩衝 (M, nprobe, 最大桶大小)：第 r 個查詢的第 j 個桶寫在 [r, j, :桶大小]，其餘為 inf
+        sizes = self.offsets[probe + 1] - self.offsets[probe]
+        width = max(int(sizes.max()), -(-k // nprobe))
+        buf_d2 = np.full((len(q), nprobe, width), np.inf, np.float32)
+        buf_i = np.full(buf_d2.shape, -1, np.int64)
+        # 依桶分組：每個被查到的桶一次 (查它的查詢數, 桶大小) 矩陣乘法，迴圈次數與查詢數無關
+        lists = probe.ravel()
+        slot = np.argsort(lists, kind="stable")
+        lists = lists[slot]
+        rr, jj = np.divmod(slot, nprobe)
+        bounds = np.flatnonzero(np.r_[True, lists[1:] != lists[:-1], True]).tolist()
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            s, e = self.offsets[lists[a]], self.offsets[lists[a] + 1]
+            if b - a == 1:                              # 只有一個查詢掃這個桶：矩陣 × 向量
+                r, j = rr[a], jj[a]
+                buf_d2[r, j, :e - s] = self.sorted_sq[s:e] - 2.0 * (self.sorted[s:e] @ q[r]) + q_sq[r]
+            else:
+                r, j = rr[a:b], jj[a:b]
+                buf_d2[r, j, :e - s] = self.sorted_sq[s:e] - 2.0 * (q[r] @ self.sorted[s:e].T) + q_sq[r, None]
+            buf_i[r, j, :e - s] = self.order[s:e]
+        buf_d2 = buf_d2.reshape(len(q), -1)
+        buf_i = buf_i.reshape(len(q), -1)
+        keep = np.argpartition(buf_d2, k - 1, axis=1)[:, :k]
+        return _finish_topk(np.take_along_axis(buf_d2, keep, axis=1), np.take_along_axis(buf_i, keep, axis=1))
+
+
+def build_index(vectors: np.ndarray, kind: str = "ivf", **kwargs) -> GalleryIndex:
+    if kind == "flat":
+        return FlatIndex(vectors, **kwargs)
+    if kind == "ivf":
+        return IVFIndex.build(vectors, **kwargs)
+    raise ValueError(f"未知的索引種類：{kind}（可用：flat / ivf）")
+
+
+def load_index(path: str | Path, vectors: np.ndarray, nprobe: int | None = None) -> GalleryIndex:
+    """載入索引並接上 vectors；vectors 與建索引時不同（筆數 / 維度 / 指紋）時丟出 ValueError"""
+    with np.load(path) as z:
+        kind = str(z["kind"])
+        if int(z["n"]) != len(vectors) or int(z["dim"]) != vectors.shape[1] \
+                or int(z["fingerprint"]) != fingerprint(vectors):
+            raise ValueError(f"{path} 與目前的特徵庫不符，請重建索引")
+        if kind == "flat":
+            return FlatIndex(vectors)
+        if kind == "ivf":
+            return IVFIndex(vectors, z["centroids"], z["order"], z["offsets"],
+                            int(nprobe or z["nprobe"]))
+    raise ValueError(f"未知的索引種類：{kind}")
+
+
+# ------------------------- 基準測試 ------------------------- #
+def synthetic_gallery(n: int, dim: int = 128, shots: int = 5, spread: float = 0.35,
+                      noise: float = 0.12, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """類似 dlib 特徵的合成資料：n/shots 個人，每人 shots 張；回傳 (gallery, labels, queries)"""
+    rng = np.random.default_rng(seed)
+    people = max(1, n // shots)
+    centers = rng.normal(size=(people, dim)).astype(np.float32) * (spread / math.sqrt(dim))
+    labels = np.repeat(np.arange(people), shots)[:n]
+    gallery = centers[labels] + rng.normal(size=(len(labels), dim)).astype(np.float32) * (noise / math.sqrt(dim))
+    who = rng.integers(people, size=200)
+    queries = centers[who] + rng.normal(size=(len(who), dim)).astype(np.float32) * (noise / math.sqrt(dim))
+    return gallery, labels, queries
+
+
+def recall_at(approx_ids: np.ndarray, exact_ids: np.ndarray, k: int = 1) -> float:
+    """approx 前 k 名中找回 exact 第一名的比例"""
+    return float(np.mean([e in a[:k] for a, e in zip(approx_ids, exact_ids[:, 0])]))
+
+
+def benchmark(sizes: Sequence[int] = (5000, 20000, 50000), nprobes: Sequence[int] = (1, 2, 4, 8, 16),
+              nlist: int | None = None, k: int = 10, dim: int = 128) -> list[dict]:
+    """每個大小：flat 與各 nprobe 的單筆查詢延遲（ms）與 recall@1 / recall@k"""
+    rows = []
+    for n in sizes:
+        gallery, _, queries = synthetic_gallery(n, dim)
+        flat = FlatIndex(gallery)
+        t = time.perf_counter()
+        index = IVFIndex.build(gallery, nlist)
+        build_s = time.perf_counter() - t
+
+        def timed(fn):
+            t = time.perf_counter()
+            out = [fn(q) for q in queries]
+            ms = (time.perf_counter() - t) * 1000 / len(queries)
+            return ms, np.vstack([o[1] for o in out])
+
+        flat_ms, exact = timed(lambda q: flat.search(q, k))
+        rows.append({"n": n, "index": "flat", "nprobe": None, "ms": flat_ms, "recall@1": 1.0,
+                     f"recall@{k}": 1.0})
+        for p in nprobes:
+            ms, ids = timed(lambda q: index.search(q, k, nprobe=p))
+            rows.append({"n": n, "index": "ivf", "nlist": index.nlist, "nprobe": p, "ms": ms,
+                         "recall@1": recall_at(ids, exact, 1), f"recall@{k}": recall_at(ids, exact, k),
+                         "build_s": build_s})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="特徵庫最近鄰索引：建立 / 召回率與延遲基準測試")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="為 .gallery / faces.pkl 建立索引檔")
+    b.add_argument("db", type=Path)
+    b.add_argument("--kind", default="ivf", choices=("flat", "ivf"))
+    b.add_argument("--nlist", type=int, default=None)
+    b.add_argument("--nprobe", type=int, default=8)
+    bb = sub.add_parser("bench", help="合成資料上比較 flat 與 IVF")
+    bb.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000])
+    bb.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    bb.add_argument("--nlist", type=int, default=None)
+    bb.add_argument("--k", type=int, default=10)
+    bb.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        from src.facedb import face_database
+        from src.facedb.face_matcher import FaceMatcher
+        matcher = FaceMatcher.from_db(face_database.load_db(args.db))
+        kw = {"nlist": args.nlist, "nprobe": args.nprobe} if args.kind == "ivf" else {}
+        out = build_index(matcher.gallery, args.kind, **kw).save(face_database.index_path(args.db))
+        print(f"✅ 已建立 {args.kind} 索引：{out}（{len(matcher)} 筆）")
+    else:
+        result = benchmark(args.sizes, args.nprobe, args.nlist, args.k)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            for r in result:
+                cfg = "flat（精確）" if r["index"] == "flat" else f"ivf nlist={r['nlist']} nprobe={r['nprobe']}"
+                print(f"   N={r['n']:6d}  {cfg:<26} {r['ms']:7.3f} ms/查詢  "
+                      f"recall@1 {r['recall@1']:.3f}  recall@{args.k} {r[f'recall@{args.k}']:.3f}")
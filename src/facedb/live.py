@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""live.py – 特徵庫熱重載：背景載入新版，整份換上（double buffer），辨識迴圈不必重啟
+
+    live = LiveMatcher(face_database.load_matcher, face_database.watched_files())
+    live.start(interval=1.0)                  # 背景輪詢檔案 mtime / size
+    live.match(face_vecs)                     # 介面同 FaceMatcher.match，永遠用完整的那一份
+    live.stats()                              # {'reloads', 'failures', 'last_ms', 'max_ms', …}
+
+• 輪詢 paths 的 (mtime_ns, size, inode)；有變動且連續兩次輪詢都相同（寫檔已結束）才載入，
+  faces.pkl 這種非原子寫入的檔案不會讀到一半
+• 新版在背景執行緒完整載入並先做一次暖身比對（memmap 分頁、索引 / 原型等），
+  之後只做一次參照賦值換上；比對中的執行緒繼續用舊版，舊版在沒人引用後釋放
+• 載入失敗（檔案壞掉、格式不符）保留舊版、計入 failures，檔案再變動時重試
+• .gallery 是 memmap，更新時必須整檔替換（gallery.write_gallery / atomic_writer 即是）；
+  就地覆寫會截斷舊版正在讀的檔案（SIGBUS）
+• 新註冊的人：FaceTracker 對不認得的 track 每 retry_every 幀會重新萃取，換版後幾幀內就會認出；
+  已認得的 track 在 reverify_every 幀後以新版複查
+"""
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Sequence
+
+import numpy as np
+
+
+def file_stamp(paths: Sequence[Path]) -> tuple:
+    """每個路徑的 (mtime_ns, size, inode)；不存在為 None"""
+    out = []
+    for p in paths:
+        try:
+            st = Path(p).stat()
+        except OSError:
+            out.append(None)
+            continue
+        out.append((st.st_mtime_ns, st.st_size, st.st_ino))
+    return tuple(out)
+
+
+class LiveMatcher:
+    """包住 load() 產生的 matcher（FaceMatcher / PrototypeMatcher / ShardedGallery…），檔案變動時換新。
+
+    load   ─ 無參數，回傳新的 matcher；丟出例外視為載入失敗
+    paths  ─ 要監看的檔案
+    warm   ─ 換上前先以全零向量比對一次
+    """
+
+    def __init__(self, load: Callable[[], object], paths: Sequence[Path], warm: bool = True):
+        self._load = load
+        self.paths = [Path(p) for p in paths]
+        self.warm = warm
+        self._stamp = file_stamp(self.paths)
+        self._seen = self._stamp                 # 上一次輪詢看到的（去抖動用）
+        self._current = load()
+        self._lock = threading.Lock()            # 只保護「載入」，比對端不拿鎖
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.generation = 0
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload_ms = 0.0
+        self.max_reload_ms = 0.0
+        self.last_error: str | None = None
+
+    # ------------------------- 目前的版本 ------------------------- #
+    @property
+    def current(self):
+        return self._current
+
+    def match(self, queries):
+        return self._current.match(queries)
+
+    def topk(self, queries, k: int = 5):
+        return self._current.topk(queries, k)
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def __getattr__(self, name):                 # identities / dim / tolerance … 轉給目前版本
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._current, name)
+
+    # ------------------------- 重載 ------------------------- #
+    def reload(self) -> bool:
+        """立即在呼叫端執行緒載入並換上；回傳是否成功"""
+        with self._lock:
+            stamp = file_stamp(self.paths)
+            t0 = time.perf_counter()
+            try:
+                new = self._load()
+                if self.warm:
+                    new.match(np.zeros((1, new.dim), np.float32))
+            except Exception as e:               # 保留舊版，檔案再變動時重試
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._stamp = stamp
+                print(f"⚠️ 特徵庫重載失敗，沿用舊版：{self.last_error}")
+                return False
+            self._current = new                  # 單一參照替換
+            self._stamp = stamp
+            self.generation += 1
+            self.reloads += 1
+            self.last_reload_ms = (time.perf_counter() - t0) * 1e3
+            self.max_reload_ms = max(self.max_reload_ms, self.last_reload_ms)
+            self.last_error = None
+            return True
+
+    def poll(self) -> bool:
+        """檔案有變動且已穩定（與上次輪詢相同）時重載；回傳是否換了新版"""
+        stamp = file_stamp(self.paths)
+        settled = stamp == self._seen
+        self._seen = stamp
+        if stamp == self._stamp or not settled:
+            return False
+        ok = self.reload()
+        if ok:
+            print(f"🔄 特徵庫已重載：{len(self._current)} 筆（{self.last_reload_ms:.1f} ms）")
+        return ok
+
+    def start(self, interval: float = 1.0) -> "LiveMatcher":
+        """背景執行緒每 interval 秒 poll() 一次"""
+        if self._thread is None:
+            self._stop.clear()
+
+            def loop():
+                while not self._stop.wait(interval):
+                    self.poll()
+
+            self._thread = threading.Thread(target=loop, name="gallery-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {"size": len(self._current), "generation": self.generation, "reloads": self.reloads,
+                "failures": self.failures, "last_ms": self.last_reload_ms, "max_ms": self.max_reload_ms,
+                "error": self.last_error}
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""manifest.py – 以內容雜湊追蹤 dataset 照片，增量更新 .gallery
+
+    stats = update_gallery(dataset_dir, gallery_path, encode_fn)
+
+faces.gallery 旁邊放一份 faces.manifest.json：
+    {"encoder": ENCODER_ID, "files": {相對路徑: {size, mtime_ns, sha1, name, face}}}
+
+• size / mtime_ns 沒變 → 直接沿用，不讀檔
+• size / mtime 變了但 sha1 相同（例如被 touch 或複製過）→ 沿用，只更新 manifest
+• 新增或內容改變 → 丟給 encode_fn 重新萃取；刪除的照片 → 移除對應的列
+• 沒偵測到臉的照片也記錄下來（face=false），下次不會重試
+• encoder 版本不同或 manifest / gallery 對不上 → 全部重建
+• 量化格式（float16 / int8）沿用既有 gallery 檔，即使沒有 manifest 或 full=True；dtype= 可明確指定
+• 有變動時先原子替換 gallery，再原子替換 manifest；沒有變動則什麼都不寫
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable, NamedTuple, Sequence
+
+import numpy as np
+
+from src.facedb.gallery import GALLERY_SUFFIX, Gallery, atomic_writer, write_gallery
+
+# 偵測 / 特徵模型組合；改了其中之一就要換字串，強制全部重建
+ENCODER_ID = "face_recognition:hog+resnet128:v1"
+MANIFEST_SUFFIX = ".manifest.json"
+IMAGE_PATTERN = "*.[jp][pn]g"
+
+# encode_fn(paths) → 與 paths 同順序的特徵 (128,) 或 None（沒有臉）
+EncodeFn = Callable[[Sequence[Path]], Sequence["np.ndarray | None"]]
+
+
+class UpdateStats(NamedTuple):
+    total: int          # 掃到的照片數
+    reused: int         # 沿用舊特徵（含無臉記錄）
+    encoded: int        # 本次重新萃取
+    no_face: int        # 本次萃取但沒有臉
+    removed: int        # 已刪除的照片
+    rows: int           # 更新後 gallery 筆數
+    written: bool       # 是否寫出新的 gallery
+
+
+def manifest_path(gallery_path) -> Path:
+    """faces.gallery → faces.manifest.json"""
+    gallery_path = Path(gallery_path)
+    return gallery_path.with_name(gallery_path.name.removesuffix(GALLERY_SUFFIX) + MANIFEST_SUFFIX)
+
+
+def default_name(path: Path) -> str:
+    """檔名前綴即人名：charlie_003.jpg → charlie"""
+    return path.stem.split("_")[0]
+
+
+def file_digest(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while block := f.read(chunk):
+            h.update(block)
+    return h.hexdigest()
+
+
+def scan_images(dataset_dir: Path) -> list[Path]:
+    return sorted(dataset_dir.rglob(IMAGE_PATTERN))
+
+
+def load_manifest(path: Path, encoder_id: str = ENCODER_ID) -> dict:
+    """讀 manifest；不存在、損毀或 encoder 不同時回傳空的 files"""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+    return data.get("files", {}) if data.get("encoder") == encoder_id else {}
+
+
+def save_manifest(path: Path, files: dict, encoder_id: str = ENCODER_ID) -> None:
+    with atomic_writer(path) as f:
+        f.write(json.dumps({"encoder": encoder_id, "files": files},
+                           ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8"))
+
+
+# ------------------------- 增量更新 ------------------------- #
+def existing_dtype(gallery_path: Path) -> str:
+    """既有 gallery 檔的特徵格式；不存在或讀不出來時為 float32"""
+    try:
+        return Gallery(gallery_path).dtype
+    except (OSError, ValueError):
+        return "float32"
+
+
+def update_gallery(dataset_dir, gallery_path, encode_fn: EncodeFn,
+                   name_fn: Callable[[Path], str] = default_name,
+                   encoder_id: str = ENCODER_ID, full: bool = False, dtype: str | None = None) -> UpdateStats:
+    """比對 manifest，只萃取新增 / 修改的照片，並移除已刪除照片的列。
+
+    dtype ─ 寫入的特徵格式（float32 / float16 / int8）；None＝沿用既有檔案，沒有檔案時為 float32
+    """
+    dataset_dir, gallery_path = Path(dataset_dir), Path(gallery_path)
+    man_path = manifest_path(gallery_path)
+    old = {} if full or not gallery_path.exists() else load_manifest(man_path, encoder_id)
+
+    # 1️⃣ 以 stat（必要時 sha1）決定哪些可以沿用
+    files: dict[str, dict] = {}
+    todo: list[tuple[str, Path]] = []
+    manifest_dirty = False
+    for path in scan_images(dataset_dir):
+        rel = path.relative_to(dataset_dir).as_posix()
+        st = path.stat()
+        entry = old.get(rel)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            files[rel] = entry
+            continue
+        digest = file_digest(path)
+        if entry and entry["sha1"] == digest:
+            files[rel] = dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            manifest_dirty = True
+            continue
+        files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": digest,
+                      "name": name_fn(path), "face": False}
+        todo.append((rel, path))
+    removed = [rel for rel in old if rel not in files]
+
+    # 2️⃣ 舊 gallery 的列（以來源路徑對應）；manifest 說有臉但 gallery 找不到就重新萃取
+    rows: dict[str, int] = {}
+    gallery = Gallery(gallery_path) if old else None
+    if gallery is not None:
+        rows = {src: i for i, src in enumerate(gallery.sources) if src}
+    pending = {rel for rel, _ in todo}
+    for rel, entry in files.items():
+        if entry["face"] and rel not in rows and rel not in pending:
+            todo.append((rel, dataset_dir / rel))
+    reused = len(files) - len(todo)
+
+    if not todo and not removed and (dtype is None or gallery.dtype == dtype):
+        if manifest_dirty:
+            save_manifest(man_path, files, encoder_id)
+        return UpdateStats(len(files), reused, 0, 0, 0, len(gallery) if gallery else 0, False)
+
+    # 3️⃣ 只萃取需要的照片
+    vecs = list(encode_fn([p for _, p in todo])) if todo else []
+    new_vecs: dict[str, np.ndarray] = {}
+    for (rel, _), vec in zip(todo, vecs):
+        files[rel]["face"] = vec is not None
+        if vec is not None:
+            new_vecs[rel] = np.asarray(vec, np.float32)
+
+    # 4️⃣ 組出新 gallery（依來源路徑排序，結果與全量重建相同）並原子替換
+    keep = sorted(rel for rel, e in files.items() if e["face"])
+    dim = next(iter(new_vecs.values())).shape[0] if new_vecs else (gallery.dim if gallery else 128)
+    enc = np.empty((len(keep), dim), np.float32)
+    for i, rel in enumerate(keep):
+        enc[i] = new_vecs[rel] if rel in new_vecs else gallery.embeddings[rows[rel]]
+    dtype = dtype or (gallery.dtype if gallery else existing_dtype(gallery_path))   # 沿用原本的量化格式
+    del gallery                                  # 釋放舊檔的 memmap
+    write_gallery(gallery_path, enc, [files[r]["name"] for r in keep], keep, dtype)
+    save_manifest(man_path, files, encoder_id)
+
+    no_face = sum(1 for rel, _ in todo if not files[rel]["face"])
+    return UpdateStats(len(files), reused, len(todo), no_face, len(removed), len(keep), True)
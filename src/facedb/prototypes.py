@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""prototypes.py – 每個人的特徵壓縮成少數幾個原型（prototype）
+
+    protos = compact_matcher(matcher, per_identity=3)        # 依人分群 + 剔除離群照片
+    protos.save(face_database.prototypes_path())
+    pm = PrototypeMatcher(protos, matcher)                    # 介面同 FaceMatcher.match
+    pm.match(face_vecs)
+
+• 離群剔除：以逐維中位數為中心，距離超過「中位數 + z·MAD」的照片（拍糊、側臉、框到別人）
+  不參與原型；max_spread 另可設絕對上限
+• 分群：medoid（k-medoids，原型就是某張真實照片，距離為真實距離）或 mean（k-means 中心）
+• 每個人另存統計：照片數、保留數、照片到最近原型的平均 / 標準差 / 最大距離（radius）；
+  每個原型另存它那一群保留照片的半徑，被剔除的離群照片整批另存（數量少，比對時逐張算）
+• PrototypeMatcher：先只比原型與離群照片，以三角不等式框出每個人最近照片距離的上下界；
+  界限足以確定結果時直接回傳，否則（接近門檻 / 勝負不明）才退回逐張照片的 FaceMatcher。
+  能省多少取決於特徵庫（每人照片數、分群緊密度），先用 eval 量過再開（load_matcher(prototypes=True)）
+• 原型檔記錄來源特徵庫的指紋，特徵庫改過後 load_prototypes 會丟出 ValueError
+
+    python -m src.facedb.prototypes build face-capture/dataset/faces.pkl --k 3
+    python -m src.facedb.prototypes eval face-capture/dataset/faces.pkl      # 或 --synthetic
+"""
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from src.facedb.face_matcher import UNKNOWN, FaceMatcher, Match
+from src.facedb.index import fingerprint, kmeans
+
+PROTO_SUFFIX = ".protos.npz"
+
+
+class IdentityStats(NamedTuple):
+    count: int            # 原始照片數
+    kept: int             # 剔除離群後保留的照片數
+    mean_dist: float      # 保留照片到最近原型的平均距離
+    std_dist: float
+    radius: float         # 保留照片到最近原型的最大距離
+
+
+# ------------------------- 分群 ------------------------- #
+def reject_outliers(x: np.ndarray, z: float = 3.0, max_spread: float | None = None) -> np.ndarray:
+    """回傳保留的 mask；至少保留最接近中心的一張"""
+    center = np.median(x, axis=0)
+    d = np.linalg.norm(x - center, axis=1)
+    med = np.median(d)
+    mad = np.median(np.abs(d - med)) * 1.4826          # 常態分布下 ≈ 標準差
+    keep = d <= med + z * max(mad, 1e-6)
+    if max_spread is not None:
+        keep &= d <= max_spread
+    if not keep.any():
+        keep[np.argmin(d)] = True
+    return keep
+
+
+def _pairwise(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    d2 = np.einsum("nd,nd->n", a, a)[:, None] + np.einsum("md,md->m", b, b)[None] - 2.0 * (a @ b.T)
+    return np.sqrt(np.maximum(d2, 0.0))
+
+
+def kmedoids(x: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    """簡化版 PAM（交替指派 / 更新）；回傳 medoid 在 x 中的列號"""
+    k = min(int(k), len(x))
+    d = _pairwise(x, x)
+    # 初始：最中心的一張，再依序挑離現有 medoid 最遠的（確定性、不需亂數）
+    medoids = [int(np.argmin(d.sum(axis=1)))]
+    while len(medoids) < k:
+        medoids.append(int(np.argmax(d[:, medoids].min(axis=1))))
+    medoids = np.array(medoids)
+    for _ in range(iters):
+        assign = np.argmin(d[:, medoids], axis=1)
+        new = medoids.copy()
+        for j in range(k):
+            members = np.flatnonzero(assign == j)
+            if len(members):
+                new[j] = members[np.argmin(d[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(new, medoids):
+            break
+        medoids = new
+    return medoids
+
+
+class Prototypes:
+    """vectors (P,D) 依 labels 排序；labels 指向 identities；stats 與 identities 同序。
+
+    anchor   ─ 每個原型到同一人最近一張保留照片的距離（medoid 本身就是照片，為 0）
+    radius   ─ 每個原型到指派給它的保留照片的最大距離；沒有照片指派給它時為 -inf
+    outliers ─ 被剔除的離群照片 (O,D)，outlier_labels 同樣指向 identities
+    """
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, identities, stats: list[IdentityStats],
+                 method: str, source_fingerprint: int = 0, anchor: np.ndarray | None = None,
+                 radius: np.ndarray | None = None, outliers: np.ndarray | None = None,
+                 outlier_labels: np.ndarray | None = None):
+        self.vectors = np.asarray(vectors, np.float32)
+        self.labels = np.asarray(labels, np.int64)
+        n = len(self.vectors)
+        self.anchor = np.zeros(n, np.float32) if anchor is None else np.asarray(anchor, np.float32)
+        self.radius = np.zeros(n, np.float32) if radius is None else np.asarray(radius, np.float32)
+        dim = self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+        self.outliers = np.zeros((0, dim), np.float32) if outliers is None else np.asarray(outliers, np.float32)
+        self.outlier_labels = np.zeros(0, np.int64) if outlier_labels is None else \
+            np.asarray(outlier_labels, np.int64)
+        self.identities = np.asarray(identities, dtype=str)
+        self.stats = stats
+        self.method = method
+        self.source_fingerprint = int(source_fingerprint)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def names(self) -> list[str]:
+        return [str(n) for n in self.identities[self.labels]]
+
+    def stats_for(self, name: str) -> IdentityStats:
+        return self.stats[int(np.flatnonzero(self.identities == name)[0])]
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        np.savez(path, vectors=self.vectors, labels=self.labels, identities=self.identities,
+                 stats=np.array(self.stats, np.float64), method=self.method,
+                 fingerprint=self.source_fingerprint, anchor=self.anchor, radius=self.radius,
+                 outliers=self.outliers, outlier_labels=self.outlier_labels)
+        return path if path.suffix == ".npz" else path.with_name(path.name + ".npz")
+
+
+def load_prototypes(path: str | Path, source: np.ndarray | None = None) -> Prototypes:
+    """source 給定時檢查是否由同一份特徵庫產生；舊格式（沒有逐原型半徑）丟出 ValueError"""
+    with np.load(path) as z:
+        if "radius" not in z.files:
+            raise ValueError(f"{path} 是舊格式的原型檔，請重新壓縮")
+        protos = Prototypes(z["vectors"], z["labels"], z["identities"],
+                            [IdentityStats(int(r[0]), int(r[1]), *map(float, r[2:])) for r in z["stats"]],
+                            str(z["method"]), int(z["fingerprint"]), z["anchor"], z["radius"],
+                            z["outliers"], z["outlier_labels"])
+    if source is not None and protos.source_fingerprint != fingerprint(source):
+        raise ValueError(f"{path} 與目前的特徵庫不符，請重新壓縮")
+    return protos
+
+
+def compact(vectors: np.ndarray, labels: np.ndarray, identities, per_identity: int = 3,
+            method: str = "medoid", outlier_z: float = 3.0, max_spread: float | None = None,
+            seed: int = 0) -> Prototypes:
+    """vectors 依 labels（整數，指向 identities）分人壓縮；每人最多 per_identity 個原型"""
+    if method not in ("medoid", "mean"):
+        raise ValueError(f"未知的 method：{method}（可用：medoid / mean）")
+    vectors = np.asarray(vectors, np.float32)
+    labels = np.asarray(labels)
+    out_v, out_l, out_a, out_r, out_x, out_xl, stats = [], [], [], [], [], [], []
+    for ident in range(len(identities)):
+        x = vectors[labels == ident]
+        if not len(x):
+            stats.append(IdentityStats(0, 0, 0.0, 0.0, 0.0))
+            continue
+        keep = reject_outliers(x, outlier_z, max_spread)
+        kept = x[keep]
+        k = min(per_identity, len(kept))
+        if method == "medoid":
+            protos = kept[kmedoids(kept, k)]
+        else:
+            protos = kmeans(kept, k, seed=seed)
+        pair = _pairwise(kept, protos)                  # (保留照片, 原型)
+        assign = pair.argmin(axis=1)
+        d = pair[np.arange(len(kept)), assign]
+        radius = np.full(len(protos), -np.inf)
+        np.maximum.at(radius, assign, d)
+        stats.append(IdentityStats(len(x), len(kept), float(d.mean()), float(d.std()), float(d.max())))
+        out_v.append(protos)
+        out_l.append(np.full(len(protos), ident))
+        out_a.append(np.zeros(len(protos)) if method == "medoid" else pair.min(axis=0))
+        out_r.append(radius)
+        out_x.append(x[~keep])
+        out_xl.append(np.full(int((~keep).sum()), ident))
+    return Prototypes(np.vstack(out_v), np.concatenate(out_l), identities, stats, method,
+                      fingerprint(vectors), np.concatenate(out_a), np.concatenate(out_r),
+                      np.vstack(out_x), np.concatenate(out_xl))
+
+
+def compact_matcher(matcher: FaceMatcher, **kwargs) -> Prototypes:
+    """由 FaceMatcher 的特徵庫（已依人名排序）壓縮"""
+    return compact(matcher.gallery, matcher.labels, matcher.identities, **kwargs)
+
+
+# ------------------------- 比對 ------------------------- #
+class PrototypeMatcher:
+    """先比原型，只有原型無法確定結果時才退回逐張照片比對。
+
+    保留照片依最近原型分群，以三角不等式框出每個人「最近一張照片」的距離 d：
+        上界 ub = min(‖q − c‖ + anchor_c)   anchor＝原型到最近保留照片的距離（medoid 為 0）
+        下界 lb = min(‖q − c‖ − radius_c)   radius＝原型 c 那一群保留照片離 c 的最大距離
+    離群照片不進界限，直接算精確距離，與上下界取小。
+    ub(最近的人) ≤ tolerance 且其他人的 lb 都比它大至少 min_margin → 確定認得；
+    所有人的 lb 都 > tolerance → 確定不認得；其餘退回 full（只重算這幾張臉）。
+
+    full  ─ 逐張照片的 FaceMatcher；None 時只用原型（不退回，結果為近似）
+    slack ─ 判定「確定」時額外保留的距離餘裕，越大越常退回、越保守
+    """
+
+    def __init__(self, protos: Prototypes, full: FaceMatcher | None = None,
+                 tolerance: float | None = None, min_margin: float | None = None, slack: float = 0.0):
+        tolerance = tolerance if tolerance is not None else (full.tolerance if full else 0.45)
+        min_margin = min_margin if min_margin is not None else (full.min_margin if full else 0.0)
+        self.protos = protos
+        self.full = full
+        self.coarse = FaceMatcher(protos.vectors, protos.names, tolerance, min_margin)
+        self.tolerance = tolerance
+        self.min_margin = min_margin
+        self.slack = slack
+        self.identities = self.coarse.identities
+        # coarse 依人名排序，與 protos（依 identities 序）相同；沒有原型的人不在 coarse 裡。
+        # 比對用「槽位」排列：第 j 槽放每個人的第 j 個原型（不足的重複第一個），
+        # 每人最小值就是 (M, 槽數, K) 沿槽位取 min，不必逐人 reduceat
+        counts = np.diff(np.r_[self.coarse._starts, len(self.coarse)])
+        j = np.arange(counts.max())[:, None]
+        slots = (self.coarse._starts + np.where(j < counts, j, 0)).ravel()
+        self._slot_vecs = np.ascontiguousarray(self.coarse.gallery[slots])
+        self._slot_sq = np.einsum("nd,nd->n", self._slot_vecs, self._slot_vecs)
+        self._anchor = protos.anchor.astype(np.float32)[slots]
+        self._radius = protos.radius.astype(np.float32)[slots]
+        self._shape = (counts.max(), len(counts))
+        # 離群照片依 coarse 的人排序，逐人 reduceat
+        out_names = protos.identities[protos.outlier_labels]
+        order = np.argsort(out_names, kind="stable")
+        self._outliers = protos.outliers[order]
+        self._outlier_sq = np.einsum("nd,nd->n", self._outliers, self._outliers)
+        out_cols = np.searchsorted(self.identities, out_names[order])
+        self._outlier_starts = np.flatnonzero(np.r_[True, out_cols[1:] != out_cols[:-1]]) if len(order) else out_cols
+        self._outlier_cols = out_cols[self._outlier_starts]
+        self.queries = 0
+        self.fallbacks = 0
+
+    def __len__(self) -> int:
+        return len(self.coarse)
+
+    @property
+    def dim(self) -> int:
+        return self.coarse.dim
+
+    def match(self, queries) -> list[Match]:
+        q = self.coarse._queries(queries)
+        self.queries += len(q)
+        if self.full is None or not len(q):
+            return self.coarse.match(q)
+
+        d2 = np.einsum("md,md->m", q, q)[:, None] + self._slot_sq - 2.0 * (q @ self._slot_vecs.T)
+        dc = np.sqrt(np.maximum(d2, 0.0)).reshape((len(q),) + self._shape)   # (M, 槽數, K)
+        d = dc.min(axis=1)                                  # 每人最近原型距離 (M, K)
+        # medoid 的 anchor 全為 0，上界即 d
+        ub = d if not self._anchor.any() else (dc + self._anchor.reshape(self._shape)).min(axis=1)
+        lb = (dc - self._radius.reshape(self._shape)).min(axis=1)
+        if len(self._outliers):                             # 離群照片：精確距離
+            d2 = np.einsum("md,md->m", q, q)[:, None] + self._outlier_sq - 2.0 * (q @ self._outliers.T)
+            do = np.minimum.reduceat(np.sqrt(np.maximum(d2, 0.0)), self._outlier_starts, axis=1)
+            cols = self._outlier_cols
+            ub = ub.copy() if ub is d else ub
+            ub[:, cols] = np.minimum(ub[:, cols], do)
+            lb[:, cols] = np.minimum(lb[:, cols], do)
+        rows = np.arange(len(q))
+        best = ub.argmin(axis=1)
+        ub_best = ub[rows, best]
+        lb_other = lb.copy()
+        lb_other[rows, best] = np.inf
+        lb_other = lb_other.min(axis=1)                     # 只有一個人時為 inf
+
+        known = (ub_best <= self.tolerance - self.slack) & \
+                (lb_other - ub_best >= max(self.min_margin, 0.0) + self.slack)
+        unknown = ~known & (lb.min(axis=1) > self.tolerance + self.slack)
+        names = self.identities[best]
+        margins = lb_other - ub_best
+        if unknown.any():                                   # 陌生人：回報原型距離上的最近者
+            near = d.argmin(axis=1)
+            names = np.where(unknown, self.identities[near], names)
+            ub_best = np.where(unknown, d[rows, near], ub_best)
+            if d.shape[1] > 1:
+                two = np.partition(d, 1, axis=1)
+                margins = np.where(unknown, two[:, 1] - two[:, 0], margins)
+        matches = [Match(UNKNOWN if u else str(n), str(n), float(v), float(m))
+                   for n, u, v, m in zip(names, unknown, ub_best, margins)]
+        fallback = np.flatnonzero(~known & ~unknown)
+        if len(fallback):
+            self.fallbacks += len(fallback)
+            for i, m in zip(fallback, self.full.match(q[fallback])):
+                matches[i] = m
+        return matches
+
+    def topk(self, queries, k: int = 5):
+        return (self.full or self.coarse).topk(queries, k)
+
+    @property
+    def fallback_rate(self) -> float:
+        return self.fallbacks / self.queries if self.queries else 0.0
+
+
+# ------------------------- 評估 ------------------------- #
+def evaluate(encodings, names, holdout: float = 0.2, per_identity: int = 3, method: str = "medoid",
+             tolerance: float = 0.45, slack: float = 0.0, impostors: float = 0.2, repeat: int = 20,
+             seed: int = 0) -> dict:
+    """每人保留 holdout 比例的照片當查詢，另挑 impostors 比例的人整個移出特徵庫當陌生人；
+    比較逐張比對與原型比對的正確率、一致率與速度"""
+    rng = np.random.default_rng(seed)
+    enc = np.asarray(encodings, np.float32)
+    names = np.asarray(names, dtype=str)
+    people = np.unique(names)
+    strangers = set(rng.choice(people, int(len(people) * impostors), replace=False)) if len(people) > 2 else set()
+
+    train, test = [], []
+    for p in people:
+        idx = rng.permutation(np.flatnonzero(names == p))
+        if p in strangers:
+            test += list(idx)
+            continue
+        n_test = int(len(idx) * holdout) if len(idx) > 1 else 0
+        test += list(idx[:n_test])
+        train += list(idx[n_test:])
+    truth = [n if n not in strangers else "Unknown" for n in names[test]]
+
+    full = FaceMatcher(enc[train], names[train], tolerance)
+    protos = compact_matcher(full, per_identity=per_identity, method=method, seed=seed)
+    pm = PrototypeMatcher(protos, full, slack=slack)
+    q = enc[test]
+
+    def timed(fn):
+        fn(q)
+        t = time.perf_counter()
+        for _ in range(repeat):
+            out = fn(q)
+        return out, (time.perf_counter() - t) / repeat
+
+    full_m, full_s = timed(full.match)
+    pm.queries = pm.fallbacks = 0
+    proto_m, proto_s = timed(pm.match)
+    only_m, only_s = timed(pm.coarse.match)
+
+    def acc(ms):
+        return float(np.mean([m.name == t for m, t in zip(ms, truth)])) if truth else 0.0
+
+    return {
+        "identities": len(people), "gallery": len(train), "prototypes": len(protos),
+        "queries": len(test), "strangers": len(strangers), "method": method,
+        "accuracy_full": acc(full_m), "accuracy_proto": acc(proto_m), "accuracy_proto_only": acc(only_m),
+        "agreement": float(np.mean([a.name == b.name for a, b in zip(full_m, proto_m)])) if truth else 1.0,
+        "fallback_rate": pm.fallback_rate,
+        "speedup": full_s / proto_s if proto_s > 0 else 0.0,
+        "speedup_proto_only": full_s / only_s if only_s > 0 else 0.0,
+        "rejected": int(sum(s.count - s.kept for s in protos.stats)),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="特徵庫原型壓縮：建立 / 評估")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in ("build", "eval"):
+        p = sub.add_parser(name)
+        p.add_argument("db", type=Path, nargs="?", default=None, help="faces.pkl / faces.gallery")
+        p.add_argument("--k", type=int, default=3, help="每人最多幾個原型")
+        p.add_argument("--method", choices=("medoid", "mean"), default="medoid")
+    sub.choices["eval"].add_argument("--synthetic", type=int, default=0, metavar="N",
+                                     help="改用 N 筆合成資料（每人 15 張）")
+    sub.choices["eval"].add_argument("--slack", type=float, default=0.0)
+    args = parser.parse_args()
+
+    from src.facedb import face_database
+    db_path = args.db or face_database.DEFAULT_PKL
+    if args.cmd == "build":
+        # 與 with_prototypes 檢查指紋時同一個載入路徑（.gallery 優先），指紋才對得上
+        matcher = face_database.load_matcher(db_path)
+        protos = compact_matcher(matcher, per_identity=args.k, method=args.method)
+        out = protos.save(face_database.prototypes_path(db_path))
+        print(f"✅ {len(matcher)} 筆特徵 → {len(protos)} 個原型（{len(protos.identities)} 人）：{out}")
+        print("   先以 eval 確認有加速，再用 FACE_PROTOTYPES=1 / load_matcher(prototypes=True) 啟用")
+    else:
+        if args.synthetic:
+            from src.facedb.index import synthetic_gallery
+            enc, labels, _ = synthetic_gallery(args.synthetic, shots=15, spread=0.6, noise=0.25)
+            names = [f"p{l:05d}" for l in labels]
+        else:
+            db = face_database.load_db(db_path)
+            enc, names = db["encodings"], db["names"]
+        print(json.dumps(evaluate(enc, names, per_identity=args.k, method=args.method, slack=args.slack),
+                         indent=2))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""quant.py – 量化的特徵庫（float16 / 逐維縮放 int8）＋ float32 精確重排
+
+    index = QuantizedIndex.build(matcher.gallery, "int8")       # 或 gallery.Gallery.quantized_index()
+    matcher.set_index(index)                                     # FaceMatcher.match() 改走量化掃描
+    dist, ids = index.search(queries, k=32)                      # 距離為 float32 精確值
+
+• float16：直接轉型，每筆 256 bytes（float32 的 1/2、faces.pkl float64 的 1/4）
+• int8：每一維各自一個 scale＝該維最大絕對值 / 127，code = round(x / scale)；
+  每筆 128 bytes（float32 的 1/4、float64 的 1/8）
+• 候選掃描：|q|² + |ĝ|² − 2·(q⊙scale)·code，code 逐塊轉成 float32 再做矩陣乘法，
+  暫存只有一塊（_CHUNK 列）；ĝ 的平方範數預先算好
+• 重排：每個查詢取前 k × rerank 筆候選，用原始 float32 特徵重算精確距離後取前 k；
+  float32 特徵放在 memmap（.gallery）時只有被重排到的那幾列會讀進記憶體
+• FaceMatcher 的 best / margin 由重排後的精確距離決定，與 float32 全掃描一致
+  （除非真正最近的一筆掉出候選，rerank 越大越不會發生）
+
+    python -m src.facedb.quant bench --sizes 5000 50000 --dtype int8 float16
+"""
+from __future__ import annotations
+
+import time
+from typing import Sequence
+
+import numpy as np
+
+from src.facedb.index import _CHUNK, GalleryIndex, _queries, _sq_norms, synthetic_gallery
+
+QUANT_DTYPES = ("float16", "int8")
+_INT8_MAX = 127
+
+
+# ------------------------- 量化 ------------------------- #
+def quantize(x: np.ndarray, dtype: str = "int8") -> tuple[np.ndarray, np.ndarray | None]:
+    """回傳 (codes, scale)；float16 的 scale 為 None，int8 的 scale 為 (D,) float32"""
+    x = np.asarray(x, np.float32)
+    if dtype == "float16":
+        return x.astype(np.float16), None
+    if dtype == "int8":
+        scale = (np.abs(x).max(axis=0) if len(x) else np.ones(x.shape[1], np.float32)) / _INT8_MAX
+        scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(x / scale), -_INT8_MAX, _INT8_MAX).astype(np.int8)
+        return codes, scale
+    raise ValueError(f"未知的量化格式：{dtype}（可用：{' / '.join(QUANT_DTYPES)}）")
+
+
+def dequantize(codes: np.ndarray, scale: np.ndarray | None = None) -> np.ndarray:
+    out = codes.astype(np.float32)
+    if scale is not None:
+        out *= scale
+    return out
+
+
+def code_sq_norms(codes: np.ndarray, scale: np.ndarray | None = None) -> np.ndarray:
+    """還原後每筆的平方範數（逐塊算，不會一次還原整個矩陣）"""
+    out = np.empty(len(codes), np.float32)
+    for s in range(0, len(codes), _CHUNK):
+        out[s:s + _CHUNK] = _sq_norms(dequantize(codes[s:s + _CHUNK], scale))
+    return out
+
+
+# ------------------------- 索引 ------------------------- #
+class QuantizedIndex(GalleryIndex):
+    """以量化特徵掃描候選、原始 float32 特徵重排。
+
+    vectors ─ float32 (N,D)，只在重排時依列號取用（可為 memmap）
+    codes   ─ float16 或 int8 (N,D)；scale 為 int8 的逐維縮放
+    rerank  ─ 候選數＝k × rerank
+    """
+
+    kind = "quant"
+
+    def __init__(self, vectors: np.ndarray, codes: np.ndarray, scale: np.ndarray | None = None,
+                 code_sq: np.ndarray | None = None, rerank: int = 4):
+        super().__init__(vectors)
+        if codes.shape != vectors.shape:
+            raise ValueError(f"codes shape {codes.shape} 與特徵 {vectors.shape} 不符")
+        self.codes = codes
+        self.scale = scale
+        self.code_sq = code_sq_norms(codes, scale) if code_sq is None else code_sq
+        self.rerank = max(1, int(rerank))
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, dtype: str = "int8", rerank: int = 4) -> "QuantizedIndex":
+        vectors = np.asarray(vectors, np.float32)
+        codes, scale = quantize(vectors, dtype)
+        return cls(vectors, codes, scale, rerank=rerank)
+
+    @property
+    def dtype(self) -> str:
+        return self.codes.dtype.name
+
+    @property
+    def nbytes(self) -> int:
+        """掃描時常駐的位元組數（codes + scale + 平方範數）"""
+        return self.codes.nbytes + self.code_sq.nbytes + (0 if self.scale is None else self.scale.nbytes)
+
+    def scan(self, queries) -> np.ndarray:
+        """(M,N) 量化後的近似平方距離"""
+        q = _queries(queries, self.dim)
+        qs = q * self.scale if self.scale is not None else q
+        d2 = np.empty((len(q), len(self.codes)), np.float32)
+        for s in range(0, len(self.codes), _CHUNK):
+            d2[:, s:s + _CHUNK] = qs @ self.codes[s:s + _CHUNK].astype(np.float32).T
+        d2 *= -2.0
+        d2 += self.code_sq
+        d2 += _sq_norms(q)[:, None]
+        return d2
+
+    def search(self, queries, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        q = _queries(queries, self.dim)
+        k = int(k)
+        out_d = np.full((len(q), k), np.inf, np.float32)
+        out_i = np.full((len(q), k), -1, np.int64)
+        n = min(len(self), k * self.rerank)
+        if not len(q) or not n:
+            return out_d, out_i
+        d2 = self.scan(q)
+        cand = np.argpartition(d2, n - 1, axis=1)[:, :n] if n < d2.shape[1] else \
+            np.broadcast_to(np.arange(n), (len(q), n))
+        # 精確重排：只取候選那幾列的 float32 特徵
+        exact = np.linalg.norm(self.vectors[cand.ravel()].reshape(len(q), n, self.dim) - q[:, None], axis=2)
+        order = np.argsort(exact, axis=1, kind="stable")[:, :k]
+        m = order.shape[1]
+        out_d[:, :m] = np.take_along_axis(exact, order, axis=1)
+        out_i[:, :m] = np.take_along_axis(cand, order, axis=1)
+        return out_d, out_i
+
+
+# ------------------------- 基準測試 ------------------------- #
+def benchmark(sizes: Sequence[int] = (5000, 50000), dtypes: Sequence[str] = QUANT_DTYPES,
+              rerank: int = 4, queries: int = 200, repeat: int = 3, seed: int = 0) -> list[dict]:
+    """每個大小 × 格式：常駐記憶體、單幀（5 張臉）比對延遲、與 float32 全掃描的一致率"""
+    from src.facedb.face_matcher import FaceMatcher
+
+    rows = []
+    for n in sizes:
+        gallery, labels, q = synthetic_gallery(n, shots=5, seed=seed)
+        q = np.resize(q, (queries, gallery.shape[1]))
+        full = FaceMatcher(gallery, [str(v) for v in labels])
+        ref = full.match(q)
+
+        def timed(m):
+            t = time.perf_counter()
+            for _ in range(repeat):
+                for s in range(0, len(q), 5):
+                    m.match(q[s:s + 5])
+            return (time.perf_counter() - t) / (repeat * ((len(q) + 4) // 5)) * 1e3
+
+        rows.append({"n": n, "dtype": "float32", "mbytes": (full.gallery.nbytes + full.sq_norms.nbytes) / 2 ** 20,
+                     "ms_per_frame": timed(full), "agreement": 1.0})
+        for dtype in dtypes:
+            m = FaceMatcher(gallery, [str(v) for v in labels])
+            index = QuantizedIndex.build(m.gallery, dtype, rerank)
+            m.set_index(index)
+            got = m.match(q)
+            rows.append({"n": n, "dtype": dtype, "mbytes": index.nbytes / 2 ** 20, "ms_per_frame": timed(m),
+                         "agreement": float(np.mean([a.name == b.name for a, b in zip(got, ref)]))})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="量化特徵庫：記憶體 / 延遲 / 一致率")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_bench = sub.add_parser("bench")
+    p_bench.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000])
+    p_bench.add_argument("--dtype", nargs="+", choices=QUANT_DTYPES, default=list(QUANT_DTYPES))
+    p_bench.add_argument("--rerank", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'N':>7} {'格式':>8} {'常駐 MB':>9} {'ms/幀':>8} {'一致率':>7}")
+    for r in benchmark(args.sizes, args.dtype, args.rerank):
+        print(f"{r['n']:>7} {r['dtype']:>8} {r['mbytes']:>9.2f} {r['ms_per_frame']:>8.2f} {r['agreement']:>7.3f}")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""shards.py – 依據點 / 部門 / 雜湊切分的特徵庫，平行查詢、逐 shard 熱重載
+
+    split_gallery("faces.gallery", "shards/", by="site")        # 一個據點一個 shard 檔
+    sg = ShardedGallery("shards/", allow=["hq", "site-a*"])     # 這台攝影機只比對允許的 shard
+    sg.watch(interval=2.0)                                      # 背景檢查檔案，有變就換掉那一個 shard
+    for m in sg.match(face_vecs):                               # 介面同 FaceMatcher.match
+        print(m.name, m.distance, m.margin)
+
+• 每個 shard 是一個獨立的 .gallery 檔（<目錄>/<shard 名>.gallery），第一次查詢才以 memmap 開啟；
+  有量化特徵時照樣走 quant.QuantizedIndex
+• allow：fnmatch 樣式，只有符合的 shard 會被開啟與查詢
+• 查詢時每個 shard 丟到執行緒池各自 FaceMatcher.match（矩陣運算會放開 GIL），
+  再合併成全域的最近的人與 margin；同一人出現在多個 shard 時取最近的距離
+• refresh()：比對每個 shard 檔的 (mtime_ns, size, inode)，只重新開啟有變動的 shard，
+  新的 shard 先開好才換上，查詢中的執行緒繼續用舊的那份，不會看到一半的特徵庫
+
+    python -m src.facedb.shards split face-capture/dataset/faces.gallery --by hash --shards 8
+    python -m src.facedb.shards info  face-capture/dataset/shards
+"""
+from __future__ import annotations
+
+import fnmatch
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Callable, Sequence
+
+import numpy as np
+
+from src.facedb.face_matcher import UNKNOWN, FaceMatcher, Match
+from src.facedb.gallery import GALLERY_SUFFIX, Gallery, write_gallery
+
+DEFAULT_SITE = "default"
+
+# key_fn(name, source) → shard 名
+KeyFn = Callable[[str, str], str]
+
+
+# ------------------------- 切分 ------------------------- #
+def site_key(name: str, source: str) -> str:
+    """來源照片為 <據點>/<人名>/<檔名> 時取據點，否則歸到 DEFAULT_SITE"""
+    parts = PurePosixPath(source).parts
+    return parts[0] if len(parts) >= 3 else DEFAULT_SITE
+
+
+def hash_key(shards: int) -> KeyFn:
+    """依人名 crc32 平均分到 shards 個 shard；同一人永遠在同一個 shard"""
+    width = len(str(shards - 1))
+    return lambda name, source: f"h{zlib.crc32(name.encode('utf-8')) % shards:0{width}d}"
+
+
+def split_gallery(gallery, out_dir, by: str | KeyFn = "site", shards: int = 8,
+                  dtype: str | None = None) -> dict[str, int]:
+    """把一個 .gallery 切成多個 shard 檔，回傳 {shard 名: 筆數}；out_dir 裡其他 shard 不會被刪除"""
+    g = gallery if isinstance(gallery, Gallery) else Gallery(gallery)
+    if by == "site":
+        key = site_key
+    elif by == "hash":
+        key = hash_key(shards)
+    elif callable(by):
+        key = by
+    else:
+        raise ValueError(f"未知的切分方式：{by}（可用：site / hash / 函式）")
+    names, sources = g.names, g.sources
+    keys = np.array([key(n, s) for n, s in zip(names, sources)], dtype=str)
+    out_dir = Path(out_dir)
+    counts = {}
+    for shard in np.unique(keys):
+        rows = np.flatnonzero(keys == shard)
+        write_gallery(out_dir / f"{shard}{GALLERY_SUFFIX}", g.embeddings[rows], [names[i] for i in rows],
+                      [sources[i] for i in rows], dtype or g.dtype)
+        counts[str(shard)] = len(rows)
+    return counts
+
+
+# ------------------------- 單一 shard ------------------------- #
+def _stamp(path: Path) -> tuple[int, int, int]:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class Shard:
+    """一個 shard 檔；matcher 第一次用到才開啟，空的 shard 為 None"""
+
+    def __init__(self, name: str, path: Path, tolerance: float = 0.45, min_margin: float = 0.0):
+        self.name = name
+        self.path = path
+        self.stamp = _stamp(path)
+        self.tolerance = tolerance
+        self.min_margin = min_margin
+        self._matcher: FaceMatcher | None = None
+        self._opened = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._opened
+
+    @property
+    def matcher(self) -> FaceMatcher | None:
+        if not self._opened:
+            with self._lock:
+                if not self._opened:
+                    g = Gallery(self.path)
+                    self._matcher = FaceMatcher.from_gallery(g, self.tolerance, self.min_margin) if len(g) else None
+                    self._opened = True
+        return self._matcher
+
+    def __len__(self) -> int:
+        return len(self.matcher) if self.matcher is not None else 0
+
+
+# ------------------------- 多個 shard ------------------------- #
+class ShardedGallery:
+    """一個目錄下的多個 shard，介面與 FaceMatcher 的 match / topk 相同。
+
+    allow    ─ fnmatch 樣式；None＝目錄下全部
+    workers  ─ 查詢執行緒數；None＝min(4, CPU 數)
+    preload  ─ True 時建構（與每次 refresh）就開啟全部 shard，否則第一次查詢才開
+    """
+
+    def __init__(self, directory, allow: Sequence[str] | None = None, tolerance: float = 0.45,
+                 min_margin: float = 0.0, workers: int | None = None, preload: bool = False):
+        self.directory = Path(directory)
+        self.allow = list(allow) if allow else None
+        self.tolerance = float(tolerance)
+        self.min_margin = float(min_margin)
+        self.preload = preload
+        self._pool = ThreadPoolExecutor(workers or min(4, os.cpu_count() or 1), thread_name_prefix="shard")
+        self._shards: dict[str, Shard] = {}
+        self._refresh_lock = threading.Lock()
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.last_reload_ms = 0.0
+        self.refresh()
+        if not self._shards:
+            raise FileNotFoundError(f"{self.directory} 沒有符合 {self.allow or '*'} 的 shard")
+
+    def _allowed(self, name: str) -> bool:
+        return self.allow is None or any(fnmatch.fnmatchcase(name, p) for p in self.allow)
+
+    @property
+    def shards(self) -> dict[str, Shard]:
+        return self._shards
+
+    # ------------------------- 熱重載 ------------------------- #
+    def refresh(self) -> list[str]:
+        """重新掃描目錄：新增 / 變動的 shard 換成新開的，刪掉的移除；回傳有變動的 shard 名"""
+        with self._refresh_lock:
+            t0 = time.perf_counter()
+            old = self._shards
+            new: dict[str, Shard] = {}
+            changed = []
+            for path in sorted(self.directory.glob(f"*{GALLERY_SUFFIX}")):
+                name = path.name[:-len(GALLERY_SUFFIX)]
+                if not self._allowed(name):
+                    continue
+                try:
+                    prev = old.get(name)
+                    if prev is not None and prev.stamp == _stamp(path):
+                        new[name] = prev
+                        continue
+                    shard = Shard(name, path, self.tolerance, self.min_margin)
+                    if self.preload or (prev is not None and prev.loaded):
+                        shard.matcher                   # 先開好再換上，查詢不必等
+                except (OSError, ValueError) as e:      # 寫到一半 / 剛被刪掉：保留舊的，下次再試
+                    print(f"⚠️ shard {name} 無法開啟：{e}")
+                    if name in old:
+                        new[name] = old[name]
+                    continue
+                new[name] = shard
+                changed.append(name)
+            changed += [name for name in old if name not in new]
+            self._shards = new                          # 單一參照替換，查詢端拿到的是完整的一份
+            if changed and old:
+                self.reloads += 1
+                self.last_reload_ms = (time.perf_counter() - t0) * 1e3
+            return changed
+
+    def watch(self, interval: float = 2.0) -> None:
+        """背景執行緒每 interval 秒 refresh() 一次"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                changed = self.refresh()
+                if changed:
+                    print(f"🔄 shard 已更新：{', '.join(changed)}（{self.last_reload_ms:.1f} ms）")
+
+        self._watcher = threading.Thread(target=loop, name="shard-watch", daemon=True)
+        self._watcher.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        self._pool.shutdown(wait=True)
+
+    # ------------------------- 查詢 ------------------------- #
+    def _fan(self, fn) -> list:
+        shards = list(self._shards.values())
+        if len(shards) == 1:
+            return [fn(shards[0])]
+        return list(self._pool.map(fn, shards))
+
+    def __len__(self) -> int:
+        return sum(self._fan(len))
+
+    @property
+    def identities(self) -> np.ndarray:
+        names = [m.identities for m in self._fan(lambda s: s.matcher) if m is not None]
+        return np.unique(np.concatenate(names)) if names else np.empty(0, str)
+
+    @property
+    def dim(self) -> int:
+        return next(m.dim for m in self._fan(lambda s: s.matcher) if m is not None)
+
+    def match(self, queries) -> list[Match]:
+        """每個 shard 各自比對再合併：最近的人取各 shard 最近者中最小的；
+        第二近＝其他人（各 shard 最近者）與「最近的人所在 shard」內的第二近，兩者取小"""
+        q = np.asarray(queries, np.float32)
+        if q.size == 0:
+            return []
+        q = q[None] if q.ndim == 1 else q
+        per_shard = [r for r in self._fan(lambda s: s.matcher.match(q) if s.matcher is not None else None)
+                     if r is not None]
+        if not per_shard:                               # 允許的 shard 全是空的
+            return [Match(UNKNOWN, UNKNOWN, np.inf, np.inf) for _ in q]
+        out = []
+        for i in range(len(q)):
+            cands = [r[i] for r in per_shard]
+            best = min(cands, key=lambda m: m.distance)
+            second = min([m.distance for m in cands if m.best != best.best] +
+                         [m.distance + m.margin for m in cands if m.best == best.best])
+            margin = second - best.distance
+            ok = best.distance <= self.tolerance and margin >= self.min_margin
+            out.append(Match(best.best if ok else UNKNOWN, best.best, best.distance, float(margin)))
+        return out
+
+    def topk(self, queries, k: int = 5) -> list[list[tuple[str, float]]]:
+        per_shard = [r for r in self._fan(lambda s: s.matcher.topk(queries, k) if s.matcher is not None else None)
+                     if r is not None]
+        out = []
+        for rows in zip(*per_shard):
+            merged: dict[str, float] = {}
+            for name, d in (pair for row in rows for pair in row):
+                merged[name] = min(d, merged.get(name, np.inf))
+            out.append(sorted(merged.items(), key=lambda x: x[1])[:k])
+        return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="特徵庫 shard 工具")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_split = sub.add_parser("split", help=".gallery → 多個 shard")
+    p_split.add_argument("gallery", type=Path)
+    p_split.add_argument("-o", "--output", type=Path, default=None, help="預設為 gallery 同目錄的 shards/")
+    p_split.add_argument("--by", choices=("site", "hash"), default="site")
+    p_split.add_argument("--shards", type=int, default=8, help="--by hash 時的 shard 數")
+    p_info = sub.add_parser("info", help="列出目錄下的 shard")
+    p_info.add_argument("directory", type=Path)
+    p_info.add_argument("--allow", nargs="*", default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "split":
+        out = args.output or args.gallery.parent / "shards"
+        for name, n in split_gallery(args.gallery, out, args.by, args.shards).items():
+            print(f"  • {name}：{n} 筆")
+        print(f"✅ 已寫入 {out}")
+    else:
+        sg = ShardedGallery(args.directory, args.allow, preload=True)
+        for name, shard in sg.shards.items():
+            m = shard.matcher
+            print(f"  • {name}：{len(shard)} 筆，{0 if m is None else len(m.identities)} 人")
+        sg.close()
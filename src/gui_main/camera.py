@@ -1,7 +1,33 @@
+"""
+camera.py – 攝影機 / 影片 / 圖片資料夾 取像
+
+• open_camera / read_frame / close_camera：原本的同步介面
+• FrameSource：背景執行緒持續擷取，放進有上限的 ring buffer
+    ‑ policy="latest"：read() 永遠拿最新一張，較舊的直接丟棄（即時顯示用）
+    ‑ policy="fifo"  ：read() 依序取出；buffer 滿時丟最舊的一張
+    ‑ drop=False     ：buffer 滿時擷取端等待，不丟幀（離線重播 / 基準測試用）
+  來源可為攝影機編號、影片檔或圖片資料夾；影片 / 資料夾可用 fps 指定重播速度
+  （None＝影片原生 FPS、0＝全速）。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
 import cv2
+import numpy as np
+
+from src.jetsoncv.startup import stage
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+
 
 def open_camera(cam_id=0):
-    cap = cv2.VideoCapture(cam_id)
+    with stage("camera open"):
+        cap = cv2.VideoCapture(cam_id)
     if not cap.isOpened():
         raise RuntimeError("❌ 無法開啟攝影機")
     return cap
@@ -16,11 +42,220 @@ def close_camera(cap):
     cap.release()
     print("📷 攝影機已關閉")
 
+
+# ────────────────────────────────────────────────
+# 背景擷取
+# ────────────────────────────────────────────────
+class Frame(NamedTuple):
+    image: np.ndarray
+    seq: int              # 擷取序號（含被丟棄的幀，可看出跳了幾張）
+    timestamp: float      # 擷取完成時間（time.monotonic()）
+    source: str           # 來源名稱
+
+
+class FrameSource:
+    """背景擷取 + 有上限的 ring buffer。
+
+    source      ─ 攝影機編號（int 或數字字串）、影片檔路徑、圖片資料夾
+    buffer_size ─ ring buffer 容量
+    policy      ─ "latest" | "fifo"
+    drop        ─ buffer 滿時丟最舊的（True）或讓擷取端等待（False）
+    fps         ─ 影片 / 資料夾的重播速度；None＝原生（資料夾視為全速）、0＝全速
+    loop        ─ 影片 / 資料夾播完後從頭重播
+    """
+
+    def __init__(self, source=0, buffer_size: int = 2, policy: str = "latest",
+                 drop: bool = True, fps: float | None = None, loop: bool = False,
+                 name: str | None = None):
+        if policy not in ("latest", "fifo"):
+            raise ValueError(f"未知的 policy：{policy}")
+        self.source = source
+        self.policy = policy
+        self.drop = drop
+        self.fps = fps
+        self.loop = loop
+        self.name = name or str(source)
+
+        self._buf: deque[Frame] = deque(maxlen=max(1, int(buffer_size)))
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self._eof = False
+        self.error: Exception | None = None
+
+        # 統計
+        self.grabbed = 0       # 成功擷取的幀數
+        self.dropped = 0       # 未被 read() 取走就被丟棄的幀數
+        self.delivered = 0     # read() 交付的幀數
+
+    # ------------------------- 來源 ------------------------- #
+    @property
+    def kind(self) -> str:
+        if isinstance(self.source, int) or str(self.source).isdigit():
+            return "camera"
+        return "dir" if Path(self.source).is_dir() else "video"
+
+    def _open(self):
+        kind = self.kind
+        if kind == "dir":
+            files = sorted(p for p in Path(self.source).rglob("*") if p.suffix.lower() in IMAGE_EXTS)
+            if not files:
+                raise RuntimeError(f"❌ 資料夾內沒有圖片：{self.source}")
+            return files, None
+        if kind == "camera":
+            with stage(f"camera open [{self.name}]"):
+                cap = cv2.VideoCapture(int(self.source))
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)     # 盡量不讓驅動端累積舊幀
+        else:
+            if not Path(self.source).exists():
+                raise RuntimeError(f"❌ 找不到影片檔：{self.source}")
+            cap = cv2.VideoCapture(str(self.source))
+        if not cap.isOpened():
+            raise RuntimeError(f"❌ 無法開啟來源：{self.source}")
+        return None, cap
+
+    def _frames(self):
+        """逐張產生影像；播完回傳"""
+        files, cap = self._open()
+        try:
+            if files is not None:
+                while True:
+                    for path in files:
+                        img = cv2.imread(str(path))
+                        if img is not None:
+                            yield img
+                    if not self.loop:
+                        return
+            else:
+                while True:
+                    ok, img = cap.read()
+                    if ok:
+                        yield img
+                    elif self.kind == "video" and self.loop:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    else:
+                        return
+        finally:
+            if cap is not None:
+                cap.release()
+
+    def _frame_interval(self) -> float:
+        if self.kind == "camera":
+            return 0.0                  # 攝影機本身就會節流
+        fps = self.fps
+        if fps is None and self.kind == "video":
+            cap = cv2.VideoCapture(str(self.source))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            cap.release()
+        return 1.0 / fps if fps else 0.0
+
+    # ------------------------- 擷取執行緒 ------------------------- #
+    def _run(self) -> None:
+        interval = self._frame_interval()
+        next_t = time.monotonic()
+        try:
+            for img in self._frames():
+                if not self._running:
+                    break
+                if interval:
+                    delay = next_t - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_t = max(next_t + interval, time.monotonic() - interval)
+                self._push(Frame(img, self.grabbed, time.monotonic(), self.name))
+        except Exception as e:      # 交給 read() 端回報
+            self.error = e
+        finally:
+            with self._cond:
+                self._eof = True
+                self._cond.notify_all()
+
+    def _push(self, frame: Frame) -> None:
+        with self._cond:
+            if len(self._buf) == self._buf.maxlen:
+                if self.drop:
+                    self.dropped += 1          # deque(maxlen) 會自動擠掉最舊的一張
+                else:
+                    self._cond.wait_for(lambda: len(self._buf) < self._buf.maxlen or not self._running)
+                    if not self._running:
+                        return
+            self._buf.append(frame)
+            self.grabbed += 1
+            self._cond.notify_all()
+
+    # ------------------------- 公開介面 ------------------------- #
+    def start(self) -> "FrameSource":
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=f"FrameSource[{self.name}]", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def read(self, timeout: float | None = None) -> Frame | None:
+        """取一幀；來源結束（或逾時）且 buffer 已空時回傳 None"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._buf or self._eof, timeout):
+                return None
+            if not self._buf:
+                if self.error is not None:
+                    raise RuntimeError(f"❌ 擷取失敗：{self.error}") from self.error
+                return None
+            if self.policy == "latest":
+                frame = self._buf.pop()
+                self.dropped += len(self._buf)
+                self._buf.clear()
+            else:
+                frame = self._buf.popleft()
+            self.delivered += 1
+            self._cond.notify_all()
+            return frame
+
+    def __iter__(self):
+        while (frame := self.read()) is not None:
+            yield frame
+
+    @property
+    def exhausted(self) -> bool:
+        with self._cond:
+            return self._eof and not self._buf
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"grabbed": self.grabbed, "dropped": self.dropped,
+                    "delivered": self.delivered, "buffered": len(self._buf)}
+
+    def __enter__(self) -> "FrameSource":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
 # ✅ 測試區：可以直接執行此檔測試
 if __name__ == "__main__":
-    print("🚀 測試 camera.py 啟動")
-    cap = open_camera()
-    frame = read_frame(cap)
-    print("✅ 成功讀取畫面，frame.shape =", frame.shape)
-    close_camera(cap)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="camera.py 測試 / FrameSource 重播")
+    parser.add_argument("--source", default=None, help="攝影機編號 / 影片 / 圖片資料夾；未指定則測試同步讀取")
+    parser.add_argument("--fps", type=float, default=None, help="重播速度，0＝全速")
+    args = parser.parse_args()
 
+    if args.source is None:
+        print("🚀 測試 camera.py 啟動")
+        cap = open_camera()
+        frame = read_frame(cap)
+        print("✅ 成功讀取畫面，frame.shape =", frame.shape)
+        close_camera(cap)
+    else:
+        t0 = time.monotonic()
+        with FrameSource(args.source, policy="fifo", drop=False, fps=args.fps) as src:
+            n = sum(1 for _ in src)
+            print(f"✅ {n} 幀，{n / (time.monotonic() - t0):.1f} FPS，統計 {src.stats()}")
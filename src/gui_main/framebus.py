@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""framebus.py – 以 multiprocessing.shared_memory 在行程間傳遞影格（零複製）
+
+    bus = FrameBus(slots=8, slot_shape=(1080, 1920, 3), readers=1)   # 主行程建立
+    Process(target=producer, args=(bus,)).start()                     # bus 可直接傳給子行程
+
+    # producer（例如 camera.FrameSource 所在行程）
+    bus.put(frame, camera_id=0, seq=n, timestamp=time.monotonic())
+    # 或先拿 slot 直接寫入（連一次複製都省掉）
+    slot = bus.acquire(); cv2.resize(src, dsize, dst=bus.view(slot, shape)); bus.publish(slot, meta...)
+
+    # consumer（偵測器行程）
+    for ref in bus.frames(reader=0):           # FrameRef：.image 為 shared memory 上的 view
+        with ref:                              # 離開 with 即 release
+            detect(ref.image)
+
+• 一塊 SharedMemory：開頭是每個 slot 的參考計數（int32），後面是固定數量的影格 slot
+• 影像本身不經過 pipe；只有 FrameMeta（slot、camera_id、seq、timestamp、shape）走 Queue
+• readers>1 時每個 reader 各有一條 meta 佇列，publish 後參考計數＝readers，
+  全部 reader release 後 slot 才回到可用狀態
+• slot 用完時 acquire() 會等待（背壓）；timeout 到期回傳 None，由 producer 決定丟幀
+• 預設 spawn context，與 enroll.EnrollEngine 一致（不 fork 已載入 CUDA / OpenCV 的行程）
+
+    python -m src.gui_main.framebus --size 1920x1080 --frames 300     # 與 mp.Queue 比較吞吐量
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+from src.gui_main.camera import Frame, FrameSource
+
+_ALIGN = 64
+_FREE, _WRITING = 0, -1
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """開啟既有的 SharedMemory。
+
+    子行程與建立者共用同一個 resource_tracker（登記以名稱去重），
+    因此不需要、也不能在這裡 unregister，unlink 一律由建立者負責。
+    """
+    return shared_memory.SharedMemory(name)
+
+
+class FrameMeta(NamedTuple):
+    slot: int
+    camera_id: int
+    seq: int
+    timestamp: float
+    shape: tuple
+    dtype: str = "uint8"
+
+
+class FrameRef:
+    """consumer 拿到的一幀；image 指向 shared memory，release() 之後不可再使用"""
+
+    __slots__ = ("bus", "meta", "image", "_released")
+
+    def __init__(self, bus: "FrameBus", meta: FrameMeta):
+        self.bus = bus
+        self.meta = meta
+        self.image = bus.view(meta.slot, meta.shape, meta.dtype)
+        self._released = False
+
+    def frame(self, source: str | None = None) -> Frame:
+        """轉成 camera.Frame（仍是 view，不複製）"""
+        return Frame(self.image, self.meta.seq, self.meta.timestamp,
+                     source if source is not None else str(self.meta.camera_id))
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.image = None
+            self.bus.release(self.meta.slot)
+
+    def __enter__(self) -> "FrameRef":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class FrameBus:
+    """固定 slot 數的共享記憶體影格匯流排。
+
+    slots      ─ slot 數（同時在途的最大影格數）
+    slot_shape ─ 單一 slot 的最大影像形狀；實際影格可以更小（shape 記在 FrameMeta）
+    readers    ─ 每一幀要交給幾個 consumer（各自一條 meta 佇列）
+    ctx        ─ multiprocessing context（或名稱）；bus 只能傳給同一 context 建立的行程
+    """
+
+    def __init__(self, slots: int = 8, slot_shape: tuple = (1080, 1920, 3), dtype="uint8",
+                 readers: int = 1, ctx: str | mp.context.BaseContext = "spawn"):
+        ctx = mp.get_context(ctx) if isinstance(ctx, str) else ctx
+        self.slots = max(1, int(slots))
+        self.slot_shape = tuple(slot_shape)
+        self.dtype = np.dtype(dtype).str
+        self.slot_bytes = _align(int(np.prod(self.slot_shape)) * np.dtype(dtype).itemsize)
+        self._header = _align(4 * self.slots)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self._header + self.slots * self.slot_bytes)
+        self._owner = True
+        self._lock = ctx.Lock()
+        self._free = ctx.Semaphore(self.slots)
+        self._queues = [ctx.Queue() for _ in range(max(1, int(readers)))]
+        self._bind()
+        self._refs[:] = _FREE
+
+        self.published = 0          # 以下統計只計本行程
+        self.dropped = 0
+
+    def _bind(self) -> None:
+        self._refs = np.ndarray((self.slots,), np.int32, buffer=self._shm.buf)
+
+    # ------------------------- 跨行程 ------------------------- #
+    def __getstate__(self) -> dict:
+        state = {k: v for k, v in self.__dict__.items() if k not in ("_shm", "_refs")}
+        state["_name"] = self._shm.name
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        name = state.pop("_name")
+        self.__dict__.update(state)
+        self._shm = _attach(name)
+        self._owner = False
+        self.published = self.dropped = 0
+        self._bind()
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def readers(self) -> int:
+        return len(self._queues)
+
+    # ------------------------- producer ------------------------- #
+    def view(self, slot: int, shape: tuple | None = None, dtype=None) -> np.ndarray:
+        shape = self.slot_shape if shape is None else tuple(shape)
+        dtype = np.dtype(dtype or self.dtype)
+        if int(np.prod(shape)) * dtype.itemsize > self.slot_bytes:
+            raise ValueError(f"影格 {shape} 超過 slot 容量 {self.slot_shape}")
+        return np.ndarray(shape, dtype, buffer=self._shm.buf, offset=self._header + slot * self.slot_bytes)
+
+    def acquire(self, timeout: float | None = None) -> int | None:
+        """取得一個可寫入的 slot；timeout 內都沒有空 slot 回傳 None"""
+        if not self._free.acquire(timeout=timeout):
+            return None
+        with self._lock:
+            slot = int(np.flatnonzero(self._refs == _FREE)[0])
+            self._refs[slot] = _WRITING
+        return slot
+
+    def publish(self, slot: int, camera_id: int = 0, seq: int = 0, timestamp: float | None = None,
+                shape: tuple | None = None, dtype=None) -> FrameMeta:
+        meta = FrameMeta(slot, camera_id, seq, time.monotonic() if timestamp is None else timestamp,
+                         self.slot_shape if shape is None else tuple(shape), np.dtype(dtype or self.dtype).str)
+        with self._lock:
+            self._refs[slot] = len(self._queues)
+        for q in self._queues:
+            q.put(meta)
+        self.published += 1
+        return meta
+
+    def put(self, image: np.ndarray, camera_id: int = 0, seq: int = 0, timestamp: float | None = None,
+            timeout: float | None = None) -> FrameMeta | None:
+        """把 image 複製進一個 slot 並發布；沒有空 slot 時回傳 None（算一次丟幀）"""
+        slot = self.acquire(timeout)
+        if slot is None:
+            self.dropped += 1
+            return None
+        try:
+            np.copyto(self.view(slot, image.shape, image.dtype), image)
+        except BaseException:
+            self._give_back(slot)
+            raise
+        return self.publish(slot, camera_id, seq, timestamp, image.shape, image.dtype)
+
+    def close_writer(self) -> None:
+        """通知所有 reader：不會再有新影格"""
+        for q in self._queues:
+            q.put(None)
+
+    # ------------------------- consumer ------------------------- #
+    def get(self, reader: int = 0, timeout: float | None = None) -> FrameRef | None:
+        """取下一幀；逾時或 producer 已 close_writer 時回傳 None"""
+        try:
+            meta = self._queues[reader].get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return None if meta is None else FrameRef(self, meta)
+
+    def frames(self, reader: int = 0) -> Iterator[FrameRef]:
+        """逐幀產生，直到 producer close_writer()"""
+        while (ref := self.get(reader)) is not None:
+            yield ref
+
+    def release(self, slot: int) -> None:
+        with self._lock:
+            self._refs[slot] -= 1
+            freed = self._refs[slot] == _FREE
+        if freed:
+            self._free.release()
+
+    def _give_back(self, slot: int) -> None:
+        with self._lock:
+            self._refs[slot] = _FREE
+        self._free.release()
+
+    def in_use(self) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._refs != _FREE))
+
+    # ------------------------- 關閉 ------------------------- #
+    def close(self) -> None:
+        """釋放本行程的對應；建立者另外 unlink 整塊記憶體"""
+        self._refs = None
+        try:
+            self._shm.close()
+        except BufferError:             # 還有 view 沒釋放：對應留給行程結束時回收
+            pass
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self) -> "FrameBus":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def pump(source: FrameSource, bus: FrameBus, camera_id: int = 0, timeout: float | None = None,
+         close: bool = True) -> int:
+    """把 FrameSource 的每一幀寫進 bus（capture 行程的主迴圈）；回傳發布的幀數"""
+    n = 0
+    with source:
+        for frame in source:
+            if bus.put(frame.image, camera_id, frame.seq, frame.timestamp, timeout) is not None:
+                n += 1
+    if close:
+        bus.close_writer()
+    return n
+
+
+# ------------------------- 基準測試 ------------------------- #
+def _produce_bus(bus: FrameBus, shape: tuple, frames: int) -> None:
+    img = np.zeros(shape, np.uint8)
+    for i in range(frames):
+        img[0, 0, 0] = i % 256
+        bus.put(img, seq=i)
+    bus.close_writer()
+    bus.close()
+
+
+def _produce_queue(q, shape: tuple, frames: int) -> None:
+    img = np.zeros(shape, np.uint8)
+    for i in range(frames):
+        img[0, 0, 0] = i % 256
+        q.put((i, time.monotonic(), img))
+    q.put(None)
+
+
+def benchmark(shape: tuple = (1080, 1920, 3), frames: int = 200, slots: int = 8,
+              ctx: str = "spawn") -> dict:
+    """另一個行程產生 frames 張影格，本行程讀取；回傳 FrameBus / mp.Queue 的 FPS 與 MB/s"""
+    ctx_ = mp.get_context(ctx)
+    mb = int(np.prod(shape)) / 1e6
+    result = {"shape": list(shape), "frames": frames, "slots": slots}
+
+    with FrameBus(slots, shape, ctx=ctx_) as bus:
+        proc = ctx_.Process(target=_produce_bus, args=(bus, shape, frames))
+        proc.start()
+        ref = bus.get()                     # 從第一幀開始計時（排除子行程啟動時間）
+        t0 = time.perf_counter()
+        n, checksum = 1, 0
+        while ref is not None:
+            checksum += int(ref.image[0, 0, 0])
+            ref.release()
+            ref = bus.get()
+            n += ref is not None
+        dt = time.perf_counter() - t0
+        proc.join()
+    result["framebus"] = {"fps": (n - 1) / dt if dt > 0 else 0.0, "mb_s": (n - 1) * mb / dt if dt > 0 else 0.0,
+                          "received": n}
+
+    q = ctx_.Queue(maxsize=slots)
+    proc = ctx_.Process(target=_produce_queue, args=(q, shape, frames))
+    proc.start()
+    item = q.get()
+    t0 = time.perf_counter()
+    n = 1
+    while item is not None:
+        item = q.get()
+        n += item is not None
+    dt = time.perf_counter() - t0
+    proc.join()
+    result["mp_queue"] = {"fps": (n - 1) / dt if dt > 0 else 0.0, "mb_s": (n - 1) * mb / dt if dt > 0 else 0.0,
+                          "received": n}
+    result["speedup"] = result["framebus"]["fps"] / max(result["mp_queue"]["fps"], 1e-9)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="FrameBus 與 multiprocessing.Queue 吞吐量比較")
+    parser.add_argument("--size", default="1920x1080", help="影格大小 WxH")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    r = benchmark((h, w, 3), args.frames, args.slots)
+    if args.json:
+        print(json.dumps(r, indent=2))
+    else:
+        print(f"🖼️  {w}x{h}×{args.frames} 幀，{args.slots} slots")
+        for k in ("framebus", "mp_queue"):
+            print(f"   {k:<9} {r[k]['fps']:8.1f} FPS  {r[k]['mb_s']:8.1f} MB/s")
+        print(f"   FrameBus 快 {r['speedup']:.1f} 倍")
@@ -7,24 +7,47 @@ src/gui.py  –  Jetson‑FaceRecognizer 即時 GUI（CNN + 效能資訊）
 • 於畫面左上角即時顯示：
     ‑ FPS (整體流暢度)
     ‑ 單次推理時間 (ms) ＝ face_locations + face_encodings 全流程
-• 人臉框旁顯示「姓名 + 信心值」。
+• 人臉框旁顯示「track 編號 + 姓名 + 信心值」。
+• 以 FaceTracker 跨幀追蹤：特徵只在新 track、低信心或定期複查時才萃取。
+• 擷取 → 偵測 → 萃取/比對 → 顯示 各在自己的執行緒（pipeline.RecognitionPipeline），
+  以有上限的佇列串接；偵測跟不上時只在入口丟掉舊幀，畫面延遲不會累積。
+  左上角另顯示各階段耗時與佇列深度。
+• AdaptiveScheduler 在偵測階段依實測耗時決定偵測頻率、偵測縮放與每次萃取張數，
+  讓畫面維持 TARGET_FPS、偵測結果延遲不超過 MAX_LATENCY_MS。
+• 特徵庫熱重載：背景監看 faces.gallery / faces.pkl，用 capture_faces.py + regenerate_faces.py
+  註冊新的人之後自動換上新版（live.LiveMatcher），不必重啟；左上角顯示重載次數與耗時。
 • 按下「q」離開。
+• --profile-startup：跑到第一次推理完成後，印出各模組 import 時間與初始化階段耗時就結束。
 
 可調參數：
     TOLERANCE      ─ 比對容忍度 (越小越嚴格)
-    PROCESS_EVERY  ─ 每 N 幀才做一次推理 (降低算力)
+    TARGET_FPS     ─ 目標顯示 FPS
+    MAX_LATENCY_MS ─ 偵測結果最久可以落後幾 ms
     CAM_INDEX      ─ 攝影機索引 (0=內建, 1=USB…)
+    RELOAD_INTERVAL─ 特徵庫檔案輪詢間隔（秒）
+    FACE_SHARDS    ─ 環境變數，逗號分隔的 shard 樣式（例如 "hq,site-a*"）；設定時改用
+                     face-capture/dataset/shards/ 下允許的 shard，並在檔案更新時熱重載
+    FACE_PROTOTYPES─ 環境變數，設為 1 時有 faces.protos.npz 就先比原型（先以
+                     python -m src.facedb.prototypes eval 確認這份特徵庫真的變快）
 
 """
 
 
+from functools import partial
 from pathlib import Path
+import os
 import time
 
 import cv2                            # OpenCV 影像處理
-import face_recognition as fr         # face_recognition 函式庫
 
 from src.facedb import face_database # 讀取 faces.pkl 自家模組
+from src.facedb.live import LiveMatcher
+from src.facedb.shards import ShardedGallery
+from src.gui_main.camera import FrameSource
+from src.gui_main.pipeline import (Packet, RecognitionPipeline, format_stats, make_detector,
+                                   make_encoder)
+from src.gui_main.scheduler import AdaptiveScheduler
+from src.jetsoncv import startup
 
 
 # 置於 import 區域
@@ -56,102 +79,103 @@ def _update_gpu_util(interval=1.0):
 # 參數設定
 # ────────────────────────────────────────────────
 TOLERANCE: float   = 0.45   # 0~1，越小匹配越嚴格
-PROCESS_EVERY: int = 2      # 每 2 幀執行一次推理
+TARGET_FPS: float  = 20.0   # 目標顯示 FPS
+MAX_LATENCY_MS: float = 150.0  # 偵測結果最大延遲
 CAM_INDEX: int     = 0      # 攝影機 ID
+SHARDS: str        = os.environ.get("FACE_SHARDS", "")   # 這台攝影機允許比對的 shard
+PROTOTYPES: bool   = os.environ.get("FACE_PROTOTYPES", "") == "1"   # 先比原型（需先 eval 確認有加速）
+RELOAD_INTERVAL: float = 1.0  # 特徵庫檔案輪詢間隔（秒）
 FONT                = cv2.FONT_HERSHEY_SIMPLEX
 
-# ────────────────────────────────────────────────
-# 辅助函式
-# ────────────────────────────────────────────────
-
-def _confidence_from_distance(dist: float) -> float:
-    """將 dlib 距離 (0~1) 線性轉換為 0~100% 信心值。"""
-    return max(0.0, min(1.0, 1.0 - dist)) * 100.0
-
 # ────────────────────────────────────────────────
 # 主執行函式
 # ────────────────────────────────────────────────
 
-def run_gui() -> None:
-    """由 src/main.py 呼叫的入口點；獨立執行亦可。"""
+def run_gui(profile_startup: bool = False) -> None:
+    """由 src/main.py 呼叫的入口點；獨立執行亦可。
+
+    profile_startup=True 時第一次推理完成即印出啟動剖析並結束。
+    """
 
     # 1️⃣ 讀取特徵庫 -----------------------------------------------------
-    db = face_database.load_db()
-    encodings = db["encodings"]
-    names_db  = db["names"]
-    print(f"✅ faces.pkl 載入完成：共 {len(encodings)} 筆特徵，人物 {set(names_db)}")
+    if SHARDS:
+        matcher = face_database.open_shards(allow=SHARDS.split(","), tolerance=TOLERANCE)
+    else:
+        # 有 .gallery 時以 memmap 開啟；有索引檔時一併套用；檔案更新時背景換上新版
+        matcher = LiveMatcher(partial(face_database.load_matcher, tolerance=TOLERANCE, prototypes=PROTOTYPES),
+                              face_database.watched_files()).start(RELOAD_INTERVAL)
+    print(f"✅ 特徵庫載入完成：共 {len(matcher)} 筆特徵，人物 {{{', '.join(matcher.identities)}}}")
     #threading.Thread(target=_update_gpu_util, daemon=True).start()
 
 
-    # 2️⃣ 開啟攝影機 -----------------------------------------------------
-    cap = cv2.VideoCapture(CAM_INDEX)
-    if not cap.isOpened():
-        raise RuntimeError("❌ 無法開啟攝影機，請確認連線或權限")
-
-    frame_idx = 0             # 幀計數器 (決定何時推理)
-    boxes, labels = [], []    # 暫存結果
+    # 2️⃣ 建立管線：擷取 / 偵測 / 萃取各自一條執行緒，顯示留在主執行緒 ----------
+    source = FrameSource(CAM_INDEX, policy="latest", name="cam")
+    #detector = make_detector("fr", model="cnn")  # CNN 模型偵測
+    sched = AdaptiveScheduler(TARGET_FPS, MAX_LATENCY_MS)   # 依實測耗時調整偵測頻率 / 縮放 / 萃取張數
+    pipe = RecognitionPipeline(source, make_detector("fr"), make_encoder("fr"), matcher, scheduler=sched)
     prev_t = time.time()      # 上一幀時間，用來計算 FPS
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("❌ 讀取畫面失敗，程式結束")
-            break
-
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # 只有在指定間隔才執行人臉推理 (省算力)
-        inference_ms = 0.0
-        if frame_idx % PROCESS_EVERY == 0:
-            t0 = time.perf_counter()                 # ➜ 推理計時開始
-            #boxes = fr.face_locations(rgb, model="cnn")  # CNN 模型偵測
-            boxes = fr.face_locations(rgb, model="hog")
-            face_vecs = fr.face_encodings(rgb, boxes)
-            inference_ms = (time.perf_counter() - t0) * 1000  # 轉 ms
-            labels = []
-            for vec in face_vecs:
-                matches = fr.compare_faces(encodings, vec, tolerance=TOLERANCE)
-                if True in matches:
-                    idxs = [i for i, m in enumerate(matches) if m]
-                    dists = fr.face_distance([encodings[i] for i in idxs], vec)
-                    best_idx  = idxs[int(dists.argmin())]
-                    best_dist = dists.min()
-                    conf = _confidence_from_distance(best_dist)
-                    label = f"{names_db[best_idx]} {conf:.1f}%"
-                else:
-                    label = "Unknown"
-                labels.append(label)
-
-        # 3️⃣ 繪製框線與文字 ---------------------------------------------
-        for (top, right, bottom, left), label in zip(boxes, labels):
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-            cv2.putText(frame, label, (left, top - 10), FONT, 0.6, (0, 255, 0), 2)
-
-        # 4️⃣ 顯示效能資訊 ---------------------------------------------
+    def show(p: Packet) -> bool:
+        nonlocal prev_t
+        frame = p.image
+        if profile_startup:
+            return False
+
+        # 3️⃣ 顯示效能資訊 ---------------------------------------------
         curr_t = time.time()
         fps = 1.0 / (curr_t - prev_t) if curr_t != prev_t else 0.0
         prev_t = curr_t
-        info1 = f"FPS: {fps:.1f}"
-        info2 = f"Infer: {inference_ms:.1f} ms" if inference_ms else "Infer: ..."
+        stats = pipe.stats()
+        st = stats["stages"]
+        info1 = f"FPS: {fps:.1f}  Lat p95: {stats['latency']['p95_ms']:.0f} ms"
+        info2 = f"Det {st['detect']['mean_ms']:.1f} ms  Enc {st['encode']['mean_ms']:.1f} ms"
+        info2 += f"  Enc#: {pipe.tracker.encodes}"
+        info3 = "Q " + " ".join(f"{k}:{v['queue']['depth']}/{v['queue']['dropped']}"
+                                for k, v in st.items() if "queue" in v)
+        plan = pipe.plan
+        if plan is not None:
+            info3 += f"  Det 1/{plan.detect_every} x{plan.scale:.2f}  EncBudget {plan.encode_budget}"
         cv2.putText(frame, info1, (10, 20), FONT, 0.6, (0, 255, 0), 2)
         cv2.putText(frame, info2, (10, 45), FONT, 0.6, (0, 255, 0), 2)
-        cv2.putText(frame, _GPU_UTIL, (10, 70), FONT, 0.6, (0, 255, 0), 2)
-
-        # 5️⃣ 顯示視窗 & 退出判定 ---------------------------------------
+        cv2.putText(frame, info3, (10, 70), FONT, 0.6, (0, 255, 0), 2)
+        cv2.putText(frame, _GPU_UTIL, (10, 95), FONT, 0.6, (0, 255, 0), 2)
+        if isinstance(matcher, LiveMatcher):
+            db = f"DB: {len(matcher)}  reload {matcher.reloads} ({matcher.last_reload_ms:.0f} ms)"
+            if matcher.failures:
+                db += f"  fail {matcher.failures}"
+            cv2.putText(frame, db, (10, 120), FONT, 0.6, (0, 255, 0), 2)
+
+        # 4️⃣ 顯示視窗 & 退出判定 ---------------------------------------
         cv2.imshow("Jetson Face Recognition (CNN)", frame)
         if cv2.waitKey(1) & 0xFF == ord("q"):
             print("👋 使用者結束程式")
-            break
+            return False
+        return True
 
-        frame_idx += 1
+    try:
+        pipe.run(show)
+    except RuntimeError as e:               # 攝影機開不起來 / 擷取失敗
+        print(f"❌ {e}")
 
-    # 6️⃣ 清理資源 -----------------------------------------------------
-    cap.release()
+    # 5️⃣ 清理資源 -----------------------------------------------------
     cv2.destroyAllWindows()
+    if isinstance(matcher, LiveMatcher):
+        matcher.stop()
+    elif isinstance(matcher, ShardedGallery):   # 停掉 shard 監看執行緒與查詢執行緒池
+        matcher.close()
+    if profile_startup:
+        print(startup.report(["src.gui_main.gui", "face_recognition"]))
+    else:
+        print(format_stats(pipe.stats()))
 
 # ────────────────────────────────────────────────
 # 偵錯執行（直接 python src/gui.py）
 # ────────────────────────────────────────────────
 if __name__ == "__main__":
-    run_gui()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Jetson 即時人臉辨識 GUI")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="跑到第一次推理後印出 import / 初始化耗時並結束")
+    run_gui(parser.parse_args().profile_startup)
 
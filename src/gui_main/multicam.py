@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""multicam.py – 多路攝影機共用一份偵測器 / 萃取器 / 特徵庫
+
+    cam0 ─ capture ─┐                                          ┌─▶ [q] ─▶ render(cam0)
+    cam1 ─ capture ─┼─▶ [q] ─▶ detect（跨攝影機批次）─▶ [q] ─▶ encode/match ─┼─▶ [q] ─▶ render(cam1)
+    cam2 ─ capture ─┘                                          └─▶ [q] ─▶ render(cam2)
+
+    runner = MultiCameraRunner([FrameSource(0, name="door"), FrameSource(1, name="hall")],
+                               make_batch_detector("trt"), make_encoder("fr"), matcher)
+    stats = runner.run(on_frame=show)        # show(packet)；packet.frame.source 為攝影機名稱
+
+• 整個行程只有一份特徵庫、一份 dlib 模型、一個 TensorRT engine / CUDA context；
+  原本每路攝影機各開一個 gui.py 行程，記憶體約為 N 倍
+• detect 一次取走各攝影機已就緒的最新幀（最多 max_batch 張）送進 infer_batch；
+  encode 把這批所有要萃取的臉合成一次 matcher.match
+• 每路攝影機各自一個 FaceTracker（track 編號各自獨立）、各自的輸出佇列與統計
+• 即時模式各攝影機以 FrameSource(policy="latest") 只留最新幀；共用佇列 block，
+  慢的時候每路攝影機都只是丟自己的舊幀，不會有一路把其他路擠掉
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Callable, Sequence
+
+import cv2
+import numpy as np
+
+from src.gui_main.camera import FrameSource
+from src.gui_main.pipeline import (Closed, Encoder, Face, LatencyStats, Packet, StageQueue,
+                                   draw_faces, make_detector, make_encoder)
+from src.gui_main.tracker import FaceTracker
+
+BatchDetector = Callable[[Sequence[Packet]], "list[tuple[np.ndarray, np.ndarray | None]]"]
+
+
+def make_batch_detector(kind: str = "fr", scale: float = 1.0, model: str = "hog") -> BatchDetector:
+    """RetinaFace 後端（trt / onnx / cv2 / auto）一次推論整批；fr / ssd 逐張偵測"""
+    if kind in ("fr", "ssd"):
+        single = make_detector(kind, scale, model)
+        return lambda packets: [single(p) for p in packets]
+
+    from src.retinaface_infer.backends import create_backend
+    backend = create_backend(kind)
+
+    def detect(packets: Sequence[Packet]):
+        return [(d.boxes, d.landms) for d in backend.infer_batch([p.image for p in packets])]
+    return detect
+
+
+class _Camera:
+    """單一攝影機的狀態：來源、追蹤器、輸出佇列與統計"""
+
+    def __init__(self, source: FrameSource, tracker: FaceTracker, queue_size: int):
+        self.source = source
+        self.name = source.name
+        self.tracker = tracker
+        self.out = StageQueue(queue_size, "block", f"render[{source.name}]")
+        self.pending: set[int] = set()
+        self.e2e = LatencyStats()
+        self.rendered = 0
+
+    def stats(self, elapsed: float) -> dict:
+        return {"frames": self.rendered,
+                "fps": self.rendered / elapsed if elapsed > 0 else 0.0,
+                "encodes": self.tracker.encodes,
+                "source": self.source.stats(),
+                "queue": self.out.stats(),
+                "latency": self.e2e.summary()}
+
+
+class MultiCameraRunner:
+    """N 路來源 → 共用 detect / encode → 各自 render。
+
+    sources      ─ FrameSource 清單（name 需唯一）
+    detector     ─ detector(packets) → 每個 packet 的 (boxes xyxy, landmarks 或 None)
+    encoder      ─ encoder(rgb, boxes) → (N,D) 特徵；None＝只偵測 + 追蹤
+    max_batch    ─ 一次偵測最多幾幀；None＝攝影機數
+    tracker_factory ─ 每路攝影機各建一個 FaceTracker
+    其餘參數同 pipeline.RecognitionPipeline
+    """
+
+    def __init__(self, sources: Sequence[FrameSource], detector: BatchDetector,
+                 encoder: Encoder | None = None, matcher=None, max_batch: int | None = None,
+                 queue_size: int = 2, encode_budget: int | None = 8, headless: bool = False,
+                 tracker_factory: Callable[[], FaceTracker] = FaceTracker):
+        names = [s.name for s in sources]
+        if not sources or len(set(names)) != len(names):
+            raise ValueError(f"來源名稱需唯一且至少一個：{names}")
+        if encoder is not None and matcher is None:
+            raise ValueError("有 encoder 時需要 matcher")
+        self.cams = {s.name: _Camera(s, tracker_factory(), queue_size) for s in sources}
+        self.detector = detector
+        self.encoder = encoder
+        self.matcher = matcher
+        self.max_batch = max(1, int(max_batch or len(sources)))
+        self.encode_budget = encode_budget
+        self.headless = headless
+
+        n = len(sources)
+        self.queues = {"detect": StageQueue(n, "block", "detect"),
+                       "encode": StageQueue(max(queue_size, n), "block", "encode")}
+        self.latency = {"detect": LatencyStats(), "encode": LatencyStats(), "render": LatencyStats()}
+        self.batches = 0                        # detect 呼叫次數（幀數 / batches ＝ 平均批次）
+        self.batched_frames = 0
+
+        self._lock = threading.Lock()
+        self._errors: list[BaseException] = []
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._t0 = self._t1 = 0.0
+
+    # ------------------------- 各階段 ------------------------- #
+    def _capture(self, cam: _Camera, alive: list[int]) -> None:
+        q = self.queues["detect"]
+        try:
+            while not self._stop.is_set():
+                frame = cam.source.read(timeout=0.1)
+                if frame is None:
+                    if cam.source.exhausted:
+                        break
+                    continue
+                if not q.put(Packet(frame)):
+                    break
+        except BaseException as e:              # noqa: BLE001
+            self._fail(e)
+        finally:
+            with self._lock:
+                alive[0] -= 1
+                if alive[0] == 0:               # 最後一路結束才關閉共用佇列
+                    q.close()
+
+    def _take_batch(self, inbox: StageQueue, limit: int) -> list[Packet]:
+        """阻塞取第一個，再順手把已排隊的取走（不等待）；關閉且取空時丟出 Closed"""
+        batch = [inbox.get()]
+        while len(batch) < limit:
+            try:
+                p = inbox.get(timeout=0)
+            except Closed:
+                break
+            if p is None:
+                break
+            batch.append(p)
+        return batch
+
+    def _detect_loop(self) -> None:
+        inbox, outbox = self.queues["detect"], self.queues["encode"]
+        try:
+            while True:
+                try:
+                    batch = self._take_batch(inbox, self.max_batch)
+                except Closed:
+                    break
+                t = time.perf_counter()
+                results = self.detector(batch)
+                for p, (boxes, landmarks) in zip(batch, results):
+                    cam = self.cams[p.frame.source]
+                    with self._lock:
+                        tracks = cam.tracker.update(boxes, landmarks)
+                        p.faces = [Face(tr, tr.box.copy()) for tr in tracks]
+                        if self.encoder is not None:
+                            todo = [tr for tr in cam.tracker.encode_queue(tracks)
+                                    if tr.track_id not in cam.pending][:self.encode_budget]
+                            cam.pending.update(tr.track_id for tr in todo)
+                            p.todo = [Face(tr, tr.box.copy()) for tr in todo]
+                self.latency["detect"].add(time.perf_counter() - t)
+                self.batches += 1
+                self.batched_frames += len(batch)
+                for p in batch:
+                    if not outbox.put(p):
+                        return
+        except BaseException as e:              # noqa: BLE001
+            self._fail(e)
+        finally:
+            outbox.close()
+
+    def _encode_loop(self) -> None:
+        inbox = self.queues["encode"]
+        try:
+            while True:
+                try:
+                    batch = self._take_batch(inbox, self.max_batch)
+                except Closed:
+                    break
+                t = time.perf_counter()
+                if self.encoder is not None:
+                    self._encode(batch)
+                self.latency["encode"].add(time.perf_counter() - t)
+                for p in batch:
+                    if not self.cams[p.frame.source].out.put(p):
+                        return
+        except BaseException as e:              # noqa: BLE001
+            self._fail(e)
+        finally:
+            for cam in self.cams.values():
+                cam.out.close()
+
+    def _encode(self, batch: list[Packet]) -> None:
+        work = [p for p in batch if p.todo]
+        if not work:
+            return
+        try:
+            vecs = [np.asarray(self.encoder(p.rgb, [f.box for f in p.todo])) for p in work]
+            matches = iter(self.matcher.match(np.vstack(vecs)))       # 整批一次比對
+            with self._lock:
+                for p in work:
+                    cam = self.cams[p.frame.source]
+                    for f in p.todo:
+                        cam.tracker.set_identity(f.track, next(matches))
+        finally:
+            with self._lock:
+                for p in work:
+                    self.cams[p.frame.source].pending.difference_update(f.track.track_id for f in p.todo)
+
+    def _fail(self, e: BaseException) -> None:
+        self._errors.append(e)
+        self.stop()
+
+    # ------------------------- 執行 ------------------------- #
+    def start(self) -> "MultiCameraRunner":
+        self._t0 = time.perf_counter()
+        alive = [len(self.cams)]
+        for cam in self.cams.values():
+            cam.source.start()
+            self._threads.append(threading.Thread(target=self._capture, args=(cam, alive),
+                                                  name=f"multicam[capture:{cam.name}]", daemon=True))
+        self._threads += [threading.Thread(target=self._detect_loop, name="multicam[detect]", daemon=True),
+                          threading.Thread(target=self._encode_loop, name="multicam[encode]", daemon=True)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        for q in [*self.queues.values(), *(c.out for c in self.cams.values())]:
+            q.close(discard=True)
+
+    def run(self, on_frame: Callable[[Packet], bool | None] | None = None,
+            max_frames: int | None = None) -> dict:
+        """在呼叫端執行緒輪流 render 各攝影機；max_frames 為所有攝影機合計"""
+        self.start()
+        live = list(self.cams.values())
+        total = 0
+        try:
+            while live and (max_frames is None or total < max_frames):
+                idle = True
+                for cam in list(live):
+                    try:
+                        p = cam.out.get(timeout=0)
+                    except Closed:
+                        live.remove(cam)
+                        continue
+                    if p is None:
+                        continue
+                    idle = False
+                    t = time.perf_counter()
+                    draw_faces(p.image, p.faces)
+                    keep = True
+                    if on_frame is not None and not self.headless:
+                        keep = on_frame(p) is not False
+                    self.latency["render"].add(time.perf_counter() - t)
+                    cam.e2e.add(time.monotonic() - p.frame.timestamp)
+                    cam.rendered += 1
+                    total += 1
+                    if not keep:
+                        live = []
+                        break
+                if idle:
+                    time.sleep(0.002)
+        finally:
+            self._t1 = time.perf_counter()
+            self.stop()
+            for cam in self.cams.values():
+                cam.source.stop()
+            for t in self._threads:
+                t.join(timeout=2.0)
+        if self._errors:
+            raise self._errors[0]
+        return self.stats()
+
+    def stats(self) -> dict:
+        elapsed = (self._t1 or time.perf_counter()) - self._t0 if self._t0 else 0.0
+        stages = {name: {**lat.summary(), "queue": self.queues[name].stats()} if name in self.queues
+                  else lat.summary() for name, lat in self.latency.items()}
+        stages["detect"]["mean_batch"] = self.batched_frames / self.batches if self.batches else 0.0
+        frames = sum(c.rendered for c in self.cams.values())
+        return {
+            "frames": frames,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "elapsed_s": elapsed,
+            "stages": stages,
+            "cameras": {name: cam.stats(elapsed) for name, cam in self.cams.items()},
+        }
+
+
+def format_multicam_stats(stats: dict) -> str:
+    lines = [f"📷 {len(stats['cameras'])} 路，共 {stats['frames']} 幀，{stats['fps']:.1f} FPS；"
+             f"偵測平均批次 {stats['stages']['detect']['mean_batch']:.2f}"]
+    for name, c in stats["cameras"].items():
+        lines.append(f"   [{name}] {c['frames']:5d} 幀  {c['fps']:5.1f} FPS  萃取 {c['encodes']:4d} 次  "
+                     f"延遲 p50 {c['latency']['p50_ms']:.1f} / p95 {c['latency']['p95_ms']:.1f} ms  "
+                     f"丟 {c['source']['dropped']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="多路攝影機共用偵測器的辨識")
+    parser.add_argument("sources", nargs="+", help="攝影機編號 / 影片 / 圖片資料夾（可多個）")
+    parser.add_argument("--detector", default="auto", help="fr | ssd | trt | onnx | cv2 | auto")
+    parser.add_argument("--no-encode", action="store_true", help="只偵測 + 追蹤")
+    parser.add_argument("--headless", action="store_true", help="不開視窗")
+    parser.add_argument("--lossless", action="store_true", help="來源全速、不丟幀（基準測試）")
+    parser.add_argument("--max-frames", type=int, default=None, help="所有攝影機合計的幀數上限")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出統計")
+    args = parser.parse_args()
+
+    srcs = [FrameSource(s, policy="fifo" if args.lossless else "latest", drop=not args.lossless,
+                        fps=0 if args.lossless else None, name=f"cam{i}:{s}")
+            for i, s in enumerate(args.sources)]
+    encoder = matcher = None
+    if not args.no_encode:
+        from src.facedb import face_database
+        matcher = face_database.load_matcher()     # 與 GUI 相同：.gallery memmap + 索引
+        encoder = make_encoder("fr")
+    runner = MultiCameraRunner(srcs, make_batch_detector(args.detector), encoder, matcher,
+                               headless=args.headless)
+
+    def show(p: Packet) -> bool:
+        cv2.imshow(p.frame.source, p.image)
+        return cv2.waitKey(1) & 0xFF != ord("q")
+
+    result = runner.run(show, max_frames=args.max_frames)
+    if not args.headless:
+        cv2.destroyAllWindows()
+    print(json.dumps(result, ensure_ascii=False, indent=2) if args.json else format_multicam_stats(result))
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""pipeline.py – 多階段 producer / consumer 辨識管線
+
+    capture ──▶ [q] ──▶ detect ──▶ [q] ──▶ encode/match ──▶ [q] ──▶ render
+    (FrameSource)      (偵測 + 追蹤)       (萃取 + 比對)             (畫框 + imshow / headless)
+
+    pipe = RecognitionPipeline(FrameSource(0), make_detector("fr"), make_encoder("fr"), matcher)
+    stats = pipe.run(on_frame=show)          # render 在呼叫端執行緒（HighGUI 需要主執行緒）
+
+• 每個階段一條執行緒；cv2 / dlib / onnxruntime 推論時都會釋放 GIL，階段之間可真正重疊
+• 階段之間是有上限的 StageQueue：
+    ‑ "block"      ─ 滿了上游就等（背壓），不丟幀；離線重播 / 基準測試用
+    ‑ "drop_oldest"─ 滿了丟最舊的一個；即時模式只在 capture → detect 入口丟幀，
+                     下游用 block，背壓會一路傳回入口，已排進萃取的臉不會被丟掉
+• stats()：每個階段的處理數、耗時（mean / p50 / p95）、佇列深度 / 最大深度 / 丟棄數，
+  以及 capture → render 的端到端延遲
+• scheduler＝scheduler.AdaptiveScheduler 時，detect 階段每幀先 begin_frame()：
+  plan.detect 為 False 的幀只用追蹤預測畫框、不偵測也不萃取；偵測以 plan.scale 縮放，
+  每幀萃取張數上限為 plan.encode_budget；detect / encode 的耗時以 measure() 回饋給排程器
+• headless=True（或 on_frame=None）不開視窗，整條管線可在 CI 上以影片檔重播量測：
+
+    python -m src.gui_main.pipeline --source clip.mp4 --detector onnx --headless
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Callable, NamedTuple, Sequence
+
+import cv2
+import numpy as np
+
+from src.gui_main.camera import Frame, FrameSource
+from src.gui_main.scheduler import AdaptiveScheduler, Plan
+from src.gui_main.tracker import FaceTracker, Track
+from src.jetsoncv import startup
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+SSD_MODEL_DIR = Path(os.environ.get("FACE_DNN_DIR", "/home/user/models/face-dnn"))
+POLICIES = ("block", "drop_oldest")
+STAGES = ("capture", "detect", "encode", "render")
+
+
+class Closed(Exception):
+    """佇列已關閉且取空"""
+
+
+# ------------------------- 佇列 ------------------------- #
+class StageQueue:
+    """有上限的 FIFO；policy 決定滿了時 put() 要等待或丟最舊的"""
+
+    def __init__(self, maxsize: int = 2, policy: str = "block", name: str = ""):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的 policy：{policy}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.name = name
+        self._q: deque = deque()
+        self._cond = threading.Condition()
+        self.closed = False
+        self.puts = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item) -> bool:
+        """放入一個 item；佇列已關閉回傳 False"""
+        with self._cond:
+            if self.policy == "block":
+                self._cond.wait_for(lambda: len(self._q) < self.maxsize or self.closed)
+            if self.closed:
+                return False
+            if len(self._q) >= self.maxsize:
+                self._q.popleft()
+                self.dropped += 1
+            self._q.append(item)
+            self.puts += 1
+            self.max_depth = max(self.max_depth, len(self._q))
+            self._cond.notify_all()
+        return True
+
+    def get(self, timeout: float | None = None):
+        """取出一個 item；逾時回傳 None，已關閉且取空時丟出 Closed"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._q or self.closed, timeout):
+                return None
+            if not self._q:
+                raise Closed(self.name)
+            item = self._q.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self, discard: bool = False) -> None:
+        """不再接受 put()；discard=True 時一併丟掉尚未取出的 item（中止用）"""
+        with self._cond:
+            self.closed = True
+            if discard:
+                self.dropped += len(self._q)
+                self._q.clear()
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._q)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"depth": len(self._q), "max_depth": self.max_depth, "maxsize": self.maxsize,
+                    "policy": self.policy, "puts": self.puts, "dropped": self.dropped}
+
+
+# ------------------------- 量測 ------------------------- #
+class LatencyStats:
+    """保留最近 window 筆耗時（秒；None＝全部），回報 ms 的 mean / p50 / p95 / p99 / max"""
+
+    def __init__(self, window: int | None = 1000):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            s = np.asarray(self._samples, np.float64) * 1000.0
+        if s.size == 0:
+            return {"count": self.count, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0,
+                    "p99_ms": 0.0, "max_ms": 0.0}
+        p50, p95, p99 = np.percentile(s, [50, 95, 99])
+        return {"count": self.count, "mean_ms": float(s.mean()), "p50_ms": float(p50),
+                "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(s.max())}
+
+
+# ------------------------- 封包 ------------------------- #
+class Face(NamedTuple):
+    track: Track            # 身分會被 encode 階段更新，render 時讀到的是最新的
+    box: np.ndarray         # 偵測當下的框（之後的偵測不會改到這份）
+
+
+@dataclass
+class Packet:
+    frame: Frame
+    faces: list[Face] = field(default_factory=list)
+    todo: list[Face] = field(default_factory=list)     # 這幀要萃取特徵的臉
+    scale: float = 1.0                                  # 偵測前縮放（排程器決定）
+
+    @property
+    def image(self) -> np.ndarray:
+        return self.frame.image
+
+    @cached_property
+    def rgb(self) -> np.ndarray:
+        """BGR → RGB 只做一次，detect / encode 共用"""
+        return cv2.cvtColor(self.frame.image, cv2.COLOR_BGR2RGB)
+
+
+Detector = Callable[[Packet], "tuple[np.ndarray, np.ndarray | None]"]
+Encoder = Callable[[np.ndarray, Sequence[np.ndarray]], np.ndarray]
+
+
+# ------------------------- 偵測 / 萃取 ------------------------- #
+@lru_cache(maxsize=1)
+def _fr():
+    """face_recognition（會載入 dlib 模型）延到第一次推理才 import"""
+    with startup.stage("face_recognition import"):
+        import face_recognition
+    return face_recognition
+
+
+def xyxy_to_css(box) -> tuple[int, int, int, int]:
+    """x1,y1,x2,y2 → face_recognition 的 (top, right, bottom, left)"""
+    x1, y1, x2, y2 = (int(round(v)) for v in box)
+    return y1, x2, y2, x1
+
+
+def make_ssd_detector(model_dir: str | os.PathLike = SSD_MODEL_DIR, conf_thresh: float = 0.5,
+                      cuda: bool = False) -> Detector:
+    """OpenCV-DNN res10 SSD（face_dnn_detect.py 的模型）"""
+    model_dir = Path(model_dir)
+    with startup.stage("ssd load"):
+        net = cv2.dnn.readNetFromCaffe(str(model_dir / "deploy.prototxt"),
+                                       str(model_dir / "res10_300x300_ssd_iter_140000.caffemodel"))
+    if cuda:
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
+
+    def detect(p: Packet):
+        h, w = p.image.shape[:2]
+        net.setInput(cv2.dnn.blobFromImage(p.image, 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=False))
+        det = net.forward()[0, 0]
+        det = det[det[:, 2] > conf_thresh]
+        return (det[:, 3:7] * np.array([w, h, w, h], np.float32)).astype(np.float32), None
+    return detect
+
+
+def make_detector(kind: str = "fr", scale: float = 1.0, model: str = "hog") -> Detector:
+    """kind：fr（face_recognition，model=hog|cnn）| ssd（OpenCV-DNN）
+    | trt | onnx | cv2 | auto（RetinaFace 後端，附 landmark）"""
+    if kind == "ssd":
+        return make_ssd_detector()
+    if kind == "fr":
+        def detect(p: Packet):
+            s = scale * p.scale
+            rgb = p.rgb
+            if s != 1.0:
+                rgb = cv2.resize(rgb, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+            locs = _fr().face_locations(rgb, model=model)
+            boxes = np.array([(l, t, r, b) for t, r, b, l in locs], np.float32).reshape(-1, 4) / s
+            return boxes, None
+        return detect
+
+    from src.retinaface_infer.backends import create_backend
+    backend = create_backend(kind)
+
+    def detect(p: Packet):
+        s = scale * p.scale
+        image = p.image if s == 1.0 else cv2.resize(p.image, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+        det = backend.detect(image)
+        if s == 1.0:
+            return det.boxes, det.landms
+        return det.boxes / s, None if det.landms is None else det.landms / s
+    return detect
+
+
+def make_encoder(kind: str = "fr") -> Encoder:
+    if kind != "fr":
+        raise ValueError(f"未知的萃取器：{kind}")
+
+    def encode(rgb: np.ndarray, boxes: Sequence[np.ndarray]) -> np.ndarray:
+        return np.asarray(_fr().face_encodings(rgb, [xyxy_to_css(b) for b in boxes]))
+    return encode
+
+
+# ------------------------- 繪圖 ------------------------- #
+def confidence_from_distance(dist: float) -> float:
+    """將 dlib 距離 (0~1) 線性轉換為 0~100% 信心值。"""
+    return max(0.0, min(1.0, 1.0 - dist)) * 100.0
+
+
+def label(track: Track) -> str:
+    m = track.identity
+    if m is None:
+        return f"#{track.track_id} ..."
+    if not m.known:
+        return f"#{track.track_id} Unknown"
+    return f"#{track.track_id} {m.name} {confidence_from_distance(m.distance):.1f}%"
+
+
+def draw_faces(image: np.ndarray, faces: Sequence[Face]) -> None:
+    for f in faces:
+        top, right, bottom, left = xyxy_to_css(f.box)
+        cv2.rectangle(image, (left, top), (right, bottom), (0, 255, 0), 2)
+        cv2.putText(image, label(f.track), (left, top - 10), FONT, 0.6, (0, 255, 0), 2)
+
+
+# ------------------------- 管線 ------------------------- #
+class _Worker(threading.Thread):
+    """inbox → fn → outbox；inbox 關閉且取空後關閉 outbox，錯誤交給 on_error"""
+
+    def __init__(self, name: str, fn: Callable[[Packet], Packet | None], inbox: StageQueue,
+                 outbox: StageQueue, latency: LatencyStats, on_error: Callable[[BaseException], None]):
+        super().__init__(name=f"pipeline[{name}]", daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.latency = latency
+        self.on_error = on_error
+
+    def run(self) -> None:
+        try:
+            while True:
+                try:
+                    item = self.inbox.get()
+                except Closed:
+                    break
+                t = time.perf_counter()
+                out = self.fn(item)
+                self.latency.add(time.perf_counter() - t)
+                if out is not None and not self.outbox.put(out):
+                    break
+        except BaseException as e:              # noqa: BLE001 – 交給 run() 在主執行緒重新丟出
+            self.on_error(e)
+        finally:
+            self.outbox.close()
+
+
+class RecognitionPipeline:
+    """capture → detect → encode/match → render。
+
+    source       ─ FrameSource（尚未 start 亦可）
+    detector     ─ detector(packet) → (boxes (N,4) xyxy, landmarks (N,10) 或 None)
+    encoder      ─ encoder(rgb, boxes) → (N,D) 特徵；None＝只偵測 + 追蹤
+    matcher      ─ FaceMatcher；encoder 不為 None 時必填
+    realtime     ─ True：capture → detect 入口 drop_oldest（延遲優先）；False：全部 block（不丟幀）
+    queue_size   ─ detect → encode → render 各佇列容量
+    encode_budget─ 每幀最多萃取幾張臉（有 scheduler 時改用 plan.encode_budget）
+    scheduler    ─ AdaptiveScheduler：依實測耗時決定偵測頻率 / 縮放 / 萃取張數；None＝每幀偵測
+    headless     ─ 不呼叫 on_frame（不顯示），其餘照跑（含畫框）
+    latency_window ─ 各階段保留最近幾筆耗時算百分位；None＝全部（基準測試）
+    """
+
+    def __init__(self, source: FrameSource, detector: Detector, encoder: Encoder | None = None,
+                 matcher=None, tracker: FaceTracker | None = None, realtime: bool = True,
+                 queue_size: int = 2, encode_budget: int | None = 8, headless: bool = False,
+                 latency_window: int | None = 1000, scheduler: AdaptiveScheduler | None = None):
+        if encoder is not None and matcher is None:
+            raise ValueError("有 encoder 時需要 matcher")
+        self.source = source
+        self.detector = detector
+        self.encoder = encoder
+        self.matcher = matcher
+        self.tracker = tracker or FaceTracker()
+        self.encode_budget = encode_budget
+        self.scheduler = scheduler
+        self.plan: Plan | None = None           # 最近一幀的排程決策（畫面顯示用）
+        self.headless = headless
+        self.realtime = realtime
+
+        entry = "drop_oldest" if realtime else "block"
+        self.queues = {
+            "detect": StageQueue(1 if realtime else queue_size, entry, "detect"),
+            # 只有入口會丟幀（尚未偵測、沒有排進萃取的臉），_pending 不會因丟幀而殘留
+            "encode": StageQueue(queue_size, "block", "encode"),
+            "render": StageQueue(queue_size, "block", "render"),
+        }
+        self.latency = {name: LatencyStats(latency_window) for name in STAGES}
+        self.e2e = LatencyStats(latency_window)  # 擷取完成 → render 完成
+
+        self._lock = threading.Lock()           # 保護 tracker（detect 更新、encode 寫入身分）
+        self._pending: set[int] = set()         # 已排進萃取、結果還沒回來的 track_id
+        self._errors: list[BaseException] = []
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self.rendered = 0
+        self._t0 = self._t1 = 0.0
+
+    # ------------------------- 各階段 ------------------------- #
+    def _capture(self) -> None:
+        q = self.queues["detect"]
+        try:
+            first = True
+            while not self._stop.is_set():
+                frame = self.source.read(timeout=0.1)
+                if frame is None:
+                    if self.source.exhausted:
+                        break
+                    continue
+                if first:
+                    startup.mark("first frame")
+                    first = False
+                t = time.perf_counter()
+                if not q.put(Packet(frame)):
+                    break
+                self.latency["capture"].add(time.perf_counter() - t)     # 含背壓等待
+        except BaseException as e:              # noqa: BLE001
+            self._fail(e)
+        finally:
+            q.close()
+
+    def _detect(self, p: Packet) -> Packet:
+        sched = self.scheduler
+        budget = self.encode_budget
+        if sched is not None:
+            plan = self.plan = sched.begin_frame()
+            budget = plan.encode_budget
+            if not plan.detect:                 # 這幀不偵測：沿用追蹤預測的位置
+                with self._lock:
+                    p.faces = [Face(t, t.box.copy()) for t in self.tracker.predict_only()]
+                sched.end_frame()
+                return p
+            p.scale = plan.scale
+            with sched.measure("detect", scale=plan.scale):
+                boxes, landmarks = self.detector(p)
+        else:
+            boxes, landmarks = self.detector(p)
+        with self._lock:
+            tracks = self.tracker.update(boxes, landmarks)
+            p.faces = [Face(t, t.box.copy()) for t in tracks]
+            if self.encoder is not None:
+                todo = [t for t in self.tracker.encode_queue(tracks) if t.track_id not in self._pending]
+                todo = todo if budget is None else todo[:budget]
+                self._pending.update(t.track_id for t in todo)
+                p.todo = [Face(t, t.box.copy()) for t in todo]
+        if sched is not None:
+            sched.end_frame()
+        if self.latency["detect"].count == 0:
+            startup.mark("first inference")
+        return p
+
+    def _encode(self, p: Packet) -> Packet:
+        if p.todo:
+            try:
+                sched = self.scheduler
+                t0 = sched.clock() if sched is not None else 0.0
+                vecs = self.encoder(p.rgb, [f.box for f in p.todo])
+                if sched is not None:           # 萃取在另一條執行緒：只回報每張臉的成本，不算進偵測端的幀
+                    sched.record_encode(sched.clock() - t0, len(p.todo))
+                matches = self.matcher.match(vecs)
+                with self._lock:
+                    for f, m in zip(p.todo, matches):
+                        self.tracker.set_identity(f.track, m)
+            finally:
+                self._release(p)
+        return p
+
+    def _release(self, p: Packet) -> None:
+        with self._lock:
+            self._pending.difference_update(f.track.track_id for f in p.todo)
+
+    def _fail(self, e: BaseException) -> None:
+        self._errors.append(e)
+        self.stop()
+
+    # ------------------------- 執行 ------------------------- #
+    def start(self) -> "RecognitionPipeline":
+        self.source.start()
+        self._t0 = time.perf_counter()
+        q = self.queues
+        self._threads = [
+            threading.Thread(target=self._capture, name="pipeline[capture]", daemon=True),
+            _Worker("detect", self._detect, q["detect"], q["encode"], self.latency["detect"], self._fail),
+        ]
+        if self.encoder is not None:
+            self._threads.append(_Worker("encode", self._encode, q["encode"], q["render"],
+                                         self.latency["encode"], self._fail))
+        else:                                   # 只偵測：detect 直接接 render
+            self.queues["render"] = q["encode"]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self) -> None:
+        """中止：停止擷取並丟掉各佇列中的封包"""
+        self._stop.set()
+        for q in self.queues.values():
+            q.close(discard=True)
+
+    def run(self, on_frame: Callable[[Packet], bool | None] | None = None,
+            max_frames: int | None = None) -> dict:
+        """在呼叫端執行緒跑 render 階段直到來源結束 / on_frame 回傳 False / 達 max_frames。
+
+        on_frame(packet) 在畫框之後呼叫（imshow / 寫檔）；headless 時不呼叫。回傳 stats()。
+        """
+        self.start()
+        inbox = self.queues["render"]
+        try:
+            while max_frames is None or self.rendered < max_frames:
+                try:
+                    p = inbox.get(timeout=0.1)
+                except Closed:
+                    break
+                if p is None:
+                    continue
+                t = time.perf_counter()
+                draw_faces(p.image, p.faces)
+                keep = True
+                if on_frame is not None and not self.headless:
+                    keep = on_frame(p) is not False
+                self.latency["render"].add(time.perf_counter() - t)
+                self.e2e.add(time.monotonic() - p.frame.timestamp)
+                self.rendered += 1
+                if not keep:
+                    break
+        finally:
+            self._t1 = time.perf_counter()
+            self.stop()
+            self.source.stop()
+            for t in self._threads:
+                t.join(timeout=2.0)
+        if self._errors:
+            raise self._errors[0]
+        return self.stats()
+
+    def stats(self) -> dict:
+        elapsed = (self._t1 or time.perf_counter()) - self._t0 if self._t0 else 0.0
+        inboxes = {"capture": None, "detect": self.queues["detect"],
+                   "encode": self.queues["encode"] if self.encoder is not None else None,
+                   "render": self.queues["render"]}
+        stages = {}
+        for name in STAGES:
+            if name == "encode" and self.encoder is None:
+                continue
+            s = self.latency[name].summary()
+            if inboxes[name] is not None:
+                s["queue"] = inboxes[name].stats()
+            stages[name] = s
+        return {
+            **({"scheduler": self.scheduler.metrics()} if self.scheduler is not None else {}),
+            "frames": self.rendered,
+            "fps": self.rendered / elapsed if elapsed > 0 else 0.0,
+            "elapsed_s": elapsed,
+            "encodes": self.tracker.encodes,
+            "source": self.source.stats(),
+            "stages": stages,
+            "latency": self.e2e.summary(),
+        }
+
+
+def format_stats(stats: dict) -> str:
+    lines = [f"🎞️  {stats['frames']} 幀，{stats['fps']:.1f} FPS，萃取 {stats['encodes']} 次；"
+             f"端到端 p50 {stats['latency']['p50_ms']:.1f} ms / p95 {stats['latency']['p95_ms']:.1f} ms"]
+    for name, s in stats["stages"].items():
+        q = s.get("queue")
+        qs = f"  佇列 {q['depth']}/{q['maxsize']}（最大 {q['max_depth']}，丟 {q['dropped']}）" if q else ""
+        lines.append(f"   {name:<7} {s['count']:6d} 次  mean {s['mean_ms']:7.2f} ms  "
+                     f"p95 {s['p95_ms']:7.2f} ms{qs}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="多階段辨識管線（可 headless 以影片檔量測）")
+    parser.add_argument("--source", default="0", help="攝影機編號 / 影片 / 圖片資料夾")
+    parser.add_argument("--detector", default="fr", help="fr | ssd | trt | onnx | cv2 | auto")
+    parser.add_argument("--no-encode", action="store_true", help="只偵測 + 追蹤（不需要 dlib / 特徵庫）")
+    parser.add_argument("--headless", action="store_true", help="不開視窗")
+    parser.add_argument("--lossless", action="store_true", help="全部佇列 block、來源全速不丟幀（基準測試）")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出統計")
+    args = parser.parse_args()
+
+    src = FrameSource(args.source, policy="fifo" if args.lossless else "latest",
+                      drop=not args.lossless, fps=0 if args.lossless else None)
+    encoder = matcher = None
+    if not args.no_encode:
+        from src.facedb import face_database
+        matcher = face_database.load_matcher()     # 與 GUI 相同：.gallery memmap + 索引
+        encoder = make_encoder("fr")
+    pipe = RecognitionPipeline(src, make_detector(args.detector), encoder, matcher,
+                               realtime=not args.lossless, headless=args.headless)
+
+    def show(p: Packet) -> bool:
+        cv2.imshow("Recognition Pipeline", p.image)
+        return cv2.waitKey(1) & 0xFF != ord("q")
+
+    result = pipe.run(show, max_frames=args.max_frames)
+    if not args.headless:
+        cv2.destroyAllWindows()
+    print(json.dumps(result, ensure_ascii=False, indent=2) if args.json else format_stats(result))
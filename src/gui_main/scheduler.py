@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""scheduler.py – 依實測延遲自動調整偵測頻率 / 萃取張數 / 偵測縮放
+
+    sched = AdaptiveScheduler(target_fps=20, max_latency_ms=150)
+    while True:
+        plan = sched.begin_frame()
+        if plan.detect:
+            with sched.measure("detect", scale=plan.scale):
+                boxes = detect(resize(frame, plan.scale))
+            todo = todo[:plan.encode_budget]
+            with sched.measure("encode", count=len(todo)):
+                encode(todo)
+        sched.end_frame()
+
+以 EWMA 估計：
+    detect   ─ 偵測耗時，換算成 scale=1 的成本（耗時 ∝ 像素數 ∝ scale²）
+    encode   ─ 每張臉的萃取耗時
+    overhead ─ 每幀其餘開銷（擷取、畫圖、顯示）
+再選出：
+    detect_every ─ 每幾幀偵測一次：攤提後的成本塞進每幀預算，且「等待 + 偵測」不超過 max_latency
+    scale        ─ 偵測影像縮放；只有 detect_every 已到延遲上限仍超出預算才往下降
+    encode_budget─ 本次偵測後最多萃取幾張臉（至少 1，新面孔最終一定會被辨識）
+clock 可注入，搭配假偵測器即可在測試中模擬任意負載。
+萃取在另一條執行緒（pipeline.RecognitionPipeline）時改用 record_encode()：只更新每張臉的成本，
+不算進偵測執行緒目前這一幀的工作時間（否則 overhead 會被低估成 0）。
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple
+
+SCALES = (1.0, 0.85, 0.7, 0.6, 0.5)
+
+
+class Ewma:
+    def __init__(self, alpha: float = 0.2, value: float | None = None):
+        self.alpha = alpha
+        self.value = value
+
+    def update(self, x: float) -> float:
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+        return self.value
+
+    def get(self, default: float = 0.0) -> float:
+        return default if self.value is None else self.value
+
+
+class Plan(NamedTuple):
+    detect: bool
+    scale: float
+    encode_budget: int
+    detect_every: int
+
+
+class AdaptiveScheduler:
+    """target_fps / max_latency_ms 為目標；其餘為調整範圍"""
+
+    def __init__(self, target_fps: float = 20.0, max_latency_ms: float = 150.0,
+                 scales: tuple[float, ...] = SCALES, max_detect_every: int = 8, max_encode: int = 8,
+                 alpha: float = 0.2, clock: Callable[[], float] = time.perf_counter):
+        self.frame_budget = 1.0 / target_fps
+        self.max_latency = max_latency_ms / 1000.0
+        self.scales = tuple(sorted(scales, reverse=True))
+        self.max_detect_every = max_detect_every
+        self.max_encode = max_encode
+        self.clock = clock
+
+        self.detect_cost = Ewma(alpha)      # scale=1 時的偵測秒數
+        self.encode_cost = Ewma(alpha)      # 每張臉的萃取秒數
+        self.overhead = Ewma(alpha)         # 每幀其餘開銷
+        self.frame_time = Ewma(alpha)
+
+        self.detect_every = 1
+        self.scale = self.scales[0]
+        self.encode_budget = max_encode
+        self.frames = 0
+        self.detections = 0
+        self._since_detect = math.inf       # 第一幀一定偵測
+        self._frame_t0: float | None = None
+        self._work = 0.0                    # 本幀 measure() 累計的秒數
+        self._detected = False
+        self._lock = threading.Lock()       # 保護 EWMA：record_encode 可能來自其他執行緒
+
+    # ------------------------- 量測 ------------------------- #
+    def begin_frame(self) -> Plan:
+        self._frame_t0 = self.clock()
+        self._work = 0.0
+        self._detected = self._since_detect >= self.detect_every
+        return Plan(self._detected, self.scale, self.encode_budget, self.detect_every)
+
+    @contextmanager
+    def measure(self, kind: str, scale: float = 1.0, count: int = 1) -> Iterator[None]:
+        t = self.clock()
+        try:
+            yield
+        finally:
+            dt = self.clock() - t
+            self._work += dt
+            if kind == "detect":
+                with self._lock:
+                    self.detect_cost.update(dt / (scale * scale))
+            elif kind == "encode":
+                self.record_encode(dt, count)
+            else:
+                raise ValueError(f"未知的量測種類：{kind}")
+
+    def record_encode(self, dt: float, count: int) -> None:
+        """回報一次萃取（count 張臉共 dt 秒）；不計入目前這一幀，可從其他執行緒呼叫"""
+        if count > 0:
+            with self._lock:
+                self.encode_cost.update(dt / count)
+
+    def end_frame(self) -> None:
+        total = self.clock() - self._frame_t0
+        self.frames += 1
+        if self._detected:
+            self.detections += 1
+            self._since_detect = 1
+        else:
+            self._since_detect += 1
+        with self._lock:
+            self.frame_time.update(total)
+            self.overhead.update(max(0.0, total - self._work))
+            self._replan()
+
+    # ------------------------- 決策 ------------------------- #
+    def _replan(self) -> None:
+        if self.detect_cost.value is None:
+            return
+        avail = max(self.frame_budget - self.overhead.get(), 1e-4)   # 每幀可用於推理的秒數
+        enc = self.encode_cost.get()
+
+        for scale in self.scales:
+            det = self.detect_cost.get() * scale * scale
+            # 延遲：最多等 detect_every 幀才輪到偵測，再加上偵測本身
+            max_every = int((self.max_latency - det) // self.frame_budget)
+            max_every = min(self.max_detect_every, max_every)
+            if max_every < 1:
+                continue
+            # 攤提：至少留一張臉的萃取成本
+            every = max(1, math.ceil((det + enc) / avail))
+            if every <= max_every:
+                break
+        else:                                           # 最小縮放仍不夠：盡量撐住延遲
+            scale = self.scales[-1]
+            det = self.detect_cost.get() * scale * scale
+            every = max(1, min(self.max_detect_every,
+                               int((self.max_latency - det) // self.frame_budget)))
+
+        self.scale = scale
+        self.detect_every = every
+        spare = every * avail - det
+        self.encode_budget = int(max(1, min(self.max_encode, spare // enc if enc > 0 else self.max_encode)))
+
+    def metrics(self) -> dict:
+        """目前的估計值與決策（畫面顯示 / log 用）"""
+        ft = self.frame_time.get()
+        return {
+            "fps": 1.0 / ft if ft > 0 else 0.0,
+            "detect_ms": self.detect_cost.get() * self.scale ** 2 * 1000,
+            "encode_ms_per_face": self.encode_cost.get() * 1000,
+            "overhead_ms": self.overhead.get() * 1000,
+            "latency_ms": (self.detect_every * self.frame_budget
+                           + self.detect_cost.get() * self.scale ** 2) * 1000,
+            "detect_every": self.detect_every,
+            "scale": self.scale,
+            "encode_budget": self.encode_budget,
+            "frames": self.frames,
+            "detections": self.detections,
+        }
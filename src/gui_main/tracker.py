@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""tracker.py – IoU / 中心點追蹤，讓人臉特徵只在需要時才重新萃取
+
+    tracker = FaceTracker()
+    tracks = tracker.update(boxes_xyxy, landmarks)       # 每幀偵測結果
+    todo = [t for t in tracks if tracker.needs_encoding(t)]
+    for t, m in zip(todo, matcher.match(encode(todo))):
+        tracker.set_identity(t, m)
+
+• 關聯：成本 = (1 − IoU) + 正規化中心距離；IoU ≥ iou_thresh 或中心距離 ≤ center_thresh 才可配對
+  指派用 Hungarian（有 scipy 時）否則 greedy，兩者在人臉不重疊時結果相同
+• 運動預測：等速模型；有五點 landmark 時以 landmark 重心估速度（比框中心穩定）
+• 身分快取：每個 track 記住最近一次 Match，只有下列情況才需要重新萃取
+    ‑ 新 track
+    ‑ 不認得 / 距離大於 confident_distance，且距上次已過 retry_every 幀
+    ‑ 已認得，但距上次已過 reverify_every 幀（定期複查，避免換人後沿用舊身分）
+"""
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+
+from src.facedb.face_matcher import Match
+from src.retinaface_infer.nms import iou_matrix
+
+
+@lru_cache(maxsize=1)
+def _linear_sum_assignment():
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        return None
+    return linear_sum_assignment
+
+
+def _centers(boxes: np.ndarray) -> np.ndarray:
+    return (boxes[:, :2] + boxes[:, 2:]) * 0.5
+
+
+@dataclass
+class Track:
+    track_id: int
+    box: np.ndarray                       # (4,) x1,y1,x2,y2
+    first_frame: int
+    last_frame: int
+    landmarks: np.ndarray | None = None   # (10,)
+    velocity: np.ndarray = field(default_factory=lambda: np.zeros(2, np.float32))
+    hits: int = 1
+    misses: int = 0                       # 連續沒配到的幀數
+    identity: Match | None = None
+    encoded_frame: int = -1               # 上次萃取特徵的幀號
+
+    @property
+    def name(self) -> str | None:
+        return self.identity.name if self.identity is not None else None
+
+    def predicted(self, frame: int) -> np.ndarray:
+        """以等速模型預測 frame 時的框"""
+        shift = self.velocity * (frame - self.last_frame)
+        return self.box + np.tile(shift, 2)
+
+    def _anchor(self, box: np.ndarray, landmarks: np.ndarray | None) -> np.ndarray:
+        if landmarks is not None:
+            return landmarks.reshape(5, 2).mean(axis=0)
+        return (box[:2] + box[2:]) * 0.5
+
+    def update(self, box: np.ndarray, landmarks: np.ndarray | None, frame: int, smooth: float) -> None:
+        gap = max(1, frame - self.last_frame)
+        use_lm = landmarks is not None and self.landmarks is not None
+        prev = self._anchor(self.box, self.landmarks if use_lm else None)
+        curr = self._anchor(box, landmarks if use_lm else None)
+        self.velocity = smooth * self.velocity + (1.0 - smooth) * (curr - prev) / gap
+        self.box = box
+        self.landmarks = landmarks
+        self.last_frame = frame
+        self.hits += 1
+        self.misses = 0
+
+
+class FaceTracker:
+    """多目標人臉追蹤 + 每個 track 的身分快取。
+
+    iou_thresh        ─ IoU 至少這麼多才算同一張臉
+    center_thresh     ─ 或中心距離 ≤ 框對角線 × center_thresh（快速移動時 IoU 會掉到 0）
+    max_misses        ─ 連續這麼多幀沒配到就移除
+    reverify_every    ─ 已認得的 track 每隔幾幀重新萃取一次
+    retry_every       ─ 不認得 / 低信心的 track 每隔幾幀重試
+    confident_distance─ 距離 ≤ 此值才算高信心
+    assignment        ─ "auto"（有 scipy 用 Hungarian）| "hungarian" | "greedy"
+    """
+
+    def __init__(self, iou_thresh: float = 0.3, center_thresh: float = 0.5, max_misses: int = 10,
+                 reverify_every: int = 30, retry_every: int = 5, confident_distance: float = 0.4,
+                 predict: bool = True, smooth: float = 0.5, assignment: str = "auto"):
+        if assignment not in ("auto", "hungarian", "greedy"):
+            raise ValueError(f"未知的 assignment：{assignment}")
+        self.iou_thresh = iou_thresh
+        self.center_thresh = center_thresh
+        self.max_misses = max_misses
+        self.reverify_every = reverify_every
+        self.retry_every = retry_every
+        self.confident_distance = confident_distance
+        self.predict = predict
+        self.smooth = smooth
+        self.assignment = assignment
+
+        self.tracks: list[Track] = []
+        self.frame = -1
+        self._ids = itertools.count(1)
+        self.encodes = 0                  # set_identity 被呼叫（＝實際萃取）的次數
+
+    # ------------------------- 關聯 ------------------------- #
+    def _cost(self, pred: np.ndarray, dets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        iou = iou_matrix(pred, dets)
+        diag = np.hypot(pred[:, 2] - pred[:, 0], pred[:, 3] - pred[:, 1])
+        dist = np.linalg.norm(_centers(pred)[:, None] - _centers(dets)[None], axis=2)
+        dist /= np.maximum(diag, 1e-6)[:, None]
+        valid = (iou >= self.iou_thresh) | (dist <= self.center_thresh)
+        return (1.0 - iou) + dist, valid
+
+    def _assign(self, cost: np.ndarray, valid: np.ndarray) -> list[tuple[int, int]]:
+        lsa = _linear_sum_assignment() if self.assignment != "greedy" else None
+        if self.assignment == "hungarian" and lsa is None:
+            raise ModuleNotFoundError("assignment='hungarian' 需要 scipy")
+        if lsa is not None:
+            rows, cols = lsa(np.where(valid, cost, 1e6))
+            return [(r, c) for r, c in zip(rows, cols) if valid[r, c]]
+        pairs, used_r, used_c = [], set(), set()
+        for flat in np.argsort(np.where(valid, cost, np.inf), axis=None):
+            r, c = divmod(int(flat), cost.shape[1])
+            if not valid[r, c]:
+                break
+            if r not in used_r and c not in used_c:
+                pairs.append((r, c))
+                used_r.add(r)
+                used_c.add(c)
+        return pairs
+
+    def update(self, boxes, landmarks=None) -> list[Track]:
+        """輸入本幀偵測 (N,4) xyxy（與可選的 (N,10) landmarks），回傳本幀有配到的 track"""
+        self.frame += 1
+        dets = np.asarray(boxes, np.float32).reshape(-1, 4)
+        lms = None if landmarks is None else np.asarray(landmarks, np.float32).reshape(-1, 10)
+
+        pairs: list[tuple[int, int]] = []
+        if self.tracks and len(dets):
+            pred = np.stack([t.predicted(self.frame) if self.predict else t.box for t in self.tracks])
+            pairs = self._assign(*self._cost(pred, dets))
+
+        matched_t = {r for r, _ in pairs}
+        matched_d = {c for _, c in pairs}
+        for r, c in pairs:
+            self.tracks[r].update(dets[c], None if lms is None else lms[c], self.frame, self.smooth)
+        for i, t in enumerate(self.tracks):
+            if i not in matched_t:
+                t.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        for c in range(len(dets)):
+            if c not in matched_d:
+                self.tracks.append(Track(next(self._ids), dets[c], self.frame, self.frame,
+                                         None if lms is None else lms[c]))
+        return [t for t in self.tracks if t.misses == 0]
+
+    def predict_only(self) -> list[Track]:
+        """沒有做偵測的幀：回傳各 track 推算的位置（不改變 track 狀態）"""
+        self.frame += 1
+        return [Track(t.track_id, t.predicted(self.frame), t.first_frame, t.last_frame,
+                      identity=t.identity) for t in self.tracks if t.misses == 0]
+
+    # ------------------------- 身分快取 ------------------------- #
+    def needs_encoding(self, track: Track) -> bool:
+        if track.identity is None:
+            return True
+        since = self.frame - track.encoded_frame
+        confident = track.identity.known and track.identity.distance <= self.confident_distance
+        return since >= (self.reverify_every if confident else self.retry_every)
+
+    def encode_queue(self, tracks: list[Track], budget: int | None = None) -> list[Track]:
+        """需要萃取的 track，依優先順序（還沒有身分的先、再來是最久沒萃取的）截到 budget 張"""
+        todo = sorted((t for t in tracks if self.needs_encoding(t)),
+                      key=lambda t: (t.identity is not None, t.encoded_frame))
+        return todo if budget is None else todo[:budget]
+
+    def set_identity(self, track: Track, match: Match) -> None:
+        track.identity = match
+        track.encoded_frame = self.frame
+        self.encodes += 1
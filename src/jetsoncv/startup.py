@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""startup.py – 啟動時間剖析（import 時間 + 各初始化階段）
+
+    from src.jetsoncv.startup import stage
+    with stage("gallery load"):
+        db = load_db()
+
+• stage()：記錄某個初始化階段花了多久、在啟動後第幾秒開始；開銷只有兩次 perf_counter
+• profile_imports()：另開一個直譯器跑 `python -X importtime`，列出每個模組自身 / 累計 import 時間
+• report()：把上面兩者印成表格，供 `gui.py --profile-startup` 等入口使用
+
+    python -m src.jetsoncv.startup src.gui_main.gui src.retinaface_infer.backends
+"""
+from __future__ import annotations
+
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, NamedTuple, Sequence
+
+ROOT = Path(__file__).resolve().parents[2]
+_T0 = time.perf_counter()
+
+
+class Stage(NamedTuple):
+    name: str
+    start_s: float      # 相對於本模組 import（≈ 行程啟動）的開始時間
+    seconds: float
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_s: float
+    cumulative_s: float
+
+
+_STAGES: list[Stage] = []
+
+
+# ------------------------- 初始化階段 ------------------------- #
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        _STAGES.append(Stage(name, t - _T0, time.perf_counter() - t))
+
+
+def mark(name: str) -> None:
+    """記錄一個時間點（例如「第一幀」），seconds 為 0"""
+    _STAGES.append(Stage(name, time.perf_counter() - _T0, 0.0))
+
+
+def stages() -> list[Stage]:
+    return list(_STAGES)
+
+
+def reset() -> None:
+    global _T0
+    _STAGES.clear()
+    _T0 = time.perf_counter()
+
+
+# ------------------------- import 時間 ------------------------- #
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def parse_importtime(stderr: str) -> list[ImportTime]:
+    """解析 -X importtime 的輸出（單位 µs → 秒）"""
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            rows.append(ImportTime(m.group(3), int(m.group(1)) / 1e6, int(m.group(2)) / 1e6))
+    return rows
+
+
+def profile_imports(modules: Sequence[str]) -> tuple[float, list[ImportTime]]:
+    """在乾淨的直譯器裡 import modules，回傳 (總秒數, 每個模組的 ImportTime)"""
+    code = ("import time; t = time.perf_counter()\n"
+            f"for m in {list(modules)!r}: __import__(m)\n"
+            "print(time.perf_counter() - t)")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1]), parse_importtime(out.stderr)
+
+
+# ------------------------- 報表 ------------------------- #
+def report(modules: Sequence[str] = (), top: int = 15) -> str:
+    lines = []
+    if modules:
+        total, rows = profile_imports(modules)
+        lines.append(f"📦 import {', '.join(modules)}：{total * 1000:.0f} ms（冷啟動、獨立行程）")
+        for r in sorted(rows, key=lambda r: r.self_s, reverse=True)[:top]:
+            lines.append(f"   {r.self_s * 1000:8.1f} ms  (累計 {r.cumulative_s * 1000:8.1f} ms)  {r.module}")
+    if _STAGES:
+        lines.append("⏱️  初始化階段：")
+        for s in _STAGES:
+            lines.append(f"   +{s.start_s * 1000:8.1f} ms  {s.seconds * 1000:8.1f} ms  {s.name}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="列出 import 時間最久的模組")
+    parser.add_argument("modules", nargs="+")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    print(report(args.modules, args.top))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""async_infer.py – 多組 buffer 交錯的非同步推論（submit / collect）
+
+    pipe = AsyncInferencePipeline(create_backend("trt", num_slots=2))
+    t0 = pipe.submit(frame0)          # 前處理寫入 slot 0，排入推論後立即返回
+    t1 = pipe.submit(frame1)          # frame1 前處理 / 上傳與 frame0 推論重疊
+    dets0 = pipe.collect(t0)          # list[Detections]
+    raw1, metas1 = pipe.collect_raw(t1, borrow=True)   # 不複製，直接借用 slot 的輸出
+
+排程只依賴後端的 slot 介面（slot_input / launch / wait，見 backends.DetectorBackend），
+與 TensorRT 無關，可用假後端在 CPU 上測試。
+"""
+from __future__ import annotations
+
+import itertools
+from collections import OrderedDict, deque
+from typing import Iterator, Sequence
+
+import numpy as np
+
+from .backends import DetectorBackend
+from .preprocess import LetterboxMeta
+from .retinaface_post import Detections
+
+
+class AsyncInferencePipeline:
+    """以 depth 組 slot 做 ring buffer 的非同步推論。
+
+    • submit() 取得空閒 slot；若全部在途，先等待最舊的一組完成並把結果暫存（複製）
+    • collect() / collect_raw() 可依任意順序取回；未取回的 ticket 不會遺失
+    • borrow=True 時回傳 slot 輸出 buffer 的 view，於該 slot 下一次被 submit 前有效
+    """
+
+    def __init__(self, backend: DetectorBackend, depth: int | None = None):
+        self.backend = backend
+        self.depth = int(depth or backend.num_slots)
+        if not 1 <= self.depth <= backend.num_slots:
+            raise ValueError(f"depth={self.depth} 超出後端可用的 slot 數 {backend.num_slots}")
+        self._free: deque[int] = deque(range(self.depth))
+        self._inflight: OrderedDict[int, tuple[int, list[LetterboxMeta]]] = OrderedDict()
+        self._stash: dict[int, tuple[list[np.ndarray], list[LetterboxMeta]]] = {}
+        self._seq = itertools.count()
+        self.stalls = 0                    # submit 時因 slot 全滿而必須等待的次數
+
+    # ------------------------- 提交 ------------------------- #
+    def submit(self, frames: np.ndarray | Sequence[np.ndarray]) -> int:
+        """提交一張 (h,w,3) 或多張影像，回傳 ticket"""
+        if isinstance(frames, np.ndarray) and frames.ndim == 3:
+            frames = [frames]
+        if len(frames) > self.backend.max_batch:
+            raise ValueError(f"單次最多 {self.backend.max_batch} 張，收到 {len(frames)}")
+        if not self._free:
+            self.stalls += 1
+            self._retire_oldest()
+        slot = self._free.popleft()
+        buf = self.backend.slot_input(slot, len(frames))
+        metas = [self.backend.letterbox(f, out=buf[i])[1] for i, f in enumerate(frames)]
+        self.backend.launch(slot, len(frames))
+        ticket = next(self._seq)
+        self._inflight[ticket] = (slot, metas)
+        return ticket
+
+    def _retire_oldest(self) -> None:
+        ticket, (slot, metas) = self._inflight.popitem(last=False)
+        raw = self.backend.wait(slot)
+        self._stash[ticket] = ([r.copy() for r in raw], metas)
+        self._free.append(slot)
+
+    # ------------------------- 取回 ------------------------- #
+    def collect_raw(self, ticket: int, borrow: bool = False) -> tuple[list[np.ndarray], list[LetterboxMeta]]:
+        """阻塞取回 raw 輸出與 letterbox 資訊"""
+        if ticket in self._stash:
+            return self._stash.pop(ticket)
+        try:
+            slot, metas = self._inflight.pop(ticket)
+        except KeyError:
+            raise KeyError(f"未知或已取回的 ticket：{ticket}") from None
+        raw = self.backend.wait(slot)
+        if not borrow:
+            raw = [r.copy() for r in raw]
+        self._free.append(slot)
+        return raw, metas
+
+    def collect(self, ticket: int, conf_thresh: float | None = None,
+                nms_thresh: float | None = None) -> list[Detections]:
+        """阻塞取回解碼後的 Detections（原圖座標，陣列為新配置，可長期保留）"""
+        raw, metas = self.collect_raw(ticket, borrow=True)
+        return self.backend.postprocess(raw, metas, conf_thresh, nms_thresh)
+
+    def drain(self) -> Iterator[tuple[int, list[Detections]]]:
+        """依提交順序取回所有未取回的結果"""
+        for ticket in sorted(list(self._stash) + list(self._inflight)):
+            yield ticket, self.collect(ticket)
+
+    @property
+    def pending(self) -> int:
+        return len(self._inflight) + len(self._stash)
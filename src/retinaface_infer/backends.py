@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""backends.py – RetinaFace 推論後端抽象層
+
+DetectorBackend 統一「letterbox → 推論 → filter-first 解碼 → NMS → 還原原圖座標」，
+各後端只需實作模型載入與 forward：
+
+    • RetinaFaceTRT   （retinaface_trt.py）– Jetson / TensorRT + pycuda
+    • ONNXCPUBackend  （本檔）            – onnxruntime 或 OpenCV-DNN，純 CPU
+
+重量級依賴（tensorrt / pycuda / onnxruntime）都在 load() 時才 import，
+因此 x86 建置機也能 import 本套件並跑完整 detect → decode → NMS 流程。
+
+選擇後端：
+    backend = create_backend("auto")      # 先試 TRT，失敗就退回 CPU
+    backend = create_backend("onnx", model_path="retinaface.onnx")
+    dets = backend.infer_batch([frame0, frame1])   # list[Detections]（原圖像素）
+
+亦可用環境變數 RETINAFACE_BACKEND=trt|onnx|cv2|auto 指定預設值。
+"""
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from .nms import batched_nms
+from .preprocess import Letterbox, LetterboxMeta
+from .retinaface_post import Decoder, Detections, check_priors, prior_box
+from src.jetsoncv.startup import stage
+
+MODEL_DIR = Path(__file__).resolve().parent
+DEFAULT_ENGINE = MODEL_DIR / "retinaface.engine"
+DEFAULT_ONNX = MODEL_DIR / "retinaface.onnx"
+
+# 輸出最後一維 → 名稱（TRT binding / ONNX output 順序不保證，依 shape 判斷）
+_OUTPUT_BY_DIM = {4: "loc", 2: "conf", 10: "landms"}
+
+# 只有某一種後端認得的參數；auto 退回時要拿掉對方的參數
+_TRT_ONLY_KWARGS = ("num_slots",)
+_ONNX_ONLY_KWARGS = ("runtime", "max_batch", "input_size")
+
+
+def layout_from_shapes(shapes: Sequence[Sequence[int]]) -> tuple[str, ...]:
+    """依輸出 tensor 的最後一維推得 output_layout，例如 ('loc', 'conf', 'landms')"""
+    try:
+        layout = tuple(_OUTPUT_BY_DIM[int(s[-1])] for s in shapes)
+    except KeyError:
+        raise ValueError(f"無法辨識 RetinaFace 輸出 shape：{list(shapes)}") from None
+    if sorted(layout) != sorted(_OUTPUT_BY_DIM.values()):
+        raise ValueError(f"RetinaFace 應有 loc / conf / landms 三個輸出，收到 {layout}")
+    return layout
+
+
+class DetectorBackend(ABC):
+    """RetinaFace 推論後端介面。
+
+    子類別需實作：
+        load()           ─ 載入模型、配置 buffer（可重複呼叫）
+        input_shape      ─ (max_batch, H, W, C)，NHWC
+        output_layout    ─ raw 輸出順序，如 ('loc', 'conf', 'landms')
+        _input_view(n)   ─ 回傳可直接寫入的 (n,H,W,C) float32 輸入 buffer
+        _execute(n)      ─ 對前 n 張執行推論，回傳 raw 輸出（batch 為第 0 維）
+
+    非同步 slot 介面（async_infer.AsyncInferencePipeline 使用）：
+        slot_input(slot, n) / launch(slot, n) / wait(slot)
+    預設實作為每個 slot 一塊 numpy 輸入 buffer，launch 把 `_forward(batch)`
+    丟到背景執行緒；TensorRT 後端改以多組 pinned buffer + CUDA stream 覆寫。
+    """
+
+    name = "base"
+    num_slots: int = 2               # 非同步推論可同時在途的 buffer 組數
+    conf_thresh: float = 0.5
+    nms_thresh: float = 0.4
+    top_k: int | None = 750          # NMS 前的候選上限
+    logits: bool = True              # conf 輸出是否為 logits（retinaface.onnx 是）
+
+    def __init__(self) -> None:
+        """共用狀態：letterbox / decoder 快取與預設 slot 實作的 buffer；子類別需呼叫 super().__init__()"""
+        self._letterbox: Letterbox | None = None
+        self._decoder: Decoder | None = None
+        self._slot_inputs: dict[int, np.ndarray] = {}
+        self._slot_futures: dict = {}
+        self._slot_pool = None
+
+    @abstractmethod
+    def load(self) -> None: ...
+
+    @property
+    @abstractmethod
+    def input_shape(self) -> tuple[int, int, int, int]: ...
+
+    @property
+    @abstractmethod
+    def output_layout(self) -> tuple[str, ...]: ...
+
+    @abstractmethod
+    def _input_view(self, n: int) -> np.ndarray: ...
+
+    @abstractmethod
+    def _execute(self, n: int) -> list[np.ndarray]: ...
+
+    def _forward(self, batch: np.ndarray) -> list[np.ndarray]:
+        """對任意 (n,H,W,C) 輸入推論；僅預設的執行緒 slot 實作會用到"""
+        raise NotImplementedError(f"{type(self).__name__} 未實作 _forward，無法使用非同步 slot")
+
+    # ------------------------- 非同步 slot ------------------------- #
+    def slot_input(self, slot: int, n: int) -> np.ndarray:
+        if slot not in self._slot_inputs:
+            self._slot_inputs[slot] = np.empty(self.input_shape, dtype=np.float32)
+        return self._slot_inputs[slot][:n]
+
+    def launch(self, slot: int, n: int) -> None:
+        """非阻塞：開始推論 slot 內前 n 張（背景單一執行緒，依提交順序執行）"""
+        if self._slot_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._slot_pool = ThreadPoolExecutor(1, thread_name_prefix=f"{self.name}-infer")
+        self._slot_futures[slot] = self._slot_pool.submit(self._forward, self.slot_input(slot, n))
+
+    def wait(self, slot: int) -> list[np.ndarray]:
+        """阻塞直到 slot 推論完成，回傳 raw 輸出"""
+        return self._slot_futures.pop(slot).result()
+
+    # ------------------------- 共用流程 ------------------------- #
+    @property
+    def max_batch(self) -> int:
+        return self.input_shape[0]
+
+    @property
+    def priors(self) -> np.ndarray:
+        _, h, w, _ = self.input_shape
+        return prior_box(w, h)
+
+    @property
+    def letterbox(self) -> Letterbox:
+        _, h, w, _ = self.input_shape
+        if self._letterbox is None or (self._letterbox.in_h, self._letterbox.in_w) != (h, w):
+            self._letterbox = Letterbox(h, w)
+        return self._letterbox
+
+    @property
+    def decoder(self) -> Decoder:
+        priors = self.priors
+        if self._decoder is None or self._decoder.priors is not priors:
+            self._decoder = Decoder(priors, self.conf_thresh, logits=self.logits)
+        return self._decoder
+
+    def _prepare(self, frames: Sequence[np.ndarray]) -> list[LetterboxMeta]:
+        """letterbox 直接寫入後端的輸入 buffer"""
+        buf = self._input_view(len(frames))
+        return [self.letterbox(f, out=buf[i])[1] for i, f in enumerate(frames)]
+
+    def infer_batch(self, frames: Sequence[np.ndarray], conf_thresh: float | None = None,
+                    nms_thresh: float | None = None) -> list[Detections]:
+        """多張 BGR 影像 → 每張的 Detections（原圖像素座標）；超過 max_batch 時自動分批"""
+        results: list[Detections] = []
+        for start in range(0, len(frames), self.max_batch):
+            chunk = frames[start:start + self.max_batch]
+            metas = self._prepare(chunk)
+            raw = self._execute(len(chunk))
+            results += self.postprocess(raw, metas, conf_thresh, nms_thresh)
+        return results
+
+    def detect(self, frame: np.ndarray, conf_thresh: float | None = None,
+               nms_thresh: float | None = None) -> Detections:
+        return self.infer_batch([frame], conf_thresh, nms_thresh)[0]
+
+    def postprocess(self, raw: Sequence[np.ndarray], metas: Sequence[LetterboxMeta],
+                    conf_thresh: float | None = None, nms_thresh: float | None = None) -> list[Detections]:
+        out = dict(zip(self.output_layout, raw))
+        loc, conf, landms = out["loc"], out["conf"], out["landms"]
+        decoder = self.decoder
+        check_priors(loc.shape[1], decoder.priors)
+
+        decoded = []
+        for i in range(len(metas)):
+            d = decoder(loc[i], conf[i], landms[i], conf_thresh)
+            decoded.append(Detections(d.boxes.copy(), d.scores.copy(), d.landms.copy()))
+        keeps = batched_nms([d.boxes for d in decoded], [d.scores for d in decoded],
+                            self.nms_thresh if nms_thresh is None else nms_thresh, top_k=self.top_k)
+
+        results = []
+        for d, keep, meta in zip(decoded, keeps, metas):
+            boxes, landms_k = d.boxes[keep], d.landms[keep]
+            results.append(Detections(meta.boxes_to_source(boxes, out=boxes), d.scores[keep],
+                                      meta.landms_to_source(landms_k, out=landms_k)))
+        return results
+
+
+# ------------------------- CPU 後端 ------------------------- #
+class ONNXCPUBackend(DetectorBackend):
+    """retinaface.onnx 的 CPU 推論：優先 onnxruntime，沒有則用 OpenCV-DNN。
+
+    runtime: "auto" | "ort" | "cv2"
+    input_size: 無法從模型讀出輸入尺寸時（OpenCV-DNN）使用的 (H, W)
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str | os.PathLike = DEFAULT_ONNX, runtime: str = "auto",
+                 max_batch: int = 4, input_size: tuple[int, int] = (608, 640), lazy: bool = False):
+        super().__init__()
+        self.model_path = Path(model_path)
+        self.runtime = runtime
+        self._max_batch = int(max_batch)
+        self._hw = tuple(input_size)
+        self._session = None
+        self._net = None
+        self._layout: tuple[str, ...] | None = None
+        self._input: np.ndarray | None = None
+        if not lazy:
+            self.load()
+
+    def load(self) -> None:
+        if self._session is not None or self._net is not None:
+            return
+        if not self.model_path.exists():
+            raise FileNotFoundError(f"找不到 ONNX 模型：{self.model_path}")
+        runtime = self.runtime
+        if runtime in ("auto", "ort"):
+            try:
+                import onnxruntime as ort
+            except ModuleNotFoundError:
+                if runtime == "ort":
+                    raise
+                runtime = "cv2"
+            else:
+                with stage("onnx session"):
+                    self._session = ort.InferenceSession(str(self.model_path), providers=["CPUExecutionProvider"])
+                inp = self._session.get_inputs()[0]
+                self._input_name = inp.name
+                if isinstance(inp.shape[1], int) and isinstance(inp.shape[2], int):
+                    self._hw = (inp.shape[1], inp.shape[2])
+                self._output_names = [o.name for o in self._session.get_outputs()]
+                self._layout = layout_from_shapes([o.shape for o in self._session.get_outputs()])
+                runtime = "ort"
+        if runtime == "cv2":
+            import cv2
+            with stage("onnx session"):
+                self._net = cv2.dnn.readNetFromONNX(str(self.model_path))
+            self._output_names = list(self._net.getUnconnectedOutLayersNames())
+        self.runtime = runtime
+        self._input = np.empty((self._max_batch,) + self._hw + (3,), dtype=np.float32)
+
+    @property
+    def input_shape(self) -> tuple[int, int, int, int]:
+        return (self._max_batch,) + self._hw + (3,)
+
+    @property
+    def output_layout(self) -> tuple[str, ...]:
+        if self._layout is None:
+            raise RuntimeError("尚未執行過推論，output_layout 未知（OpenCV-DNN 需實際 forward 後才知道 shape）")
+        return self._layout
+
+    def _input_view(self, n: int) -> np.ndarray:
+        self.load()
+        return self._input[:n]
+
+    def _execute(self, n: int) -> list[np.ndarray]:
+        return self._forward(self._input[:n])
+
+    def _forward(self, batch: np.ndarray) -> list[np.ndarray]:
+        self.load()
+        if self._session is not None:
+            outs = self._session.run(self._output_names, {self._input_name: batch})
+        else:
+            self._net.setInput(batch)
+            outs = list(self._net.forward(self._output_names))
+            if self._layout is None:
+                self._layout = layout_from_shapes([o.shape for o in outs])
+        return outs
+
+
+# ------------------------- 工廠 ------------------------- #
+def _without(kwargs: dict, keys: Sequence[str]) -> dict:
+    return {k: v for k, v in kwargs.items() if k not in keys}
+
+
+def create_backend(name: str | None = None, model_path: str | os.PathLike | None = None,
+                   **kwargs) -> DetectorBackend:
+    """依名稱建立後端：trt | onnx（onnxruntime 優先）| cv2（OpenCV-DNN）| auto。
+
+    auto：先嘗試 TensorRT engine；缺少 tensorrt / pycuda / engine 檔時退回 CPU。
+    只有單一後端認得的參數（num_slots / runtime、max_batch、input_size）在 auto 下只交給該後端。
+    """
+    name = (name or os.environ.get("RETINAFACE_BACKEND", "auto")).lower()
+    if name == "trt":
+        from .retinaface_trt import RetinaFaceTRT
+        return RetinaFaceTRT(str(model_path or DEFAULT_ENGINE), **kwargs)
+    if name in ("onnx", "cv2"):
+        runtime = kwargs.pop("runtime", "auto")
+        if name == "cv2":
+            if runtime not in ("auto", "cv2"):
+                raise ValueError(f"cv2 後端固定用 OpenCV-DNN，不能指定 runtime={runtime!r}")
+            runtime = "cv2"
+        return ONNXCPUBackend(model_path or DEFAULT_ONNX, runtime=runtime, **kwargs)
+    if name == "auto":
+        try:
+            return create_backend("trt", model_path, **_without(kwargs, _ONNX_ONLY_KWARGS))
+        except (ImportError, FileNotFoundError, RuntimeError) as e:
+            print(f"⚠️ TensorRT 後端無法使用（{e}），改用 CPU ONNX 後端")
+            return create_backend("onnx", None, **_without(kwargs, _TRT_ONLY_KWARGS))
+    raise ValueError(f"未知的偵測後端：{name}（可用：trt / onnx / cv2 / auto）")
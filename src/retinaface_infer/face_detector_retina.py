@@ -7,17 +7,13 @@ face_detector_retina.py  ── 單張測試版
 """
 
 import cv2
-import os, tempfile
 
-from insightface.model_zoo import get_model
 
 # 1. 下載 / 載入官方 RetinaFace 模型
-print("🚀 重新下载官方 RetinaFace mnet025 模型并测试")
-
-# 临时目录，保证肯定是空的，程序会自动下载正确版本
-temp_root = tempfile.mkdtemp()
-
 def get_detector():
+    # insightface 很重，呼叫時才 import
+    from insightface.model_zoo import get_model
+
     # 把名稱改成有效的型號
     return get_model("retinaface_mnet025", root="~/.insightface")
 
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""nms.py – 可切換後端的 NMS（class-agnostic）
+
+後端（皆回傳「依分數由高到低」的保留 index，保留集合彼此一致）：
+    • greedy  – 原 retinaface_post.nms 的向量化 while 迴圈，適合大量候選
+    • matrix  – 先算 K×K IoU 矩陣再逐列抑制，少量候選時 Python 開銷最小
+    • cv2     – cv2.dnn.NMSBoxes（有安裝 OpenCV 時可用）
+    • auto    – 有 OpenCV 用 cv2，否則依候選數在 matrix / greedy 間挑選
+
+其他功能：
+    • top_k          – NMS 前只保留分數最高的 K 個候選
+    • soft_nms()     – linear / gaussian soft-NMS（method="hard" 等同一般 NMS）
+    • batched_nms()  – 多張影像的偵測一次做完（以 per-image 座標位移隔離）
+
+CLI 微基準：
+    python3 -m src.retinaface_infer.nms --sizes 10 100 1000
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable, Sequence
+
+import numpy as np
+
+# 沒有 OpenCV 時，候選數不超過此值才走 matrix（K×K IoU 矩陣），否則走 greedy
+MATRIX_MAX_CANDIDATES = 64
+
+NmsBackend = Callable[[np.ndarray, np.ndarray, float], np.ndarray]
+_BACKENDS: dict[str, NmsBackend] = {}
+
+
+def register_backend(name: str, fn: NmsBackend) -> None:
+    """註冊 NMS 後端。
+
+    fn(boxes, scores, thresh) 收到的 boxes/scores 已依分數由高到低排序，
+    需回傳保留者在排序後陣列中的位置（遞增）。
+    """
+    _BACKENDS[name] = fn
+
+
+def available_backends() -> list[str]:
+    return [name for name in _BACKENDS if name != "cv2" or _cv2() is not None]
+
+
+@lru_cache(maxsize=1)
+def _cv2():
+    try:
+        import cv2
+    except ModuleNotFoundError:
+        return None
+    return cv2
+
+
+# ------------------------- IoU ------------------------- #
+def _areas(boxes: np.ndarray) -> np.ndarray:
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N,4) × (M,4) → (N,M) IoU"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(rb - lt, 0.0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    return inter / (_areas(a)[:, None] + _areas(b)[None, :] - inter)
+
+
+# ------------------------- 後端 ------------------------- #
+def _nms_greedy(boxes, scores, thresh):
+    x1, y1, x2, y2 = boxes.T
+    areas = _areas(boxes)
+    order = np.arange(boxes.shape[0])
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= thresh]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def _nms_matrix(boxes, scores, thresh):
+    over = iou_matrix(boxes, boxes) > thresh
+    alive = np.ones(boxes.shape[0], dtype=bool)
+    keep = []
+    i = 0
+    while True:                         # 只走訪保留者，每次一列向量運算
+        keep.append(i)
+        alive &= ~over[i]
+        nxt = np.flatnonzero(alive[i + 1:])
+        if nxt.size == 0:
+            break
+        i += 1 + int(nxt[0])
+    return np.asarray(keep, dtype=np.intp)
+
+
+def _nms_cv2(boxes, scores, thresh):
+    cv2 = _cv2()
+    if cv2 is None:
+        raise RuntimeError("cv2 後端需要 opencv-python")
+    xywh = np.empty_like(boxes, dtype=np.float64)
+    xywh[:, :2] = boxes[:, :2]
+    xywh[:, 2:] = boxes[:, 2:] - boxes[:, :2]
+    # 輸入已依分數排序：改傳遞減的排名分數，避開 OpenCV 對 score_threshold >= 0 的限制
+    rank = np.arange(boxes.shape[0], 0, -1, dtype=np.float32)
+    idx = cv2.dnn.NMSBoxes(xywh, rank, 0.0, float(thresh))
+    return np.sort(np.asarray(idx, dtype=np.intp).reshape(-1))
+
+
+register_backend("greedy", _nms_greedy)
+register_backend("matrix", _nms_matrix)
+register_backend("cv2", _nms_cv2)
+
+
+def _pick_backend(n: int) -> str:
+    # 實測 cv2.dnn.NMSBoxes 在 10~1000 個候選皆最快（見本檔 CLI 微基準）
+    if _cv2() is not None:
+        return "cv2"
+    return "matrix" if n <= MATRIX_MAX_CANDIDATES else "greedy"
+
+
+# ------------------------- 公開 API ------------------------- #
+def _sorted_order(scores: np.ndarray, top_k: int | None) -> np.ndarray:
+    if top_k is not None and 0 < top_k < scores.shape[0]:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+        return part[np.argsort(-scores[part], kind="stable")]
+    return np.argsort(-scores, kind="stable")
+
+
+def nms(dets, scores, thresh=0.4, top_k: int | None = None, backend: str = "auto") -> np.ndarray:
+    """Hard NMS，回傳保留的 index（依分數由高到低）。
+
+    dets: (N,4) [x1,y1,x2,y2]；scores: (N,)；top_k: NMS 前的候選上限。
+    """
+    dets = np.asarray(dets)
+    scores = np.asarray(scores)
+    if dets.shape[0] == 0:
+        return np.empty(0, dtype=np.intp)
+    order = _sorted_order(scores, top_k)
+    if backend == "auto":
+        backend = _pick_backend(order.size)
+    try:
+        fn = _BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"未知的 NMS 後端：{backend}（可用：{available_backends()}）") from None
+    return order[fn(dets[order], scores[order], thresh)]
+
+
+def soft_nms(dets, scores, thresh=0.4, sigma=0.5, method="gaussian",
+             score_thresh=0.001, top_k: int | None = None):
+    """Soft-NMS，回傳 (keep, new_scores)；keep 依衰減後分數由高到低。
+
+    method: "linear"（IoU > thresh 時乘上 1-IoU）、"gaussian"（乘上 exp(-IoU²/sigma)）
+    或 "hard"（IoU > thresh 直接歸零，結果等同 nms()）。
+    """
+    dets = np.asarray(dets, dtype=np.float64)
+    new_scores = np.asarray(scores, dtype=np.float64).copy()
+    idx = _sorted_order(new_scores, top_k)
+    keep = []
+    while idx.size > 0:
+        m = int(np.argmax(new_scores[idx]))
+        i = idx[m]
+        keep.append(i)
+        idx = np.delete(idx, m)
+        if idx.size == 0:
+            break
+        iou = iou_matrix(dets[i:i + 1], dets[idx])[0]
+        if method == "gaussian":
+            new_scores[idx] *= np.exp(-(iou * iou) / sigma)
+        elif method == "linear":
+            new_scores[idx] *= np.where(iou > thresh, 1.0 - iou, 1.0)
+        elif method == "hard":
+            new_scores[idx] *= iou <= thresh
+        else:
+            raise ValueError(f"未知的 soft-NMS method：{method}")
+        idx = idx[new_scores[idx] > score_thresh]
+    keep = np.asarray(keep, dtype=np.intp)
+    return keep, new_scores[keep]
+
+
+def batched_nms(dets_list: Sequence[np.ndarray], scores_list: Sequence[np.ndarray],
+                thresh=0.4, top_k: int | None = None, backend: str = "auto") -> list[np.ndarray]:
+    """多張影像一次 NMS；回傳每張影像各自的保留 index。
+
+    以 image_idx × (最大座標 + 1) 平移各影像的框，使不同影像的框不可能重疊，
+    再對合併後的候選做單次 NMS。top_k 為每張影像各自的候選上限。
+    """
+    counts = [len(s) for s in scores_list]
+    if sum(counts) == 0:
+        return [np.empty(0, dtype=np.intp) for _ in counts]
+    local = [_sorted_order(np.asarray(s), top_k) for s in scores_list]
+    dets = np.concatenate([np.asarray(d, dtype=np.float64)[o] for d, o in zip(dets_list, local)])
+    scores = np.concatenate([np.asarray(s)[o] for s, o in zip(scores_list, local)])
+    image_id = np.repeat(np.arange(len(counts)), [o.size for o in local])
+
+    offset = (np.abs(dets).max() + 1.0) * 2.0
+    shifted = dets + (image_id * offset)[:, None]
+    keep = nms(shifted, scores, thresh, backend=backend)
+
+    keep_img = image_id[keep]
+    starts = np.concatenate([[0], np.cumsum([o.size for o in local])[:-1]])
+    return [local[b][keep[keep_img == b] - starts[b]] for b in range(len(counts))]
+
+
+# ------------------------- 微基準 ------------------------- #
+def random_candidates(n: int, seed: int = 0, clusters: int | None = None):
+    """產生聚集在數個人臉附近的候選框 (n,4) 與分數 (n,)，模擬 RetinaFace 輸出"""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(1, n // 10)
+    centers = rng.uniform(0.1, 0.9, size=(clusters, 2))
+    sizes = rng.uniform(0.03, 0.2, size=(clusters, 1))
+    which = rng.integers(0, clusters, size=n)
+    c = centers[which] + rng.normal(scale=0.01, size=(n, 2))
+    s = sizes[which] * rng.uniform(0.85, 1.15, size=(n, 1))
+    boxes = np.hstack([c - s / 2, c + s / 2]).astype(np.float32)
+    return boxes, rng.uniform(0.5, 1.0, size=n).astype(np.float32)
+
+
+def benchmark(sizes=(10, 100, 1000), repeat: int = 50, thresh: float = 0.4) -> dict:
+    """回傳 {backend: {n: 平均毫秒}}"""
+    import time
+
+    results: dict[str, dict[int, float]] = {}
+    runs: list[tuple[str, Callable]] = [(b, lambda d, s, b=b: nms(d, s, thresh, backend=b))
+                                        for b in available_backends()]
+    runs.append(("soft-gaussian", lambda d, s: soft_nms(d, s, thresh)))
+    for n in sizes:
+        boxes, scores = random_candidates(n)
+        for name, fn in runs:
+            fn(boxes, scores)  # warm-up
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                fn(boxes, scores)
+            results.setdefault(name, {})[n] = (time.perf_counter() - t0) / repeat * 1000
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="NMS 後端微基準")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    res = benchmark(args.sizes, args.repeat)
+    print("backend".ljust(16) + "".join(f"n={n:<10d}" for n in args.sizes))
+    for name, row in res.items():
+        print(name.ljust(16) + "".join(f"{row[n]:8.3f}ms " for n in args.sizes))
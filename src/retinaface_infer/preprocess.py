@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""preprocess.py – RetinaFace 前處理：等比例 letterbox + 就地正規化
+
+將 BGR uint8 影像等比例縮放後置中貼到 engine 的 H×W 畫布上，
+直接以 `(pixel - mean) * scale` 寫入呼叫端提供的 float32 buffer
+（例如 RetinaFaceTRT 的 page-locked `host_in[i]`），不產生整張 float 中間陣列。
+回傳的 LetterboxMeta 可把解碼後的框 / 五點座標換回原圖像素。
+
+純 CPU，不需 TensorRT；CLI 微基準：
+    python3 -m src.retinaface_infer.preprocess --image src/tests/output_retina.jpg
+"""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+# retinaface.onnx 吃 BGR、減均值、不縮放（與 Pytorch_Retinaface 相同）
+BGR_MEAN = (104.0, 117.0, 123.0)
+
+
+class LetterboxMeta(NamedTuple):
+    """letterbox 幾何資訊；scale_x / scale_y 為實際縮放倍率（考慮取整後的尺寸）"""
+    scale_x: float
+    scale_y: float
+    pad_x: int
+    pad_y: int
+    src_w: int
+    src_h: int
+    dst_w: int
+    dst_h: int
+
+    def boxes_to_source(self, boxes: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """正規化 [x1,y1,x2,y2]（相對 engine 輸入）→ 原圖像素座標"""
+        return self._points_to_source(boxes, 2, out)
+
+    def landms_to_source(self, landms: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """正規化五點 (K,10)（相對 engine 輸入）→ 原圖像素座標"""
+        return self._points_to_source(landms, 5, out)
+
+    def _points_to_source(self, arr, npts, out):
+        if out is None:
+            out = np.empty(arr.shape, dtype=np.float32)
+        pts = out.reshape(-1, npts, 2)
+        # x_src = (x_norm * dst_w - pad_x) / scale_x，y 同理
+        np.multiply(arr.reshape(-1, npts, 2), (self.dst_w / self.scale_x, self.dst_h / self.scale_y), out=pts)
+        pts -= (self.pad_x / self.scale_x, self.pad_y / self.scale_y)
+        return out
+
+
+class Letterbox:
+    """等比例縮放 + 置中補邊 + 就地正規化（NHWC，單張）。
+
+    in_h / in_w   ─ engine 輸入尺寸
+    mean / scale  ─ 正規化：(pixel - mean) * scale
+    pad_value     ─ 補邊區域寫入的值（正規化後），預設 0 即「均值色」
+    """
+
+    def __init__(self, in_h: int, in_w: int, mean=BGR_MEAN, scale: float = 1.0,
+                 pad_value: float = 0.0, interpolation: int = cv2.INTER_LINEAR):
+        self.in_h, self.in_w = int(in_h), int(in_w)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = float(scale)
+        self.pad_value = float(pad_value)
+        self.interpolation = interpolation
+        self._scratch: np.ndarray | None = None   # 縮放後的 uint8 影像（依尺寸重用）
+
+    def geometry(self, src_h: int, src_w: int) -> LetterboxMeta:
+        r = min(self.in_w / src_w, self.in_h / src_h)
+        new_w = min(self.in_w, max(1, int(round(src_w * r))))
+        new_h = min(self.in_h, max(1, int(round(src_h * r))))
+        return LetterboxMeta(new_w / src_w, new_h / src_h,
+                             (self.in_w - new_w) // 2, (self.in_h - new_h) // 2,
+                             src_w, src_h, self.in_w, self.in_h)
+
+    def _resized(self, img: np.ndarray, new_w: int, new_h: int) -> np.ndarray:
+        if img.shape[1] == new_w and img.shape[0] == new_h:
+            return img
+        shape = (new_h, new_w) + img.shape[2:]
+        if self._scratch is None or self._scratch.shape != shape:
+            self._scratch = np.empty(shape, dtype=np.uint8)
+        cv2.resize(img, (new_w, new_h), dst=self._scratch, interpolation=self.interpolation)
+        return self._scratch
+
+    def __call__(self, img_bgr: np.ndarray, out: np.ndarray | None = None):
+        """img_bgr (h,w,3) uint8 → 寫入 out (in_h,in_w,3) float32，回傳 (out, meta)"""
+        if out is None:
+            out = np.empty((self.in_h, self.in_w, 3), dtype=np.float32)
+        elif out.shape != (self.in_h, self.in_w, 3) or out.dtype != np.float32:
+            raise ValueError(f"out 應為 ({self.in_h}, {self.in_w}, 3) float32，收到 {out.shape} {out.dtype}")
+
+        meta = self.geometry(img_bgr.shape[0], img_bgr.shape[1])
+        new_w = int(round(meta.src_w * meta.scale_x))
+        new_h = int(round(meta.src_h * meta.scale_y))
+        x0, y0 = meta.pad_x, meta.pad_y
+        x1, y1 = x0 + new_w, y0 + new_h
+
+        # 補邊：只寫四條邊框區域
+        out[:y0] = self.pad_value
+        out[y1:] = self.pad_value
+        out[y0:y1, :x0] = self.pad_value
+        out[y0:y1, x1:] = self.pad_value
+
+        # 內容：uint8 - mean 直接寫進 float32 目標區域
+        region = out[y0:y1, x0:x1]
+        np.subtract(self._resized(img_bgr, new_w, new_h), self.mean, out=region)
+        if self.scale != 1.0:
+            region *= self.scale
+        return out, meta
+
+
+# ------------------------- CLI 微基準 ------------------------- #
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Letterbox 前處理微基準（對照原本 resize→astype→/255→expand_dims）")
+    parser.add_argument("--image", default=None, help="測試圖片；未指定則用 1280x720 隨機影像")
+    parser.add_argument("--size", default="608x640", help="engine 輸入 HxW，預設 608x640")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    h, w = map(int, args.size.lower().split("x"))
+    img = cv2.imread(args.image) if args.image else \
+        np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    if img is None:
+        raise SystemExit(f"❌ 無法讀取圖片 {args.image}")
+    host_in = np.empty((1, h, w, 3), dtype=np.float32)
+
+    def legacy():
+        norm = cv2.resize(img, (w, h)).astype(np.float32) / 255.0
+        np.copyto(host_in, np.expand_dims(norm, axis=0))
+
+    lb = Letterbox(h, w)
+    for name, fn in [("legacy", legacy), ("letterbox", lambda: lb(img, out=host_in[0]))]:
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        print(f"{name:10s} {(time.perf_counter() - t0) / args.repeat * 1000:.3f} ms")
@@ -1,47 +1,173 @@
+from functools import lru_cache
+from typing import NamedTuple
+
 import numpy as np
 
-def _prior_box(w: int, h: int) -> np.ndarray:
-    priors = []
-    for stride in [8, 16, 32]:
-        fm_w, fm_h = int(np.ceil(w / stride)), int(np.ceil(h / stride))
-        for j in range(fm_h):
-            for i in range(fm_w):
-                cx = (i + 0.5) * stride / w
-                cy = (j + 0.5) * stride / h
-                s = stride / w
-                priors.append([cx, cy, s, s])
-    return np.array(priors, dtype=np.float32)
-
-_PRIORS = _prior_box(640, 608)
+from .nms import nms  # noqa: F401  – 舊介面相容：retinaface_post.nms
+
+# RetinaFace (mnet0.25 / resnet50) 預設 anchor 設定
+STEPS = (8, 16, 32)
+MIN_SIZES = ((16, 32), (64, 128), (256, 512))
 _VARIANCE = np.array([0.1, 0.2], dtype=np.float32)
 
-def decode(boxes, priors):
-    cxcy = priors[:, :2] + boxes[:, :2] * _VARIANCE[0] * priors[:, 2:]
-    wh   = priors[:, 2:] * np.exp(boxes[:, 2:] * _VARIANCE[1])
-    tl   = cxcy - wh / 2
-    br   = cxcy + wh / 2
-    return np.hstack([tl, br])
-
-def decode_landm(landms, priors):
-    xy = priors[:, :2]; wh = priors[:, 2:]
-    out = np.zeros_like(landms)
-    for i in range(5):
-        out[:, 2*i:2*i+2] = xy + landms[:, 2*i:2*i+2] * _VARIANCE[0] * wh
+
+@lru_cache(maxsize=8)
+def _prior_box_cached(w: int, h: int, steps: tuple, min_sizes: tuple) -> np.ndarray:
+    levels = []
+    for step, sizes in zip(steps, min_sizes):
+        fm_w, fm_h = -(-w // step), -(-h // step)      # ceil(w / step)
+        # (fm_h, fm_w, A, 4)：與原版 RetinaFace 相同的 row → col → min_size 順序
+        grid = np.empty((fm_h, fm_w, len(sizes), 4), dtype=np.float32)
+        grid[..., 0] = ((np.arange(fm_w, dtype=np.float32) + 0.5) * step / w)[None, :, None]
+        grid[..., 1] = ((np.arange(fm_h, dtype=np.float32) + 0.5) * step / h)[:, None, None]
+        sizes = np.asarray(sizes, dtype=np.float32)
+        grid[..., 2] = sizes / w
+        grid[..., 3] = sizes / h
+        levels.append(grid.reshape(-1, 4))
+    priors = np.concatenate(levels)
+    priors.setflags(write=False)   # 快取共用，禁止呼叫端就地修改
+    return priors
+
+
+def prior_box(w: int, h: int, steps=STEPS, min_sizes=MIN_SIZES) -> np.ndarray:
+    """回傳 (N, 4) 的 priors [cx, cy, sx, sy]（皆以輸入寬高正規化）。
+
+    依 (w, h, steps, min_sizes) 以 LRU 快取，同一解析度只會產生一次；
+    w / h 請使用 engine 實際的輸入寬高（NHWC → in_w, in_h）。
+    回傳陣列為唯讀，需要修改時請自行 `.copy()`。
+    """
+    steps = tuple(int(s) for s in steps)
+    min_sizes = tuple(tuple(int(m) for m in sizes) for sizes in min_sizes)
+    if len(steps) != len(min_sizes):
+        raise ValueError(f"steps 與 min_sizes 層數不符：{steps} vs {min_sizes}")
+    return _prior_box_cached(int(w), int(h), steps, min_sizes)
+
+
+def check_priors(num_anchors: int, priors: np.ndarray) -> None:
+    """確認模型輸出的 anchor 數與 priors 一致，不一致代表輸入尺寸或 anchor 設定錯誤。"""
+    if num_anchors != priors.shape[0]:
+        raise ValueError(
+            f"模型輸出 {num_anchors} 個 anchor，但 priors 有 {priors.shape[0]} 個；"
+            "請確認 prior_box() 使用的是 engine 實際輸入尺寸")
+
+
+def __getattr__(name: str):
+    # 舊程式相容：`_PRIORS` 改為第一次存取才計算（640×608），import 不再付出成本
+    if name == "_PRIORS":
+        return prior_box(640, 608)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class Detections(NamedTuple):
+    """單張影像的偵測結果：boxes (K,4) [x1,y1,x2,y2]、scores (K,)、landms (K,10)"""
+    boxes: np.ndarray
+    scores: np.ndarray
+    landms: np.ndarray
+
+
+def decode(boxes, priors, variance=_VARIANCE, out=None):
+    """loc 回歸量 (N,4) → [x1,y1,x2,y2]（正規化座標）。
+
+    全程寫入 `out`（未給則配置一個 (N,4) float32）；`out` 可以就是 `boxes`
+    本身（就地解碼）。
+    """
+    if out is None:
+        out = np.empty((boxes.shape[0], 4), dtype=np.float32)
+    cxcy, wh = out[:, :2], out[:, 2:]
+    np.multiply(boxes[:, :2], priors[:, 2:], out=cxcy)
+    cxcy *= variance[0]
+    cxcy += priors[:, :2]
+    np.multiply(boxes[:, 2:], variance[1], out=wh)
+    np.exp(wh, out=wh)
+    wh *= priors[:, 2:]
+    # cxcy → 左上角；wh → 右下角
+    wh *= 0.5
+    cxcy -= wh
+    wh *= 2.0
+    wh += cxcy
+    return out
+
+
+def decode_landm(landms, priors, variance=_VARIANCE, out=None):
+    """landmark 回歸量 (N,10) → 五點座標 (N,10)，以 (N,5,2) 一次廣播完成。"""
+    n = landms.shape[0]
+    if out is None:
+        out = np.empty((n, 10), dtype=np.float32)
+    pts = out.reshape(n, 5, 2)
+    np.multiply(landms.reshape(n, 5, 2), priors[:, None, 2:], out=pts)
+    pts *= variance[0]
+    pts += priors[:, None, :2]
     return out
 
-def nms(dets, scores, thresh=0.4):
-    x1,y1,x2,y2 = dets.T
-    areas = (x2-x1)*(y2-y1)
-    order = scores.argsort()[::-1]
-    keep = []
-    while order.size>0:
-        i = order[0]; keep.append(i)
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-        w = np.maximum(0.0, xx2-xx1); h = np.maximum(0.0, yy2-yy1)
-        inter = w*h
-        iou = inter/(areas[i]+areas[order[1:]]-inter)
-        order = order[np.where(iou<=thresh)[0]+1]
-    return keep
+
+class Decoder:
+    """先依分數門檻過濾、再只對存活的 anchor 解碼（filter first, decode after）。
+
+    中間結果與輸出都寫進內部 buffer pool（容量只增不減），因此穩定狀態下
+    每幀不會再配置大型陣列。回傳的 Detections 是 pool 的 view，下一次呼叫
+    會被覆寫；需要跨幀保留時請自行 `.copy()`，或透過 `out=` 傳入自己的 buffer。
+
+    logits=True 表示 conf 為兩類 logits（retinaface.onnx 即是），
+    門檻會換算成 logit 差值比較，只有存活者才計算 softmax 分數。
+    """
+
+    def __init__(self, priors: np.ndarray, conf_thresh: float = 0.5,
+                 variance=_VARIANCE, logits: bool = True):
+        self.priors = priors
+        self.conf_thresh = conf_thresh
+        self.variance = np.asarray(variance, dtype=np.float32)
+        self.logits = logits
+        self._pool: dict[str, np.ndarray] = {}
+
+    def _buffer(self, name: str, rows: int, tail: tuple = ()) -> np.ndarray:
+        buf = self._pool.get(name)
+        if buf is None or buf.shape[0] < rows:
+            buf = np.empty((max(rows, 64),) + tail, dtype=np.float32)
+            self._pool[name] = buf
+        return buf[:rows]
+
+    def _select(self, conf: np.ndarray, conf_thresh: float):
+        """回傳 (存活 index, 存活者分數 buffer)"""
+        k_all = conf.shape[0]
+        if self.logits:
+            # softmax(c)[1] > t  ⇔  c1 - c0 > log(t / (1 - t))
+            if conf_thresh <= 0.0:
+                thr = -np.inf
+            elif conf_thresh >= 1.0:
+                thr = np.inf
+            else:
+                thr = np.log(conf_thresh / (1.0 - conf_thresh))
+            key = self._buffer("diff", k_all)
+            np.subtract(conf[:, 1], conf[:, 0], out=key)
+        else:
+            thr, key = conf_thresh, conf[:, 1]
+        idx = np.flatnonzero(key > thr)
+        scores = self._buffer("scores", idx.size)
+        np.take(key, idx, out=scores)
+        if self.logits:
+            np.negative(scores, out=scores)     # sigmoid(c1 - c0)
+            np.exp(scores, out=scores)
+            scores += 1.0
+            np.reciprocal(scores, out=scores)
+        return idx, scores
+
+    def __call__(self, loc, conf, landms, conf_thresh=None, out=None) -> Detections:
+        """loc (N,4)、conf (N,2)、landms (N,10) → 過濾後的 Detections（正規化座標）"""
+        if conf_thresh is None:
+            conf_thresh = self.conf_thresh
+        idx, scores = self._select(conf, conf_thresh)
+        k = idx.size
+        if out is not None:
+            if out.boxes.shape[0] < k:
+                raise ValueError(f"out buffer 容量 {out.boxes.shape[0]} 小於存活數 {k}")
+            np.copyto(out.scores[:k], scores)
+            boxes, lms, scores = out.boxes[:k], out.landms[:k], out.scores[:k]
+        else:
+            boxes = self._buffer("boxes", k, (4,))
+            lms = self._buffer("landms", k, (10,))
+        pri = self._buffer("priors", k, (4,))
+        np.take(self.priors, idx, axis=0, out=pri)
+        np.take(loc, idx, axis=0, out=boxes)
+        np.take(landms, idx, axis=0, out=lms)
+        decode(boxes, pri, self.variance, out=boxes)
+        decode_landm(lms, pri, self.variance, out=lms)
+        return Detections(boxes, scores, lms)
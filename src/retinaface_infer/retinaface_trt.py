@@ -11,6 +11,14 @@
     1. 載入 ICudaEngine 並建立 IExecutionContext
     2. 自動配置 host / device buffer
     3. 提供 `infer(image_bgr)`，回傳 raw outputs（[boxes, scores, landms]）
+       前處理為等比例 letterbox，直接寫入 page-locked input buffer；
+       `last_meta` 可將解碼結果換回原圖座標
+    4. 實作 DetectorBackend：`infer_batch(frames)` 直接回傳解碼後的 Detections
+       （tensorrt / pycuda 於 load() 時才 import）
+    5. 動態 batch engine（convert2trt 的 min/opt/max profile）：依 profile 上限
+       配置一塊連續 pinned buffer，每次呼叫只設定實際張數的 input shape、只搬 n 張
+    6. num_slots > 1 時配置多組 buffer / stream / context，搭配
+       async_infer.AsyncInferencePipeline 讓前處理、H2D、推論、D2H 交錯進行
 
 依賴：
     - numpy
@@ -22,23 +30,39 @@ from __future__ import annotations
 import os
 import numpy as np
 import cv2
-import tensorrt as trt
+from .backends import DetectorBackend, layout_from_shapes
 from .landmark_drawer import draw_landmarks
+from .preprocess import LetterboxMeta
+from src.jetsoncv.startup import stage
 
 #image = draw_landmarks(image, valid_landms.tolist())
 
-TRT_LOGGER = trt.Logger(trt.Logger.INFO)
+# tensorrt / pycuda 延後到 load() 才 import：pycuda.autoinit 會建立 CUDA context，
+# 不該在 import 階段發生（也讓非 Jetson 機器能 import 本模組）
+trt = None
+cuda = None
+TRT_LOGGER = None
 
-try:
-    import pycuda.driver as cuda
-    import pycuda.autoinit  # 自動管理 context
-except ModuleNotFoundError as e:
-    raise SystemExit("❌ pycuda 未安裝，請先： sudo apt install python3-pycuda") from e
 
+def _import_trt():
+    global trt, cuda, TRT_LOGGER
+    if trt is None:
+        import tensorrt
+        try:
+            import pycuda.driver as _cuda
+            import pycuda.autoinit  # noqa: F401 – 自動管理 context
+        except ModuleNotFoundError as e:
+            raise ModuleNotFoundError("❌ pycuda 未安裝，請先： sudo apt install python3-pycuda") from e
+        trt, cuda = tensorrt, _cuda
+        TRT_LOGGER = trt.Logger(trt.Logger.INFO)
+    return trt, cuda
 
-class RetinaFaceTRT:
+
+class RetinaFaceTRT(DetectorBackend):
     """RetinaFace TensorRT 推論封裝（自動相容各版本 API）"""
 
+    name = "trt"
+
     # --- 新增：統一取 shape 函式 ------------------------------------------
     def _shape(self, idx: int):
         """跨版本取得 tensor shape"""
@@ -48,8 +72,42 @@ class RetinaFaceTRT:
         name = self.engine.get_tensor_name(idx)
         return self.engine.get_tensor_shape(name)
 
+    def _context_shape(self, idx: int):
+        """跨版本取得 context 目前（已設定輸入 shape 後）的 tensor shape"""
+        if hasattr(self.context, "get_tensor_shape"):      # TRT 9/10
+            return self.context.get_tensor_shape(self.engine.get_tensor_name(idx))
+        return self.context.get_binding_shape(idx)
+
+    def _profile_batch_range(self) -> tuple[int, int]:
+        """回傳 optimization profile 0 的 (min_batch, max_batch)；靜態 engine 兩者相同"""
+        shape = tuple(self._shape(self.input_binding))
+        if shape[0] != -1:
+            return shape[0], shape[0]
+        if hasattr(self.engine, "get_tensor_profile_shape"):   # TRT 9/10
+            name = self.engine.get_tensor_name(self.input_binding)
+            mn, _, mx = self.engine.get_tensor_profile_shape(name, 0)
+        else:
+            mn, _, mx = self.engine.get_profile_shape(0, self.input_binding)
+        return int(mn[0]), int(mx[0])
+
+    def _set_batch(self, n: int, slot: "_Slot | None" = None) -> None:
+        """動態 engine：把本次的 batch 大小設給該 slot 的 context（與上次相同則略過）"""
+        context = self.context if slot is None else slot.context
+        bound = self._bound_batch if slot is None else slot.bound_batch
+        if not self.dynamic or n == bound:
+            return
+        shape = (n, self.in_h, self.in_w, self.in_c)
+        if hasattr(context, "set_input_shape"):           # TRT 9/10
+            context.set_input_shape(self.engine.get_tensor_name(self.input_binding), shape)
+        else:
+            context.set_binding_shape(self.input_binding, shape)
+        if slot is None:
+            self._bound_batch = n
+        else:
+            slot.bound_batch = n
+
     @staticmethod
-    def _nb_bindings(engine: trt.ICudaEngine) -> int:
+    def _nb_bindings(engine) -> int:
         """跨版本取得 binding 數量"""
         if hasattr(engine, "num_io_tensors"):   # TensorRT 9/10 新 API
             return engine.num_io_tensors
@@ -60,11 +118,25 @@ class RetinaFaceTRT:
             return engine.num_bindings  # type: ignore[attr-defined]
         raise AttributeError("ICudaEngine 无法取得 bindings 數量 (未知 API 版本)")
         
-    def __init__(self, engine_path: str):
-        if not os.path.exists(engine_path):
-            raise FileNotFoundError(f"找不到 TensorRT engine：{engine_path}")
+    def __init__(self, engine_path: str, lazy: bool = False, num_slots: int = 1):
+        super().__init__()
+        self.engine_path = engine_path
+        self.num_slots = int(num_slots)   # >1 時供 AsyncInferencePipeline 交錯使用
+        self.engine = None
+        self.last_meta: LetterboxMeta | None = None
+        if not lazy:
+            self.load()
+
+    def load(self) -> None:
+        """反序列化 engine、建立 context 並配置 buffer（只做一次）"""
+        if self.engine is not None:
+            return
+        if not os.path.exists(self.engine_path):
+            raise FileNotFoundError(f"找不到 TensorRT engine：{self.engine_path}")
+        with stage("tensorrt import + CUDA context"):
+            _import_trt()
 
-        with open(engine_path, "rb") as f, trt.Runtime(TRT_LOGGER) as runtime:
+        with stage("engine deserialize"), open(self.engine_path, "rb") as f, trt.Runtime(TRT_LOGGER) as runtime:
             self.engine = runtime.deserialize_cuda_engine(f.read())
         self.context = self.engine.create_execution_context()
 
@@ -74,69 +146,131 @@ class RetinaFaceTRT:
         self.input_binding = 0  # 第一個 binding 為 input
         self.output_bindings = [i for i in range(1, nb)]
 
-        # 解析 input shape (NHWC)
-        self.input_shape = tuple(self._shape(self.input_binding))
-        self.batch, self.in_h, self.in_w, self.in_c = self.input_shape
+        # 解析 input shape (NHWC)；動態 batch（-1）依 profile 取最大值配置 buffer
+        raw_shape = tuple(self._shape(self.input_binding))
+        self.dynamic = raw_shape[0] == -1
+        self.min_batch, max_batch = self._profile_batch_range()
+        self._input_shape = (max_batch,) + raw_shape[1:]
+        self.batch, self.in_h, self.in_w, self.in_c = self._input_shape
+        self._bound_batch = None
+        self._set_batch(max_batch)
+        self._out_shapes = [tuple(self._context_shape(i)) for i in self.output_bindings]
+        self._layout = layout_from_shapes(self._out_shapes)
 
         # 分配 buffer
         self._allocate_buffers(nb)
 
-    
-    
+    # ------------------------- DetectorBackend ------------------------- #
+    @property
+    def input_shape(self) -> tuple[int, int, int, int]:
+        self.load()
+        return self._input_shape
+
+    @property
+    def output_layout(self) -> tuple[str, ...]:
+        self.load()
+        return self._layout
+
+    def _input_view(self, n: int) -> np.ndarray:
+        return self.slot_input(0, n)
+
     # ------------------------- Buffer ------------------------- #
     def _allocate_buffers(self, nb_bindings: int):
-        self.bindings: list[int] = [None] * nb_bindings
+        """每個 slot 一組 pinned host / device buffer + stream + execution context"""
+        self.slots = []
+        for i in range(self.num_slots):
+            context = self.context if i == 0 else self.engine.create_execution_context()
+            self.slots.append(self._new_slot(nb_bindings, context))
+        self.slots[0].bound_batch = self._bound_batch
+        # 舊屬性名稱指向 slot 0
+        s0 = self.slots[0]
+        self.bindings, self.stream = s0.bindings, s0.stream
+        self.host_in, self.dev_in = s0.host_in, s0.dev_in
+        self.host_outs, self.dev_outs = s0.host_outs, s0.dev_outs
+
+    def _new_slot(self, nb_bindings: int, context) -> "_Slot":
+        bindings: list[int] = [None] * nb_bindings
         # Input
-        self.host_in = cuda.pagelocked_empty(shape=self.input_shape, dtype=np.float32)
-        self.dev_in = cuda.mem_alloc(self.host_in.nbytes)
-        self.bindings[self.input_binding] = int(self.dev_in)
+        host_in = cuda.pagelocked_empty(shape=self.input_shape, dtype=np.float32)
+        dev_in = cuda.mem_alloc(host_in.nbytes)
+        bindings[self.input_binding] = int(dev_in)
         # Outputs
-        self.host_outs = []
-        self.dev_outs = []
-        for idx in self.output_bindings:
-            shape = tuple(self._shape(idx))
+        host_outs, dev_outs = [], []
+        for idx, shape in zip(self.output_bindings, self._out_shapes):
             host_buf = cuda.pagelocked_empty(shape=shape, dtype=np.float32)
             dev_buf = cuda.mem_alloc(host_buf.nbytes)
-            self.bindings[idx] = int(dev_buf)
-            self.host_outs.append(host_buf)
-            self.dev_outs.append(dev_buf)
+            bindings[idx] = int(dev_buf)
+            host_outs.append(host_buf)
+            dev_outs.append(dev_buf)
         # Stream
-        self.stream = cuda.Stream()
-
-    # ------------------------- 前處理 ------------------------- #
-    def _preprocess(self, img_bgr: np.ndarray) -> np.ndarray:
-        resized = cv2.resize(img_bgr, (self.in_w, self.in_h))
-        norm = resized.astype(np.float32) / 255.0  # (H,W,C)
-        norm = np.expand_dims(norm, axis=0)        # (1,H,W,C)
-        return norm
+        return _Slot(context, bindings, cuda.Stream(), host_in, dev_in, host_outs, dev_outs)
 
     # ------------------------- 推論 ------------------------- #
     def infer(self, img_bgr: np.ndarray) -> list[np.ndarray]:
-        input_np = self._preprocess(img_bgr)
-        np.copyto(self.host_in, input_np)
+        """單張推論，回傳 raw outputs；對應的 letterbox 資訊存於 `self.last_meta`"""
+        self.last_meta = self._prepare([img_bgr])[0]
+        return [host.copy() for host in self._execute(1)]
+
+    def _execute(self, n: int) -> list[np.ndarray]:
+        """host_in[:n] 已填好 n 張影像；一次推論後回傳各輸出的前 n 筆"""
+        self.launch(0, n)
+        return self.wait(0)
+
+    # ------------------------- 非同步 slot ------------------------- #
+    def slot_input(self, slot: int, n: int) -> np.ndarray:
+        self.load()
+        return self.slots[slot].host_in[:n]
+
+    def launch(self, slot: int, n: int) -> None:
+        """H2D → execute → D2H 全部排進該 slot 的 stream 後立即返回"""
+        sl = self.slots[slot]
+        # 動態 engine 依本次張數設定 shape（不足 profile 下限時補到下限）；
+        # 靜態 engine 一律跑滿 batch，多出的列忽略
+        run_n = max(n, self.min_batch) if self.dynamic else self.batch
+        self._set_batch(run_n, sl)
+
         # ------------------- 將 host → device ------------------- #
-        cuda.memcpy_htod_async(self.dev_in, self.host_in, self.stream)
-        
+        cuda.memcpy_htod_async(sl.dev_in, sl.host_in[:run_n], sl.stream)
+
         # ------------------- 執行推論 --------------------------- #
         # TensorRT 9/10
-        if hasattr(self.context, "execute_async_v3"):                 
+        if hasattr(sl.context, "execute_async_v3"):
             # 1. 先把每個 tensor 名稱對應到 device ptr
-            for idx, dev_ptr in enumerate(self.bindings):
+            for idx, dev_ptr in enumerate(sl.bindings):
                 name = self.engine.get_tensor_name(idx)
-                self.context.set_tensor_address(name, dev_ptr)
+                sl.context.set_tensor_address(name, dev_ptr)
             # 2. 執行 v3（只要給 stream_handle）
-            self.context.execute_async_v3(stream_handle=self.stream.handle)
+            sl.context.execute_async_v3(stream_handle=sl.stream.handle)
         else:                                                 # 舊 API (≤ TRT 8)
-            self.context.execute_async_v2(
-                bindings=self.bindings,
-                stream_handle=self.stream.handle
+            sl.context.execute_async_v2(
+                bindings=sl.bindings,
+                stream_handle=sl.stream.handle
             )
-                
+
         # ------------------- device → host --------------------- #
-        for host, dev in zip(self.host_outs, self.dev_outs):
-            cuda.memcpy_dtoh_async(host, dev, self.stream)
-        self.stream.synchronize()
-        return [host.copy() for host in self.host_outs]
+        for host, dev in zip(sl.host_outs, sl.dev_outs):
+            cuda.memcpy_dtoh_async(host[:run_n], dev, sl.stream)
+        sl.n = n
+
+    def wait(self, slot: int) -> list[np.ndarray]:
+        """等待 slot 的 stream 完成，回傳 pinned 輸出的前 n 筆（view，下次 launch 會覆寫）"""
+        sl = self.slots[slot]
+        sl.stream.synchronize()
+        return [host[:sl.n] for host in sl.host_outs]
+
+
+class _Slot:
+    """一組可獨立在途的推論資源"""
+
+    __slots__ = ("context", "bindings", "stream", "host_in", "dev_in",
+                 "host_outs", "dev_outs", "bound_batch", "n")
+
+    def __init__(self, context, bindings, stream, host_in, dev_in, host_outs, dev_outs):
+        self.context, self.bindings, self.stream = context, bindings, stream
+        self.host_in, self.dev_in = host_in, dev_in
+        self.host_outs, self.dev_outs = host_outs, dev_outs
+        self.bound_batch = None
+        self.n = 0
 
 
 # ------------------------- CLI 測試 ------------------------- #
@@ -146,12 +280,31 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="RetinaFace TensorRT 單圖推論測試")
     parser.add_argument("--engine", default="retinaface.engine", help="TensorRT engine 路徑")
     parser.add_argument("--image", default="output_retina.jpg", help="測試圖片 (BGR)")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="> 0 時以 infer_batch 跑 N 張相同影像並比較 N 次單張推論的耗時")
     args = parser.parse_args()
 
     model = RetinaFaceTRT(args.engine)
     img = cv2.imread(args.image)
     if img is None:
         raise SystemExit(f"❌ 無法讀取圖片 {args.image}")
+
+    if args.batch > 0:
+        import time
+        frames = [img] * args.batch
+        model.infer_batch(frames)                      # warm-up
+        t0 = time.perf_counter()
+        dets = model.infer_batch(frames)
+        t_batch = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        for f in frames:
+            model.detect(f)
+        t_single = (time.perf_counter() - t0) * 1000
+        print(f"profile batch 範圍：{model.min_batch}~{model.max_batch}（dynamic={model.dynamic}）")
+        print(f"infer_batch({args.batch})：{t_batch:.1f} ms；{args.batch} 次單張：{t_single:.1f} ms")
+        print(f"每張偵測數：{[len(d.scores) for d in dets]}")
+        raise SystemExit(0)
+
     outs = model.infer(img)
 
     print("=== 推論完成 ===")
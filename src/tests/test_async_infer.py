@@ -0,0 +1,96 @@
+"""
+test_async_infer.py – AsyncInferencePipeline 排程測試（假後端，純 CPU）
+"""
+import time
+
+import numpy as np
+import pytest
+
+from src.retinaface_infer.async_infer import AsyncInferencePipeline
+from src.retinaface_infer.backends import DetectorBackend
+
+
+class SlowBackend(DetectorBackend):
+    """_forward 睡 delay 秒；loc[:, 0, 0] 回傳輸入左上角像素，用來辨識是哪張影像"""
+
+    name = "slow"
+
+    def __init__(self, delay=0.0, hw=(64, 64), max_batch=2):
+        super().__init__()
+        self.delay = delay
+        self._shape = (max_batch,) + hw + (3,)
+
+    def load(self):
+        pass
+
+    @property
+    def input_shape(self):
+        return self._shape
+
+    @property
+    def output_layout(self):
+        return ("loc", "conf", "landms")
+
+    def _input_view(self, n):
+        return self.slot_input(0, n)
+
+    def _execute(self, n):
+        return self._forward(self._input_view(n))
+
+    def _forward(self, batch):
+        time.sleep(self.delay)
+        n, anchors = batch.shape[0], self.priors.shape[0]
+        loc = np.zeros((n, anchors, 4), np.float32)
+        loc[:, 0, 0] = batch[:, 0, 0, 0]
+        conf = np.tile(np.float32([5.0, -5.0]), (n, anchors, 1))
+        conf[:, 0] = (-5.0, 5.0)
+        self.last = [loc, conf, np.zeros((n, anchors, 10), np.float32)]
+        return self.last
+
+
+def _frame(v):
+    return np.full((64, 64, 3), v, np.uint8)
+
+
+def test_results_follow_tickets_even_when_slots_recycle():
+    pipe = AsyncInferencePipeline(SlowBackend(), depth=2)
+    tickets = [pipe.submit(_frame(v)) for v in (110, 120, 130, 140)]
+    assert pipe.stalls == 2 and pipe.pending == 4
+
+    # 倒序取回，每張仍對應自己的輸入
+    for t, v in reversed(list(zip(tickets, (110, 120, 130, 140)))):
+        raw, metas = pipe.collect_raw(t)
+        assert raw[0][0, 0, 0] == v - 104          # letterbox 減均值後的值
+        assert metas[0].src_w == 64
+    assert pipe.pending == 0
+    with pytest.raises(KeyError):
+        pipe.collect(tickets[0])
+
+
+def test_borrow_returns_views_and_collect_decodes():
+    backend = SlowBackend()
+    pipe = AsyncInferencePipeline(backend, depth=2)
+    t = pipe.submit([_frame(1), _frame(2)])
+    dets = pipe.collect(t)
+    assert [len(d.scores) for d in dets] == [1, 1]
+
+    raw, _ = pipe.collect_raw(pipe.submit(_frame(3)), borrow=True)
+    assert raw[0] is backend.last[0]            # 借用：不複製
+    copied, _ = pipe.collect_raw(pipe.submit(_frame(4)))
+    assert copied[0] is not backend.last[0]
+    np.testing.assert_array_equal(copied[0], backend.last[0])
+
+
+def test_preprocessing_overlaps_inference():
+    delay, n = 0.05, 6
+    pipe = AsyncInferencePipeline(SlowBackend(delay=delay), depth=2)
+    t0 = time.perf_counter()
+    tickets = []
+    for i in range(n):
+        time.sleep(delay)                       # 模擬擷取 / 前處理的 CPU 時間
+        tickets.append(pipe.submit(_frame(i)))
+        if len(tickets) > 1:
+            pipe.collect(tickets[-2])
+    pipe.collect(tickets[-1])
+    elapsed = time.perf_counter() - t0
+    assert elapsed < n * 2 * delay * 0.85       # 序列執行需 n × 2 × delay
@@ -0,0 +1,128 @@
+"""
+test_backends.py – DetectorBackend 流程測試（不需 TensorRT）
+"""
+import importlib.util
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from src.retinaface_infer import backends
+from src.retinaface_infer.retinaface_post import prior_box
+
+IMAGE_PATH = os.path.join(os.path.dirname(__file__), "output_retina.jpg")
+
+
+class FakeBackend(backends.DetectorBackend):
+    """輸出固定一張臉：anchor 0 的 conf 很高、其餘很低"""
+
+    name = "fake"
+
+    def __init__(self, max_batch=2, hw=(608, 640)):
+        super().__init__()
+        self._shape = (max_batch,) + hw + (3,)
+        self._input = np.zeros(self._shape, np.float32)
+        self.calls = []
+
+    def load(self):
+        pass
+
+    @property
+    def input_shape(self):
+        return self._shape
+
+    @property
+    def output_layout(self):
+        return ("conf", "loc", "landms")
+
+    def _input_view(self, n):
+        return self._input[:n]
+
+    def _execute(self, n):
+        self.calls.append(n)
+        anchors = self.priors.shape[0]
+        conf = np.tile(np.float32([5.0, -5.0]), (n, anchors, 1))
+        conf[:, 0] = (-5.0, 5.0)
+        return [conf, np.zeros((n, anchors, 4), np.float32), np.zeros((n, anchors, 10), np.float32)]
+
+
+def test_pipeline_chunks_and_maps_to_source():
+    fake = FakeBackend(max_batch=2)
+    frames = [np.zeros((480, 640, 3), np.uint8), np.zeros((1080, 1920, 3), np.uint8),
+              np.zeros((304, 320, 3), np.uint8)]
+    dets = fake.infer_batch(frames)
+    assert fake.calls == [2, 1]
+    assert [len(d.scores) for d in dets] == [1, 1, 1]
+
+    # anchor 0：中心 (4, 4)、邊長 16（engine 輸入像素）→ 換回各自原圖
+    p = prior_box(640, 608)[0] * [640, 608, 640, 608]
+    box_in = np.array([p[0] - p[2] / 2, p[1] - p[3] / 2, p[0] + p[2] / 2, p[1] + p[3] / 2])
+    for frame, det in zip(frames, dets):
+        _, meta = fake.letterbox(frame)
+        expected = (box_in - [meta.pad_x, meta.pad_y] * 2) / ([meta.scale_x, meta.scale_y] * 2)
+        np.testing.assert_allclose(det.boxes[0], expected, rtol=1e-4, atol=1e-3)
+
+
+def test_layout_from_shapes():
+    assert backends.layout_from_shapes([(1, 10, 4), (1, 10, 2), (1, 10, 10)]) == ("loc", "conf", "landms")
+    with pytest.raises(ValueError):
+        backends.layout_from_shapes([(1, 10, 4), (1, 10, 4), (1, 10, 10)])
+
+
+def test_trt_module_imports_without_tensorrt():
+    from src.retinaface_infer import retinaface_trt
+    if importlib.util.find_spec("tensorrt") is None:
+        with pytest.raises(ImportError):
+            retinaface_trt.RetinaFaceTRT(str(backends.DEFAULT_ENGINE))
+
+
+@pytest.mark.skipif(importlib.util.find_spec("onnxruntime") is None, reason="需要 onnxruntime")
+def test_onnx_cpu_backend_detects_face():
+    backend = backends.create_backend("onnx")
+    img = cv2.imread(IMAGE_PATH)
+    det, det_big = backend.infer_batch([img, cv2.resize(img, (1280, 960))])
+    assert len(det.scores) == 1 and det.scores[0] > 0.9
+    x1, y1, x2, y2 = det.boxes[0]
+    assert 300 < x1 < x2 < 560 and 130 < y1 < y2 < 460
+    # 同一張臉放大兩倍，框也應放大兩倍（letterbox 座標還原正確）
+    np.testing.assert_allclose(det_big.boxes[0], det.boxes[0] * 2, rtol=0.03)
+
+
+@pytest.mark.skipif(importlib.util.find_spec("tensorrt") is not None or importlib.util.find_spec("onnxruntime") is None,
+                    reason="需要 onnxruntime 且沒有 tensorrt")
+def test_auto_fallback_drops_trt_only_kwargs():
+    backend = backends.create_backend("auto", num_slots=2)
+    assert isinstance(backend, backends.ONNXCPUBackend) and backend.runtime == "ort"
+
+
+class FakeNet:
+    """代替 cv2.dnn 讀進來的 ONNX 網路：與 FakeBackend 相同，anchor 0 是一張臉"""
+
+    def getUnconnectedOutLayersNames(self):
+        return ("out0", "out1", "out2")
+
+    def setInput(self, batch):
+        self.batch = batch
+
+    def forward(self, names):
+        n, h, w, _ = self.batch.shape
+        anchors = prior_box(w, h).shape[0]
+        conf = np.tile(np.float32([5.0, -5.0]), (n, anchors, 1))
+        conf[:, 0] = (-5.0, 5.0)
+        return (np.zeros((n, anchors, 4), np.float32), conf, np.zeros((n, anchors, 10), np.float32))
+
+
+def test_cv2_runtime_without_onnxruntime(tmp_path, monkeypatch):
+    model = tmp_path / "tiny.onnx"
+    model.write_bytes(b"")
+    monkeypatch.setattr(cv2.dnn, "readNetFromONNX", lambda path: FakeNet())
+    backend = backends.create_backend("cv2", model, runtime="cv2", max_batch=2, input_size=(64, 64))
+    assert backend.runtime == "cv2" and backend.input_shape == (2, 64, 64, 3)
+    with pytest.raises(RuntimeError):                   # OpenCV-DNN 要 forward 過才知道輸出順序
+        backend.output_layout
+    dets = backend.infer_batch([np.zeros((48, 64, 3), np.uint8)] * 3)
+    assert [len(d.scores) for d in dets] == [1, 1, 1]
+    assert backend.output_layout == ("loc", "conf", "landms")
+    with pytest.raises(ValueError):
+        backends.create_backend("cv2", model, runtime="ort")
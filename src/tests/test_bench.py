@@ -0,0 +1,73 @@
+"""
+test_bench.py – 基準測試工具：統計欄位、warmup、JSON 輸出
+"""
+import importlib.util
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import FaceMatcher
+from src.tools import bench
+
+DATASET = Path(__file__).resolve().parents[2] / "face-capture" / "dataset"
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    for i in range(8):
+        cv2.imwrite(str(tmp_path / f"{i:02d}.png"), np.full((40, 60, 3), 30 * i, np.uint8))
+    return tmp_path
+
+
+def fake_detector(p):
+    return np.array([[5, 5, 25, 25], [30, 5, 50, 25]], np.float32), None
+
+
+def fake_encoder(rgb, boxes):
+    return np.zeros((len(boxes), 128))
+
+
+def test_serial_reports_percentiles_per_stage(image_dir):
+    matcher = FaceMatcher([np.zeros(128)], ["alice"])
+    r = bench.bench(image_dir, detector="fake", warmup=3, detector_fn=fake_detector,
+                    encoder_fn=fake_encoder, matcher=matcher)
+    assert r["mode"] == "serial" and r["frames"] == 5 and r["warmup"] == 3
+    assert r["faces"] == r["encoded"] == 10
+    assert set(r["stages"]) == {"decode", "detect", "encode", "match", "total"}
+    for s in r["stages"].values():
+        assert s["count"] == 5 and s["p50_ms"] <= s["p95_ms"] <= s["p99_ms"] <= s["max_ms"]
+    assert r["peak_rss_mb"] > 0 and r["gallery_size"] == 1
+    json.dumps(r)                                       # 結果可直接存成 JSON
+
+
+def test_serial_reader_decodes_synchronously(image_dir):
+    (image_dir / "broken.png").write_bytes(b"not an image")
+    with bench.SerialReader(image_dir) as reader:
+        frames = [f for f in iter(reader.read, None)]
+    assert [f.image.shape for f in frames] == [(40, 60, 3)] * 8
+    assert frames[0].source == image_dir.name
+
+
+def test_tracking_encodes_only_new_faces(image_dir):
+    matcher = FaceMatcher([np.zeros(128)], ["alice"])
+    r = bench.bench(image_dir, detector="fake", track=True, warmup=0, detector_fn=fake_detector,
+                    encoder_fn=fake_encoder, matcher=matcher)
+    assert r["frames"] == 8 and r["faces"] == 16 and r["encoded"] == 2
+
+
+def test_pipelined_mode(image_dir):
+    r = bench.bench(image_dir, detector="fake", encoder="none", pipelined=True, detector_fn=fake_detector)
+    assert r["mode"] == "pipelined" and r["frames"] == 8
+    assert r["latency"]["count"] == 8 and "p99_ms" in r["stages"]["detect"]
+
+
+@pytest.mark.skipif(importlib.util.find_spec("onnxruntime") is None, reason="需要 onnxruntime")
+def test_cli_writes_json_with_retina_backend(tmp_path):
+    out = tmp_path / "run.json"
+    bench.main([str(DATASET), "--detector", "retina", "--backend", "onnx", "--encoder", "none",
+                "--warmup", "1", "--max-frames", "2", "--json-out", str(out)])
+    r = json.loads(out.read_text())
+    assert r["detector"] == "retina:onnx" and r["frames"] == 2 and r["faces"] >= 2
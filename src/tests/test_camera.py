@@ -0,0 +1,64 @@
+"""
+test_camera.py – FrameSource 離線來源測試（圖片資料夾 / 影片檔）
+"""
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from src.gui_main.camera import FrameSource
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    for i in range(12):
+        cv2.imwrite(str(tmp_path / f"img_{i:02d}.png"), np.full((24, 32, 3), i * 10, np.uint8))
+    return tmp_path
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (32, 24))
+    if not writer.isOpened():
+        pytest.skip("此 OpenCV 無法寫入 MJPG 影片")
+    for i in range(20):
+        writer.write(np.full((24, 32, 3), i * 10, np.uint8))
+    writer.release()
+    return path
+
+
+def test_directory_replay_is_lossless_without_drop(image_dir):
+    with FrameSource(image_dir, buffer_size=2, policy="fifo", drop=False, fps=0) as src:
+        frames = list(src)
+    assert [f.seq for f in frames] == list(range(12))
+    assert [int(f.image[0, 0, 0]) for f in frames] == [i * 10 for i in range(12)]
+    assert src.stats() == {"grabbed": 12, "dropped": 0, "delivered": 12, "buffered": 0}
+    assert all(b.timestamp >= a.timestamp for a, b in zip(frames, frames[1:]))
+
+
+def test_latest_policy_drops_stale_frames(image_dir):
+    src = FrameSource(image_dir, buffer_size=3, policy="latest", fps=0).start()
+    while not src.exhausted and src.grabbed < 12:
+        time.sleep(0.01)
+    frame = src.read(timeout=1.0)
+    assert frame.seq == 11                      # 永遠拿最新一張
+    assert src.read(timeout=0.2) is None        # 已播完
+    stats = src.stats()
+    assert stats["delivered"] + stats["dropped"] == stats["grabbed"] == 12
+    src.stop()
+
+
+def test_video_file_source_respects_fps(video_file):
+    t0 = time.monotonic()
+    with FrameSource(video_file, policy="fifo", drop=False, fps=100) as src:
+        frames = list(src)
+    assert len(frames) == 20 and src.kind == "video"
+    assert time.monotonic() - t0 >= 19 / 100 * 0.9
+
+
+def test_missing_source_reports_error(tmp_path):
+    with FrameSource(tmp_path / "nope.mp4") as src:
+        with pytest.raises(RuntimeError):
+            src.read(timeout=1.0)
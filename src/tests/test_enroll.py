@@ -0,0 +1,39 @@
+"""
+test_enroll.py – EnrollEngine 平行執行：順序、每個 worker 只初始化一次、在途上限
+"""
+import os
+
+import pytest
+
+from src.facedb.enroll import EnrollEngine
+
+_INIT = []
+
+
+def _init(tag):
+    _INIT.append(tag)
+
+
+def _square_with_pid(x):
+    return x * x, os.getpid(), len(_INIT)
+
+
+def test_local_mode_runs_initializer_once():
+    _INIT.clear()
+    engine = EnrollEngine(_square_with_pid, workers=1, initializer=_init, initargs=("t",), progress=False)
+    out = list(engine.map(range(5)))
+    assert [r[0] for _, r in out] == [0, 1, 4, 9, 16]
+    assert _INIT == ["t"] and engine.progress.done == 5
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_pool_streams_all_results(ordered):
+    items = list(range(40))
+    engine = EnrollEngine(_square_with_pid, workers=2, chunksize=3, max_inflight=2, ordered=ordered,
+                          initializer=_init, initargs=("w",), progress=False)
+    out = list(engine.map(iter(items)))            # 迭代器也可以（不需知道總數）
+    got = [item for item, _ in out]
+    assert got == items if ordered else sorted(got) == items
+    assert all(r[0] == item * item for item, r in out)
+    assert all(r[2] == 1 for _, r in out)          # 每個 worker 的 initializer 只跑一次
+    assert len({r[1] for _, r in out} - {os.getpid()}) >= 1
@@ -0,0 +1,58 @@
+"""
+test_face_matcher.py – FaceMatcher 與逐張 compare_faces / face_distance 的結果一致性
+"""
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import UNKNOWN, FaceMatcher
+
+
+def _gallery(seed=0, people=6, shots=4):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(people, 128)) * 0.08
+    enc = [c + rng.normal(size=128) * 0.02 for c in centers for _ in range(shots)]
+    names = [f"p{i}" for i in range(people) for _ in range(shots)]
+    return enc, names, centers
+
+
+def _reference(enc, names, vec, tol):
+    """原本 gui.run_gui 的逐張寫法（face_distance = np.linalg.norm）"""
+    dists = np.linalg.norm(np.asarray(enc) - vec, axis=1)
+    per_name = {}
+    for n, d in zip(names, dists):
+        per_name[n] = min(per_name.get(n, np.inf), d)
+    ranked = sorted(per_name.items(), key=lambda kv: kv[1])
+    return ranked, (ranked[0][0] if ranked[0][1] <= tol else UNKNOWN)
+
+
+def test_match_agrees_with_per_face_loop():
+    enc, names, centers = _gallery()
+    rng = np.random.default_rng(1)
+    queries = np.vstack([centers + rng.normal(size=centers.shape) * 0.02,
+                         rng.normal(size=(3, 128)) * 0.08])
+    # 打亂 gallery 順序，確認依人名排序後仍對得上
+    perm = rng.permutation(len(enc))
+    matcher = FaceMatcher([enc[i] for i in perm], [names[i] for i in perm], tolerance=0.45)
+
+    matches = matcher.match(queries)
+    top = matcher.topk(queries, k=3)
+    for q, m, t in zip(queries, matches, top):
+        ranked, name = _reference(enc, names, q, 0.45)
+        assert m.name == name and m.best == ranked[0][0]
+        assert m.distance == pytest.approx(ranked[0][1], abs=1e-4)
+        assert m.margin == pytest.approx(ranked[1][1] - ranked[0][1], abs=1e-4)
+        assert [n for n, _ in t] == [n for n, _ in ranked[:3]]
+    assert [m.known for m in matches] == [True] * 6 + [False] * 3
+
+
+def test_min_margin_rejects_ambiguous_and_edge_cases():
+    vec = np.zeros(128)
+    matcher = FaceMatcher([vec + 0.01, vec - 0.01], ["a", "b"], tolerance=0.6, min_margin=0.05)
+    assert matcher.match(vec)[0].name == UNKNOWN          # a / b 一樣近
+    assert matcher.match([]) == [] and matcher.topk([], k=2) == []
+
+    single = FaceMatcher([vec], ["solo"])
+    m = single.match(vec + 0.001)[0]
+    assert m.name == "solo" and m.margin == np.inf
+    with pytest.raises(ValueError):
+        FaceMatcher([], [])
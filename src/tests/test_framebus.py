@@ -0,0 +1,51 @@
+"""
+test_framebus.py – 共享記憶體影格匯流排：跨行程傳遞、參考計數、背壓
+"""
+import multiprocessing as mp
+
+import numpy as np
+
+from src.gui_main.framebus import FrameBus, benchmark
+
+
+def _producer(bus, n):
+    for i in range(n):
+        bus.put(np.full((20, 30, 3), i, np.uint8), camera_id=7, seq=i, timestamp=float(i))
+    bus.close_writer()
+    bus.close()
+
+
+def test_frames_cross_process_without_copy_and_slots_are_recycled():
+    with FrameBus(slots=3, slot_shape=(32, 32, 3)) as bus:
+        proc = mp.get_context("spawn").Process(target=_producer, args=(bus, 10))
+        proc.start()
+        seen = []
+        for ref in bus.frames():
+            with ref:
+                assert ref.image.shape == (20, 30, 3)
+                assert np.shares_memory(ref.image, np.ndarray(bus._shm.size, np.uint8, bus._shm.buf))
+                seen.append((ref.meta.seq, ref.meta.camera_id, int(ref.image.max()), ref.frame().timestamp))
+        proc.join(10)
+        assert proc.exitcode == 0
+        assert seen == [(i, 7, i, float(i)) for i in range(10)]        # 10 幀只用 3 個 slot
+        assert bus.in_use() == 0
+
+
+def test_slot_freed_only_after_all_readers_release():
+    with FrameBus(slots=1, slot_shape=(4, 4), readers=2, ctx="fork") as bus:
+        assert bus.put(np.ones((4, 4), np.uint8)) is not None
+        assert bus.put(np.ones((4, 4), np.uint8), timeout=0.05) is None   # 背壓：沒有空 slot
+        assert bus.dropped == 1
+        a, b = bus.get(0, timeout=1), bus.get(1, timeout=1)
+        assert a.meta.slot == b.meta.slot == 0
+        a.release()
+        a.release()                                     # 重複 release 不影響計數
+        assert bus.in_use() == 1 and bus.acquire(timeout=0.05) is None
+        b.release()
+        assert bus.in_use() == 0 and bus.acquire(timeout=0.05) == 0
+
+
+def test_benchmark_reports_both_transports():
+    r = benchmark((48, 64, 3), frames=20, slots=4)
+    assert r["framebus"]["received"] == r["mp_queue"]["received"] == 20
+    assert r["framebus"]["fps"] > 0 and r["mp_queue"]["fps"] > 0
@@ -0,0 +1,76 @@
+"""
+test_gallery.py – .gallery 二進位特徵庫：寫入 / memmap 讀取 / faces.pkl 轉換相容性
+"""
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from src.facedb import face_database
+from src.facedb.face_matcher import FaceMatcher
+from src.facedb.gallery import Gallery, convert_pkl, write_gallery
+
+
+@pytest.fixture
+def legacy_pkl(tmp_path):
+    rng = np.random.default_rng(0)
+    db = {"encodings": [rng.normal(size=128) * 0.1 for _ in range(7)],
+          "names": ["bob", "amy", "bob", "cat", "amy", "bob", "cat"]}
+    path = tmp_path / "faces.pkl"
+    with open(path, "wb") as f:
+        pickle.dump(db, f)
+    return path, db
+
+
+def test_convert_and_memmap_roundtrip(legacy_pkl):
+    pkl, db = legacy_pkl
+    g = Gallery(convert_pkl(pkl))
+    assert len(g) == 7 and g.dim == 128 and g.identities == ["amy", "bob", "cat"]
+    assert np.shares_memory(g.embeddings, g._mm) and not g.embeddings.flags.writeable
+    # 內容與原 pkl 相同（依人名重排）
+    got = sorted((n, tuple(np.round(e, 5))) for n, e in zip(g.names, g.embeddings))
+    want = sorted((n, tuple(np.round(np.float32(e), 5))) for n, e in zip(db["names"], db["encodings"]))
+    assert got == want
+    np.testing.assert_allclose(g.sq_norms, (g.embeddings ** 2).sum(1), rtol=1e-5)
+    assert g.sources == [""] * 7
+
+
+def test_load_db_prefers_fresh_gallery(legacy_pkl):
+    pkl, db = legacy_pkl
+    assert "gallery" not in face_database.load_db(pkl)          # 尚未轉換 → unpickle
+    convert_pkl(pkl)
+    new = face_database.load_db(pkl)
+    assert isinstance(new["gallery"], Gallery) and sorted(new["names"]) == sorted(db["names"])
+
+    # faces.pkl 比 gallery 新 → 回到 pkl，避免讀到過期資料
+    gal = pkl.with_suffix(".gallery")
+    os.utime(gal, (0, 0))
+    assert "gallery" not in face_database.load_db(pkl)
+
+    # 從 gallery 建 matcher 不複製特徵矩陣，結果與由 list 建立的一致
+    os.utime(gal, None)
+    new = face_database.load_db(pkl)
+    m_gal = FaceMatcher.from_db(new)
+    m_pkl = FaceMatcher(db["encodings"], db["names"])
+    assert np.shares_memory(m_gal.gallery, new["gallery"]._mm)
+    q = np.asarray(db["encodings"][:3])
+    assert m_gal.match(q) == m_pkl.match(q)
+
+
+def test_write_rejects_mismatched_lengths(tmp_path):
+    with pytest.raises(ValueError):
+        write_gallery(tmp_path / "x.gallery", np.zeros((2, 128)), ["a"])
+    empty = Gallery(write_gallery(tmp_path / "e.gallery", np.zeros((0, 128)), []))
+    assert len(empty) == 0 and empty.embeddings.shape == (0, 128)
+
+
+def test_recognizer_loads_gallery_lazily(legacy_pkl):
+    from src.facedb.face_encoder import FaceRecognizer
+
+    pkl, db = legacy_pkl
+    convert_pkl(pkl)
+    rec = FaceRecognizer(pkl.parent, tolerance=0.45)
+    assert not rec.loaded
+    m = rec.matcher.match(np.asarray(db["encodings"][:1]))[0]
+    assert rec.loaded and m.name == db["names"][0] and m.distance < 1e-3
@@ -0,0 +1,82 @@
+"""
+test_index.py – flat / IVF 索引：與全掃描一致、召回率、存檔、FaceMatcher 整合
+"""
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import FaceMatcher
+from src.facedb.index import FlatIndex, IVFIndex, load_index, recall_at, synthetic_gallery
+
+
+@pytest.fixture(scope="module")
+def data():
+    return synthetic_gallery(3000, shots=5, seed=3)
+
+
+def test_flat_matches_bruteforce(data):
+    gallery, _, queries = data
+    d, ids = FlatIndex(gallery).search(queries[:20], k=5)
+    ref = np.linalg.norm(gallery[None] - queries[:20, None], axis=2)
+    order = np.argsort(ref, axis=1)[:, :5]
+    np.testing.assert_array_equal(ids, order)
+    np.testing.assert_allclose(d, np.take_along_axis(ref, order, axis=1), atol=1e-4)
+
+
+def test_ivf_exact_when_probing_all_lists_and_recall_with_few(data):
+    gallery, _, queries = data
+    _, exact = FlatIndex(gallery).search(queries, k=10)
+    index = IVFIndex.build(gallery, nlist=64, seed=1)
+    assert index.offsets[-1] == len(gallery) and sorted(index.order) == list(range(len(gallery)))
+    _, all_lists = index.search(queries, k=10, nprobe=64)
+    np.testing.assert_array_equal(all_lists, exact)
+    _, few = index.search(queries, k=10, nprobe=4)
+    assert recall_at(few, exact, 1) >= 0.95
+    assert index.search(np.empty((0, 128)), k=3)[1].shape == (0, 3)
+
+
+def test_save_load_roundtrip_and_stale_index(tmp_path, data):
+    gallery, _, queries = data
+    index = IVFIndex.build(gallery, nlist=32, nprobe=3)
+    path = index.save(tmp_path / "faces.index.npz")
+    loaded = load_index(path, gallery)
+    assert isinstance(loaded, IVFIndex) and loaded.nprobe == 3
+    np.testing.assert_array_equal(loaded.search(queries, 5)[1], index.search(queries, 5)[1])
+    changed = gallery.copy()
+    changed[0] += 1.0
+    with pytest.raises(ValueError):
+        load_index(path, changed)
+
+
+def test_matcher_with_index_agrees_with_full_scan(data):
+    gallery, labels, queries = data
+    names = [f"p{l:04d}" for l in labels]
+    exact = FaceMatcher(gallery, names, tolerance=0.2)
+    indexed = FaceMatcher(gallery, names, tolerance=0.2)
+    indexed.set_index(IVFIndex.build(indexed.gallery, nlist=48, nprobe=48), candidates=16)
+    unknown = np.full((1, 128), 5.0, np.float32)
+    q = np.vstack([queries, unknown])
+    for a, b in zip(exact.match(q), indexed.match(q)):
+        assert (a.name, a.best) == (b.name, b.best)
+        assert a.distance == pytest.approx(b.distance, abs=1e-4)
+        assert a.margin == pytest.approx(b.margin, abs=1e-4)
+    assert indexed.match(q)[-1].name == "Unknown"
+    with pytest.raises(ValueError):
+        indexed.set_index(FlatIndex(gallery[:10]))
+
+
+def test_ivf_min_margin_is_checked_exactly(data):
+    gallery, labels, queries = data
+    names = [f"p{l:04d}" for l in labels]
+    rng = np.random.default_rng(0)
+    between = (gallery[:-5:5] + gallery[5::5]) / 2 + rng.normal(size=(len(gallery) // 5 - 1, 128)) * 0.002
+    q = np.vstack([queries, between]).astype(np.float32)
+    exact = FaceMatcher(gallery, names, tolerance=0.3, min_margin=0.05)
+    indexed = FaceMatcher(gallery, names, tolerance=0.3, min_margin=0.05)
+    index = IVFIndex.build(indexed.gallery, nlist=64, nprobe=1, seed=1)
+    assert not index.exact and FlatIndex(gallery).exact
+    indexed.set_index(index, candidates=4)
+    ref = exact.match(q)
+    got = indexed.match(q)
+    # 近似索引可能漏認（沒掃到最近的桶），但認得的一定與逐張比對相同
+    assert all(b.name == a.name for a, b in zip(ref, got) if b.name != "Unknown")
+    assert sum(b.name != "Unknown" for b in got) > len(queries) // 2
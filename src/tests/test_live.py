@@ -0,0 +1,86 @@
+"""
+test_live.py – 特徵庫熱重載：去抖動、換版、載入失敗沿用舊版、比對中換版不出錯
+"""
+import os
+import threading
+from functools import partial
+
+import numpy as np
+
+from src.facedb import face_database
+from src.facedb.gallery import atomic_writer, write_gallery
+from src.facedb.index import synthetic_gallery
+from src.facedb.live import LiveMatcher
+
+
+def _write(path, gallery, labels, extra=()):
+    names = [f"p{v:03d}" for v in labels] + [n for n, _ in extra]
+    vecs = np.vstack([gallery] + [v[None] for _, v in extra])
+    write_gallery(path, vecs, names)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))   # 同一 tick 內寫兩次也看得出來
+
+
+def test_reload_after_file_settles(tmp_path):
+    gallery, labels, queries = synthetic_gallery(500, shots=5, seed=4)
+    pkl = tmp_path / "faces.pkl"
+    gal = pkl.with_suffix(".gallery")
+    _write(gal, gallery, labels)
+    live = LiveMatcher(partial(face_database.load_matcher, pkl), face_database.watched_files(pkl))
+    assert len(live) == 500 and live.dim == 128 and live.poll() is False
+
+    newbie = queries[0] + 0.001
+    _write(gal, gallery, labels, [("newbie", newbie)])
+    assert live.poll() is False                          # 第一次看到變動：等下一輪確認寫完
+    old = live.current
+    assert live.poll() is True and live.current is not old
+    assert live.match(newbie)[0].name == "newbie" and len(live) == 501
+    s = live.stats()
+    assert s["reloads"] == s["generation"] == 1 and s["failures"] == 0 and s["last_ms"] > 0
+    assert live.poll() is False
+
+
+def test_broken_file_keeps_old_version(tmp_path):
+    gallery, labels, queries = synthetic_gallery(100, shots=5, seed=4)
+    gal = tmp_path / "faces.gallery"
+    _write(gal, gallery, labels)
+    live = LiveMatcher(partial(face_database.load_matcher, gal), [gal])
+    with atomic_writer(gal) as f:                        # 就地覆寫會截斷舊版的 memmap（SIGBUS）
+        f.write(b"not a gallery")
+    live.poll()
+    assert live.poll() is False and live.failures == 1 and live.stats()["error"]
+    assert live.match(queries[:3])[0].best.startswith("p") and len(live) == 100
+    _write(gal, gallery, labels, [("late", queries[1])])
+    live.poll()
+    assert live.poll() is True and live.match(queries[1])[0].name == "late"
+
+
+def test_swap_while_matching(tmp_path):
+    gallery, labels, queries = synthetic_gallery(2000, shots=5, seed=4)
+    gal = tmp_path / "faces.gallery"
+    _write(gal, gallery, labels)
+    live = LiveMatcher(partial(face_database.load_matcher, gal), [gal]).start(interval=0.01)
+    stop, errors, sizes = threading.Event(), [], set()
+
+    def frames():
+        while not stop.is_set():
+            try:
+                ms = live.match(queries[:5])
+                assert len(ms) == 5
+                sizes.add(len(live))
+            except Exception as e:                       # noqa: BLE001 - 收集後在主執行緒斷言
+                errors.append(e)
+
+    t = threading.Thread(target=frames)
+    t.start()
+    for i in range(3):
+        _write(gal, gallery, labels, [(f"n{j}", queries[j]) for j in range(i + 1)])
+        for _ in range(200):
+            if live.generation > i:
+                break
+            stop.wait(0.01)
+    stop.set()
+    t.join()
+    live.stop()
+    assert not errors and live.generation == 3 and len(live) == 2003
+    assert sizes <= {2000, 2001, 2002, 2003}
@@ -0,0 +1,88 @@
+"""
+test_manifest.py – 增量更新 gallery：只萃取新增 / 修改的照片，結果與全量重建一致
+"""
+import os
+import time
+
+import numpy as np
+
+from src.facedb.gallery import Gallery
+from src.facedb.manifest import manifest_path, update_gallery
+
+
+class CountingEncoder:
+    """以檔案內容產生特徵；內容以 b"noface" 開頭視為沒有臉"""
+
+    def __init__(self):
+        self.seen = []
+
+    def __call__(self, paths):
+        self.seen.extend(p.name for p in paths)
+        out = []
+        for p in paths:
+            data = p.read_bytes()
+            out.append(None if data.startswith(b"noface") else
+                       np.frombuffer(data.ljust(128, b"\0")[:128], np.uint8).astype(np.float32))
+        return out
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def _snapshot(gallery_path):
+    g = Gallery(gallery_path)
+    return g.sources, g.names, np.array(g.embeddings)
+
+
+def test_incremental_update_matches_full_rebuild(tmp_path):
+    data, out = tmp_path / "dataset", tmp_path / "db" / "faces.gallery"
+    for i in range(5):
+        _write(data / f"amy_{i}.jpg", b"amy%d" % i)
+    _write(data / "bob" / "bob_0.png", b"bob0")
+    _write(data / "bob_blur.jpg", b"noface")
+
+    enc = CountingEncoder()
+    s = update_gallery(data, out, enc)
+    assert (s.encoded, s.no_face, s.rows, s.written) == (7, 1, 6, True)
+    assert manifest_path(out).name == "faces.manifest.json"
+
+    # 沒有變動：不萃取、不寫檔
+    enc.seen.clear()
+    mtime = out.stat().st_mtime_ns
+    t0 = time.perf_counter()
+    s = update_gallery(data, out, enc)
+    assert time.perf_counter() - t0 < 1.0
+    assert enc.seen == [] and not s.written and out.stat().st_mtime_ns == mtime
+
+    # 新增、修改、只改 mtime、刪除
+    _write(data / "cat_0.jpg", b"cat0")
+    _write(data / "amy_1.jpg", b"amy1-new")
+    os.utime(data / "amy_2.jpg", ns=(1, 1))
+    (data / "amy_3.jpg").unlink()
+    s = update_gallery(data, out, enc)
+    assert sorted(enc.seen) == ["amy_1.jpg", "cat_0.jpg"]
+    assert (s.removed, s.rows, s.reused) == (1, 6, 5)
+
+    incremental = _snapshot(out)
+    update_gallery(data, tmp_path / "full" / "faces.gallery", CountingEncoder(), full=True)
+    full = _snapshot(tmp_path / "full" / "faces.gallery")
+    assert incremental[:2] == full[:2]
+    np.testing.assert_array_equal(incremental[2], full[2])
+
+
+def test_encoder_change_or_missing_rows_forces_reencode(tmp_path):
+    data, out = tmp_path / "dataset", tmp_path / "faces.gallery"
+    _write(data / "amy_0.jpg", b"amy0")
+    _write(data / "bob_0.jpg", b"bob0")
+    update_gallery(data, out, CountingEncoder())
+
+    enc = CountingEncoder()
+    update_gallery(data, out, enc, encoder_id="another-model")
+    assert sorted(enc.seen) == ["amy_0.jpg", "bob_0.jpg"]
+
+    out.unlink()                                 # gallery 遺失 → 全部重建
+    enc = CountingEncoder()
+    s = update_gallery(data, out, enc, encoder_id="another-model")
+    assert len(enc.seen) == 2 and s.rows == 2
@@ -0,0 +1,68 @@
+"""
+test_multicam.py – 多路來源共用偵測 / 萃取：批次、各路獨立追蹤與統計
+"""
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import FaceMatcher
+from src.gui_main.camera import FrameSource
+from src.gui_main.multicam import MultiCameraRunner
+
+N_FRAMES = 20
+
+
+def _video(path, value, n=N_FRAMES):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (96, 64))
+    if not writer.isOpened():
+        pytest.skip("此 OpenCV 無法寫入 MJPG 影片")
+    for i in range(n):
+        img = np.zeros((64, 96, 3), np.uint8)
+        img[16:48, 10 + i:42 + i] = value             # 亮度代表「是誰」
+        writer.write(img)
+    writer.release()
+    return path
+
+
+def batch_detector(batches):
+    def detect(packets):
+        batches.append(len(packets))
+        time.sleep(0.01)                                # 偵測比擷取慢 → 各路的幀會湊成一批
+        out = []
+        for p in packets:
+            ys, xs = np.nonzero(p.image[..., 0] > 64)
+            out.append((np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]], np.float32), None))
+        return out
+    return detect
+
+
+def encoder(rgb, boxes):
+    return np.stack([np.full(128, rgb[int(b[1]) + 4, int(b[0]) + 4, 0] / 2550.0) for b in boxes])
+
+
+def test_two_cameras_share_detector_and_keep_separate_tracks(tmp_path):
+    srcs = [FrameSource(_video(tmp_path / "a.avi", 100), policy="fifo", drop=False, fps=0, name="a"),
+            FrameSource(_video(tmp_path / "b.avi", 250), policy="fifo", drop=False, fps=0, name="b")]
+    matcher = FaceMatcher([np.full(128, 100 / 2550), np.full(128, 250 / 2550)], ["alice", "bob"],
+                          tolerance=0.05)
+    batches, seen = [], {"a": [], "b": []}
+    runner = MultiCameraRunner(srcs, batch_detector(batches), encoder, matcher)
+    stats = runner.run(lambda p: seen[p.frame.source].append((p.frame.seq, p.faces[0].track.name)))
+
+    assert sum(batches) == 2 * N_FRAMES and max(batches) == 2
+    assert stats["stages"]["detect"]["mean_batch"] > 1.0
+    for name, who in (("a", "alice"), ("b", "bob")):
+        cam = stats["cameras"][name]
+        assert cam["frames"] == N_FRAMES and cam["source"]["dropped"] == 0
+        assert [s for s, _ in seen[name]] == list(range(N_FRAMES))      # 各路依序
+        assert {n for _, n in seen[name]} == {who}
+        [track] = runner.cams[name].tracker.tracks                      # 各路獨立的 track
+        assert track.track_id == 1
+        assert 1 <= cam["encodes"] <= 2
+
+
+def test_rejects_duplicate_source_names(tmp_path):
+    with pytest.raises(ValueError):
+        MultiCameraRunner([FrameSource(0, name="x"), FrameSource(1, name="x")], batch_detector([]))
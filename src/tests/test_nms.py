@@ -0,0 +1,52 @@
+"""
+test_nms.py – NMS 後端一致性（conformance）測試
+各後端對同一組候選必須回傳相同的保留集合與順序。
+"""
+import numpy as np
+import pytest
+
+from src.retinaface_infer import nms as N
+
+
+@pytest.mark.parametrize("n", [1, 10, 100, 1000])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_backends_agree(n, seed):
+    boxes, scores = N.random_candidates(n, seed)
+    ref = N.nms(boxes, scores, 0.4, backend="greedy")
+    for backend in N.available_backends():
+        np.testing.assert_array_equal(N.nms(boxes, scores, 0.4, backend=backend), ref, err_msg=backend)
+    np.testing.assert_array_equal(N.nms(boxes, scores, 0.4), ref)
+
+    keep, _ = N.soft_nms(boxes, scores, 0.4, method="hard", score_thresh=0.0)
+    np.testing.assert_array_equal(keep, ref)
+
+
+def test_top_k_prefilter():
+    boxes, scores = N.random_candidates(300, seed=3)
+    top = np.argsort(-scores)[:50]
+    ref = top[N.nms(boxes[top], scores[top], backend="greedy")]
+    np.testing.assert_array_equal(N.nms(boxes, scores, top_k=50), ref)
+
+
+def test_soft_nms_decays_instead_of_dropping():
+    boxes = np.array([[0, 0, 10, 10], [1, 0, 11, 10], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+    keep, new_scores = N.soft_nms(boxes, scores, method="gaussian")
+    assert sorted(keep.tolist()) == [0, 1, 2]
+    assert new_scores[list(keep).index(1)] < 0.8
+    assert N.nms(boxes, scores).tolist() == [0, 2]
+
+
+def test_batched_matches_per_image():
+    per_image = [N.random_candidates(n, seed=s) for s, n in enumerate([40, 0, 120, 7])]
+    dets = [b for b, _ in per_image]
+    scores = [s for _, s in per_image]
+    batched = N.batched_nms(dets, scores, 0.4, top_k=100)
+    for (b, s), keep in zip(per_image, batched):
+        np.testing.assert_array_equal(keep, N.nms(b, s, 0.4, top_k=100))
+
+
+def test_unknown_backend():
+    boxes, scores = N.random_candidates(5)
+    with pytest.raises(ValueError):
+        N.nms(boxes, scores, backend="nope")
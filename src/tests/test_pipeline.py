@@ -0,0 +1,155 @@
+"""
+test_pipeline.py – 多階段管線 headless 重播（假偵測 / 假萃取，不需要 dlib / 攝影機）
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import FaceMatcher
+from src.gui_main.camera import FrameSource
+from src.gui_main.pipeline import Closed, RecognitionPipeline, StageQueue
+
+N_FRAMES = 40
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    """黑底上一個往右移動的白色方塊（假人臉）"""
+    path = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (160, 120))
+    if not writer.isOpened():
+        pytest.skip("此 OpenCV 無法寫入 MJPG 影片")
+    for i in range(N_FRAMES):
+        img = np.zeros((120, 160, 3), np.uint8)
+        img[40:80, 20 + i:60 + i] = 255
+        writer.write(img)
+    writer.release()
+    return path
+
+
+def fake_detector(delay=0.0):
+    def detect(p):
+        time.sleep(delay)
+        ys, xs = np.nonzero(p.image[..., 0] > 128)
+        if not len(xs):
+            return np.zeros((0, 4), np.float32), None
+        return np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]], np.float32), None
+    return detect
+
+
+def fake_encoder(rgb, boxes):
+    return np.stack([np.full(128, 0.01, np.float32) for _ in boxes])
+
+
+def _matcher():
+    return FaceMatcher([np.full(128, 0.01), np.full(128, 0.5)], ["alice", "bob"])
+
+
+def test_lossless_headless_replay_processes_every_frame(video_file):
+    src = FrameSource(video_file, policy="fifo", drop=False, fps=0)
+    pipe = RecognitionPipeline(src, fake_detector(), fake_encoder, _matcher(), realtime=False, headless=True)
+    seen = []
+    stats = pipe.run(lambda p: seen.append(p))
+
+    assert seen == []                                   # headless 不呼叫 on_frame
+    assert stats["frames"] == N_FRAMES
+    assert stats["source"]["dropped"] == 0
+    assert all(s["queue"]["dropped"] == 0 for s in stats["stages"].values() if "queue" in s)
+    assert stats["stages"]["detect"]["count"] == N_FRAMES
+    assert stats["stages"]["encode"]["queue"]["max_depth"] <= 2
+    # 單一 track：只在第一次與定期複查時萃取
+    assert 1 <= stats["encodes"] <= 3
+    [track] = pipe.tracker.tracks
+    assert track.name == "alice" and track.track_id == 1
+    assert stats["latency"]["count"] == N_FRAMES and stats["latency"]["p95_ms"] > 0
+
+
+def test_frames_stay_in_order_and_render_sees_identity(video_file):
+    src = FrameSource(video_file, policy="fifo", drop=False, fps=0)
+    pipe = RecognitionPipeline(src, fake_detector(), fake_encoder, _matcher(), realtime=False)
+    seqs, names = [], []
+
+    def on_frame(p):
+        seqs.append(p.frame.seq)
+        names.append(p.faces[0].track.name)
+        return len(seqs) < 25                          # on_frame 回傳 False 即停止
+
+    stats = pipe.run(on_frame)
+    assert seqs == list(range(25)) and stats["frames"] == 25
+    assert names[0] == "alice"                          # encode 階段在 render 之前完成
+    assert [f for f in pipe.queues.values() if not f.closed] == []
+
+
+def test_realtime_drops_at_entry_when_detector_is_slow(video_file):
+    src = FrameSource(video_file, policy="latest", fps=100)
+    pipe = RecognitionPipeline(src, fake_detector(delay=0.03), fake_encoder, _matcher(), realtime=True)
+    stats = pipe.run()
+
+    dropped = stats["source"]["dropped"] + stats["stages"]["detect"]["queue"]["dropped"]
+    assert dropped > 0 and stats["frames"] + dropped <= N_FRAMES
+    assert stats["stages"]["encode"]["queue"]["dropped"] == 0      # 只在入口丟幀
+    assert stats["stages"]["render"]["queue"]["dropped"] == 0
+    assert stats["latency"]["max_ms"] < 500
+
+
+def test_stage_error_is_raised_from_run(video_file):
+    def broken(p):
+        raise ValueError("boom")
+
+    pipe = RecognitionPipeline(FrameSource(video_file, fps=0), broken, realtime=False)
+    with pytest.raises(ValueError, match="boom"):
+        pipe.run()
+
+
+def test_stage_queue_policies():
+    q = StageQueue(2, "drop_oldest")
+    for i in range(5):
+        assert q.put(i)
+    assert (q.get(), q.get(), q.dropped) == (3, 4, 3)
+    assert q.get(timeout=0.01) is None
+
+    q = StageQueue(1, "block")
+    q.put("a")
+    t = threading.Thread(target=q.put, args=("b",))
+    t.start()
+    time.sleep(0.05)
+    assert t.is_alive() and len(q) == 1                 # 背壓：滿了就等
+    assert q.get() == "a"
+    t.join(1.0)
+    q.close()
+    assert q.get() == "b" and not q.put("c")
+    with pytest.raises(Closed):
+        q.get()
+
+
+def test_scheduler_skips_detection_and_caps_encodes(video_file):
+    from src.gui_main.scheduler import AdaptiveScheduler
+
+    calls, every, scales = [], [], []
+    slow = fake_detector(delay=0.06)                    # 比每幀預算（50 ms）還慢
+
+    def detect(p):
+        calls.append(p.frame.seq)
+        every.append(pipe.plan.detect_every)
+        scales.append(p.scale)
+        return slow(p)
+
+    sched = AdaptiveScheduler(target_fps=20, max_latency_ms=200, max_encode=1)
+    src = FrameSource(video_file, policy="fifo", drop=False, fps=0)
+    pipe = RecognitionPipeline(src, detect, fake_encoder, _matcher(), realtime=False, headless=True,
+                               scheduler=sched)
+    stats = pipe.run()
+
+    assert stats["frames"] == N_FRAMES                  # 沒偵測的幀仍以追蹤預測畫出
+    assert len(calls) < N_FRAMES and pipe.plan.detect_every > 1
+    # 兩次偵測之間跳過的幀數：至少等到下一次偵測時的 detect_every，且確實有跳過
+    gaps = [b - a for a, b in zip(calls, calls[1:])]
+    assert calls[0] == 0 and all(g >= e for g, e in zip(gaps, every[1:]))
+    assert 1 < max(gaps) <= sched.max_detect_every
+    assert scales[0] == 1.0 and set(scales) <= set(sched.scales)
+    assert stats["encodes"] <= len(calls)               # max_encode=1：每次偵測最多萃取一張
+    assert stats["scheduler"]["detections"] == len(calls)
+    assert sched.encode_cost.value is not None          # encode 耗時有回饋給排程器
@@ -0,0 +1,50 @@
+"""
+test_preprocess.py – Letterbox 前處理測試（純 CPU）
+"""
+import cv2
+import numpy as np
+import pytest
+
+from src.retinaface_infer.preprocess import BGR_MEAN, Letterbox
+
+
+@pytest.mark.parametrize("src_hw", [(480, 640), (720, 1280), (1000, 300), (608, 640)])
+def test_letterbox_writes_in_place_and_keeps_aspect(src_hw):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, src_hw + (3,), dtype=np.uint8)
+    host_in = np.full((1, 608, 640, 3), np.nan, dtype=np.float32)
+
+    lb = Letterbox(608, 640)
+    out, meta = lb(img, out=host_in[0])
+    assert np.shares_memory(out, host_in)
+    assert not np.isnan(host_in).any()                        # 補邊區域也都寫到
+
+    new_w = round(meta.src_w * meta.scale_x)
+    new_h = round(meta.src_h * meta.scale_y)
+    assert new_w == 640 or new_h == 608                       # 至少一邊貼齊
+    assert abs(meta.scale_x - meta.scale_y) < 0.01            # 等比例
+
+    region = out[meta.pad_y:meta.pad_y + new_h, meta.pad_x:meta.pad_x + new_w]
+    expected = cv2.resize(img, (new_w, new_h)).astype(np.float32) - np.float32(BGR_MEAN)
+    np.testing.assert_allclose(region, expected)
+    assert out.sum() == pytest.approx(region.sum(), rel=1e-5)  # 補邊為 0
+
+
+def test_meta_maps_back_to_source_pixels():
+    lb = Letterbox(608, 640)
+    _, meta = lb(np.zeros((720, 1280, 3), np.uint8))
+    src_box = np.array([[100.0, 200.0, 400.0, 650.0]], dtype=np.float32)
+
+    # 原圖像素 → engine 輸入正規化座標
+    norm = np.empty_like(src_box)
+    norm[:, 0::2] = (src_box[:, 0::2] * meta.scale_x + meta.pad_x) / meta.dst_w
+    norm[:, 1::2] = (src_box[:, 1::2] * meta.scale_y + meta.pad_y) / meta.dst_h
+    np.testing.assert_allclose(meta.boxes_to_source(norm), src_box, rtol=1e-5)
+
+    landms = np.tile(norm[:, :2], (1, 5))
+    np.testing.assert_allclose(meta.landms_to_source(landms), np.tile(src_box[:, :2], (1, 5)), rtol=1e-5)
+
+
+def test_rejects_wrong_buffer():
+    with pytest.raises(ValueError):
+        Letterbox(608, 640)(np.zeros((10, 10, 3), np.uint8), out=np.empty((608, 640, 3), np.float64))
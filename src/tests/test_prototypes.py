@@ -0,0 +1,100 @@
+"""
+test_prototypes.py – 離群剔除、原型壓縮、存檔與 PrototypeMatcher 與逐張比對一致
+"""
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import FaceMatcher
+from src.facedb.index import synthetic_gallery
+from src.facedb.prototypes import (PrototypeMatcher, compact, compact_matcher, load_prototypes,
+                                   reject_outliers)
+
+
+@pytest.fixture(scope="module")
+def data():
+    gallery, labels, queries = synthetic_gallery(600, shots=10, spread=0.6, noise=0.25, seed=5)
+    return FaceMatcher(gallery, [f"p{i:03d}" for i in labels], tolerance=0.45), queries
+
+
+def test_reject_outliers_drops_far_photo():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(12, 128)).astype(np.float32) * 0.01
+    x[3] += 1.0                                              # 框到別人的一張
+    keep = reject_outliers(x)
+    assert not keep[3] and keep.sum() == 11
+    assert reject_outliers(x, max_spread=0.0).sum() == 1     # 全被剔除時仍保留最中心的一張
+
+
+@pytest.mark.parametrize("method", ["medoid", "mean"])
+def test_compact_counts_and_stats(data, method):
+    full, _ = data
+    protos = compact_matcher(full, per_identity=3, method=method)
+    assert len(protos) == 3 * len(full.identities)
+    assert list(protos.identities) == list(full.identities)
+    s = protos.stats_for(full.identities[0])
+    assert s.count == 10 and 1 <= s.kept <= 10 and 0 <= s.mean_dist <= s.radius
+    rows = protos.labels == 0
+    assert np.isclose(protos.radius[rows].max(), s.radius)             # 逐原型半徑只看保留的照片
+    assert len(protos.outliers) == (protos.outlier_labels == 0).sum() + \
+           sum(st.count - st.kept for st in protos.stats[1:]) and (protos.outlier_labels == 0).sum() == 10 - s.kept
+    if method == "medoid":                                   # medoid 就是真實照片
+        assert not protos.anchor.any()
+        assert all((np.abs(full.gallery - v).sum(axis=1) < 1e-6).any() for v in protos.vectors)
+
+
+def test_save_load_and_stale_source(tmp_path, data):
+    full, _ = data
+    protos = compact_matcher(full)
+    path = protos.save(tmp_path / "faces.protos.npz")
+    back = load_prototypes(path, full.gallery)
+    np.testing.assert_array_equal(back.vectors, protos.vectors)
+    assert back.names == protos.names and back.stats == protos.stats and back.method == "medoid"
+    np.testing.assert_array_equal(back.radius, protos.radius)
+    np.testing.assert_array_equal(back.outliers, protos.outliers)
+    with pytest.raises(ValueError):
+        load_prototypes(path, full.gallery[:-1])
+    with pytest.raises(ValueError):
+        compact(full.gallery, np.zeros(len(full)), ["a"], method="median")
+
+
+@pytest.mark.parametrize("method", ["medoid", "mean"])
+def test_prototype_matcher_agrees_with_full(data, method):
+    full, queries = data
+    rng = np.random.default_rng(1)
+    strangers = rng.normal(size=(20, 128)).astype(np.float32)
+    between = (full.gallery[:-10:10] + full.gallery[10::10]) / 2      # 兩人中間：必須退回逐張比對
+    q = np.vstack([queries, strangers, full.gallery[::7], between])
+    pm = PrototypeMatcher(compact_matcher(full, method=method), full)
+    got, ref = pm.match(q), full.match(q)
+    assert [m.name for m in got] == [m.name for m in ref]
+    assert 0 < pm.fallback_rate < 1 and pm.queries == len(q)
+    assert pm.match(np.empty((0, 128))) == []
+    only = PrototypeMatcher(pm.protos)                       # 不退回：只比原型
+    assert len(only) == len(pm.protos) and only.dim == 128
+    assert np.mean([a.name == b.name for a, b in zip(only.match(q), ref)]) > 0.9
+
+
+def test_outlier_photos_are_matched_exactly(data):
+    full, queries = data
+    rng = np.random.default_rng(2)
+    stray = rng.normal(size=128).astype(np.float32) * 0.1        # 框到別人：離 p000 其他照片很遠
+    names = [str(n) for n in full.identities[full.labels]]
+    mixed = FaceMatcher(np.vstack([full.gallery, stray]), names + ["p000"], tolerance=0.45)
+    protos = compact_matcher(mixed)
+    assert any(np.allclose(o, stray) for o in protos.outliers)
+    assert protos.stats_for("p000").radius < 1.0                 # 半徑不被離群照片撐大
+    pm = PrototypeMatcher(protos, mixed)
+    q = np.vstack([stray + 0.01, queries[:20]])
+    assert [m.name for m in pm.match(q)] == [m.name for m in mixed.match(q)]
+    assert pm.match(stray)[0].name == "p000"
+
+
+def test_load_matcher_uses_prototypes_only_when_asked(tmp_path, data):
+    from src.facedb import face_database
+    from src.facedb.gallery import write_gallery
+
+    full, _ = data
+    gal = write_gallery(tmp_path / "faces.gallery", full.gallery, [str(n) for n in full.identities[full.labels]])
+    compact_matcher(full).save(face_database.prototypes_path(gal))
+    assert isinstance(face_database.load_matcher(gal), FaceMatcher)
+    assert isinstance(face_database.load_matcher(gal, prototypes=True), PrototypeMatcher)
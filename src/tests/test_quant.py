@@ -0,0 +1,98 @@
+"""
+test_quant.py – float16 / int8 量化特徵：誤差、.gallery 存取、與 float32 比對結果一致
+"""
+import numpy as np
+import pytest
+
+from src.facedb import manifest
+from src.facedb.face_matcher import FaceMatcher
+from src.facedb.gallery import Gallery, write_gallery
+from src.facedb.index import synthetic_gallery
+from src.facedb.quant import QuantizedIndex, dequantize, quantize
+
+
+@pytest.fixture(scope="module")
+def data():
+    return synthetic_gallery(4000, shots=5, seed=7)
+
+
+@pytest.mark.parametrize("dtype, itemsize, tol", [("float16", 2, 1e-3), ("int8", 1, 5e-3)])
+def test_quantize_roundtrip_error(data, dtype, itemsize, tol):
+    gallery, _, _ = data
+    codes, scale = quantize(gallery, dtype)
+    assert codes.itemsize == itemsize and (scale is None) == (dtype == "float16")
+    assert np.abs(dequantize(codes, scale) - gallery).max() < tol
+    with pytest.raises(ValueError):
+        quantize(gallery, "int4")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_identity_decisions_agree_with_float_path(data, dtype):
+    gallery, labels, queries = data
+    rng = np.random.default_rng(1)
+    strangers = rng.normal(size=(50, 128)).astype(np.float32) * 0.05
+    q = np.vstack([queries, strangers, gallery[::13] + rng.normal(size=(len(gallery[::13]), 128)) * 0.01])
+    names = [f"p{v:04d}" for v in labels]
+    full = FaceMatcher(gallery, names)
+    quant = FaceMatcher(gallery, names)
+    index = QuantizedIndex.build(quant.gallery, dtype)
+    quant.set_index(index)
+    ref, got = full.match(q), quant.match(q)
+    assert [m.name for m in got] == [m.name for m in ref]
+    assert [m.best for m in got] == [m.best for m in ref]
+    # 重排後的距離是 float32 精確值
+    np.testing.assert_allclose([m.distance for m in got], [m.distance for m in ref], atol=1e-4)
+    assert index.nbytes < full.gallery.nbytes * (0.3 if dtype == "int8" else 0.55)
+
+    d, ids = index.search(q[:10], k=5)
+    exact = full.distances(q[:10])
+    np.testing.assert_array_equal(ids, np.argsort(exact, axis=1)[:, :5])
+    np.testing.assert_allclose(d, np.sort(exact, axis=1)[:, :5], atol=1e-4)
+
+
+def test_quantized_gallery_file(tmp_path, data):
+    gallery, labels, queries = data
+    names = [f"p{v:04d}" for v in labels]
+    g = Gallery(write_gallery(tmp_path / "faces.gallery", gallery, names, dtype="int8"))
+    assert g.dtype == "int8" and g.codes.dtype == np.int8 and g.scale.shape == (128,)
+    assert np.shares_memory(g.codes, g._mm)
+    matcher = FaceMatcher.from_gallery(g)                      # 自動改走量化掃描
+    assert matcher.index is not None and matcher.index.kind == "quant"
+    assert [m.name for m in matcher.match(queries)] == [m.name for m in FaceMatcher(gallery, names).match(queries)]
+
+    plain = Gallery(write_gallery(tmp_path / "plain.gallery", gallery[:10], names[:10]))
+    assert plain.dtype == "float32" and plain.quantized_index() is None
+    assert FaceMatcher.from_gallery(plain).index is None
+    with pytest.raises(ValueError):
+        write_gallery(tmp_path / "x.gallery", gallery[:2], names[:2], dtype="bfloat16")
+
+
+def test_incremental_update_keeps_dtype(tmp_path):
+    dataset, out = tmp_path / "dataset", tmp_path / "faces.gallery"
+    (dataset / "amy").mkdir(parents=True)
+    for i in range(3):
+        (dataset / "amy" / f"{i}.jpg").write_bytes(bytes([i + 1]) * 16)
+    encode = lambda paths: [np.frombuffer(p.read_bytes().ljust(128, b"\0"), np.uint8) / 255.0 for p in paths]
+    manifest.update_gallery(dataset, out, encode)
+    g = Gallery(out)
+    write_gallery(out, np.array(g.embeddings), g.names, g.sources, dtype="int8")
+    del g
+    (dataset / "amy" / "3.jpg").write_bytes(b"\x09" * 16)
+    assert manifest.update_gallery(dataset, out, encode).written
+    g = Gallery(out)
+    assert len(g) == 4 and g.dtype == "int8"
+    del g
+
+    # 全量重建、或 gallery 是 `gallery convert --dtype` 做的（沒有 manifest）：格式仍沿用
+    assert manifest.update_gallery(dataset, out, encode, full=True).written
+    assert Gallery(out).dtype == "int8"
+    manifest.manifest_path(out).unlink()
+    write_gallery(out, np.zeros((1, 128)), ["amy"], dtype="float16")
+    assert manifest.update_gallery(dataset, out, encode).written
+    g = Gallery(out)
+    assert len(g) == 4 and g.dtype == "float16"
+    del g
+
+    # 明確指定 dtype：沒有照片變動也會改寫
+    assert manifest.update_gallery(dataset, out, encode, dtype="float32").written
+    assert Gallery(out).dtype == "float32"
@@ -0,0 +1,109 @@
+"""
+test_retinaface_post.py – RetinaFace 後處理（priors / decode / NMS）單元測試
+不需要 TensorRT，純 NumPy 即可執行：python -m pytest -q src/tests
+"""
+from itertools import product
+
+import numpy as np
+import pytest
+
+from src.retinaface_infer import retinaface_post as rp
+
+
+def _reference_priors(w, h, steps=rp.STEPS, min_sizes=rp.MIN_SIZES):
+    """原版 RetinaFace PriorBox 的逐點迴圈寫法，作為對照組"""
+    anchors = []
+    for k, step in enumerate(steps):
+        fm_h, fm_w = int(np.ceil(h / step)), int(np.ceil(w / step))
+        for i, j in product(range(fm_h), range(fm_w)):
+            for m in min_sizes[k]:
+                anchors += [(j + 0.5) * step / w, (i + 0.5) * step / h, m / w, m / h]
+    return np.array(anchors, dtype=np.float32).reshape(-1, 4)
+
+
+@pytest.mark.parametrize("w,h", [(640, 608), (640, 640), (333, 251)])
+def test_prior_box_matches_reference(w, h):
+    np.testing.assert_allclose(rp.prior_box(w, h), _reference_priors(w, h), rtol=1e-6)
+
+
+def test_prior_box_engine_shape_and_cache():
+    priors = rp.prior_box(640, 608)
+    assert priors.shape == (15960, 4)          # 與 retinaface.onnx 輸出的 anchor 數一致
+    assert rp.prior_box(640, 608) is priors    # 同解析度命中快取
+    assert not priors.flags.writeable
+    rp.check_priors(15960, priors)
+    with pytest.raises(ValueError):
+        rp.check_priors(7980, priors)
+
+
+def test_legacy_priors_attribute_is_lazy():
+    assert rp._PRIORS is rp.prior_box(640, 608)
+
+
+# ------------------------- decode ------------------------- #
+def _reference_decode(loc, priors, v=rp._VARIANCE):
+    cxcy = priors[:, :2] + loc[:, :2] * v[0] * priors[:, 2:]
+    wh = priors[:, 2:] * np.exp(loc[:, 2:] * v[1])
+    return np.hstack([cxcy - wh / 2, cxcy + wh / 2])
+
+
+def _reference_landm(landms, priors, v=rp._VARIANCE):
+    out = np.zeros_like(landms)
+    for i in range(5):
+        out[:, 2 * i:2 * i + 2] = priors[:, :2] + landms[:, 2 * i:2 * i + 2] * v[0] * priors[:, 2:]
+    return out
+
+
+@pytest.fixture(scope="module")
+def raw_outputs():
+    rng = np.random.default_rng(0)
+    n = rp.prior_box(640, 608).shape[0]
+    loc = rng.normal(size=(n, 4)).astype(np.float32)
+    conf = (rng.normal(size=(n, 2)) * 3).astype(np.float32)
+    landms = rng.normal(size=(n, 10)).astype(np.float32)
+    return loc, conf, landms
+
+
+def test_decode_matches_reference(raw_outputs):
+    loc, _, landms = raw_outputs
+    priors = rp.prior_box(640, 608)
+    np.testing.assert_allclose(rp.decode(loc, priors), _reference_decode(loc, priors), atol=1e-6)
+    np.testing.assert_allclose(rp.decode_landm(landms, priors), _reference_landm(landms, priors), atol=1e-6)
+
+    buf = loc.copy()
+    assert rp.decode(buf, priors, out=buf) is buf      # 就地解碼
+    np.testing.assert_allclose(buf, _reference_decode(loc, priors), atol=1e-6)
+
+
+def test_decoder_filters_before_decoding(raw_outputs):
+    loc, conf, landms = raw_outputs
+    priors = rp.prior_box(640, 608)
+    e = np.exp(conf)
+    prob = e[:, 1] / e.sum(axis=1)
+    mask = prob > 0.9
+
+    det = rp.Decoder(priors)(loc, conf, landms, conf_thresh=0.9)
+    np.testing.assert_allclose(det.scores, prob[mask], rtol=1e-5)
+    np.testing.assert_allclose(det.boxes, _reference_decode(loc, priors)[mask], atol=1e-6)
+    np.testing.assert_allclose(det.landms, _reference_landm(landms, priors)[mask], atol=1e-6)
+
+    # 機率輸入（logits=False）結果應一致
+    probs = np.stack([1 - prob, prob], axis=1).astype(np.float32)
+    det2 = rp.Decoder(priors, logits=False)(loc, conf=probs, landms=landms, conf_thresh=0.9)
+    np.testing.assert_allclose(det2.boxes, det.boxes)
+
+
+def test_decoder_reuses_pool_and_accepts_out(raw_outputs):
+    loc, conf, landms = raw_outputs
+    priors = rp.prior_box(640, 608)
+    dec = rp.Decoder(priors, conf_thresh=0.5)
+    first = dec(loc, conf, landms)
+    second = dec(loc, conf, landms)
+    assert np.shares_memory(first.boxes, second.boxes)
+
+    n = priors.shape[0]
+    out = rp.Detections(np.empty((n, 4), np.float32), np.empty(n, np.float32),
+                        np.empty((n, 10), np.float32))
+    det = dec(loc, conf, landms, out=out)
+    assert np.shares_memory(det.boxes, out.boxes)
+    np.testing.assert_allclose(det.boxes, second.boxes)
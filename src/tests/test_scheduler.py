@@ -0,0 +1,84 @@
+"""
+test_scheduler.py – AdaptiveScheduler 以模擬時鐘 + 假偵測器驗證決策
+"""
+import pytest
+
+from src.gui_main.scheduler import AdaptiveScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, s):
+        self.t += s
+
+
+def _simulate(sched, clock, detect_s, encode_s, faces, overhead_s=0.005, frames=200):
+    """偵測耗時 ∝ scale²；回傳最後 100 幀的平均幀時間與每幀實際萃取張數"""
+    encoded = []
+    t_start = None
+    for f in range(frames):
+        if f == frames - 100:
+            t_start = clock()
+        plan = sched.begin_frame()
+        n = 0
+        if plan.detect:
+            with sched.measure("detect", scale=plan.scale):
+                clock.sleep(detect_s * plan.scale ** 2)
+            n = min(faces, plan.encode_budget)
+            with sched.measure("encode", count=n):
+                clock.sleep(encode_s * n)
+        clock.sleep(overhead_s)
+        sched.end_frame()
+        encoded.append(n)
+    return (clock() - t_start) / 100, encoded
+
+
+def test_light_load_uses_full_rate_and_scale():
+    clock = FakeClock()
+    sched = AdaptiveScheduler(target_fps=20, max_latency_ms=150, clock=clock)
+    _simulate(sched, clock, detect_s=0.010, encode_s=0.005, faces=1)
+    m = sched.metrics()
+    assert (m["detect_every"], m["scale"]) == (1, 1.0)
+    assert m["encode_budget"] == 7                       # (50 − 5 overhead − 10 偵測) / 5 ms
+
+
+def test_heavy_load_trades_cadence_and_scale_to_hold_fps_and_latency():
+    clock = FakeClock()
+    sched = AdaptiveScheduler(target_fps=20, max_latency_ms=150, clock=clock)
+    frame_s, encoded = _simulate(sched, clock, detect_s=0.120, encode_s=0.030, faces=10)
+    m = sched.metrics()
+    assert m["scale"] < 1.0 and m["detect_every"] > 1
+    assert m["latency_ms"] <= 150
+    assert frame_s <= sched.frame_budget * 1.05          # 跟得上目標 FPS
+    assert 1 <= m["encode_budget"] < 10 and max(encoded[-100:]) == m["encode_budget"]
+    assert m["detect_ms"] == pytest.approx(120 * m["scale"] ** 2, rel=1e-6)
+
+
+def test_recovers_when_load_drops():
+    clock = FakeClock()
+    sched = AdaptiveScheduler(target_fps=20, max_latency_ms=150, clock=clock)
+    _simulate(sched, clock, detect_s=0.120, encode_s=0.030, faces=10)
+    _simulate(sched, clock, detect_s=0.010, encode_s=0.005, faces=1, frames=300)
+    assert (sched.detect_every, sched.scale) == (1, 1.0)
+
+
+def test_encodes_from_another_thread_do_not_eat_frame_overhead():
+    clock = FakeClock()
+    sched = AdaptiveScheduler(target_fps=20, max_latency_ms=150, clock=clock)
+    for _ in range(50):
+        plan = sched.begin_frame()
+        if plan.detect:
+            with sched.measure("detect", scale=plan.scale):
+                clock.sleep(0.010 * plan.scale ** 2)
+        sched.record_encode(0.030, 1)                    # 萃取執行緒同時回報：不屬於這一幀
+        clock.sleep(0.005)
+        sched.end_frame()
+    m = sched.metrics()
+    assert m["overhead_ms"] == pytest.approx(5.0, rel=1e-6)
+    assert m["encode_ms_per_face"] == pytest.approx(30.0, rel=1e-6)
+    assert m["encode_budget"] == 1                       # (50 − 5 − 10) / 30 ms
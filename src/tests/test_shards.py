@@ -0,0 +1,76 @@
+"""
+test_shards.py – 切分特徵庫、allow 篩選、平行查詢合併與單一特徵庫一致、逐 shard 熱重載
+"""
+import os
+
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import FaceMatcher
+from src.facedb.gallery import Gallery, write_gallery
+from src.facedb.index import synthetic_gallery
+from src.facedb.shards import ShardedGallery, split_gallery
+
+
+@pytest.fixture
+def split(tmp_path):
+    gallery, labels, queries = synthetic_gallery(600, shots=5, seed=2)
+    names = [f"p{v:03d}" for v in labels]
+    sources = [f"site{v % 3}/p{v:03d}/{i}.jpg" for i, v in enumerate(labels)]
+    src = write_gallery(tmp_path / "faces.gallery", gallery, names, sources)
+    return tmp_path / "shards", src, FaceMatcher(gallery, names), queries
+
+
+def test_split_by_site_and_hash(split):
+    out, src, full, _ = split
+    counts = split_gallery(src, out, by="site")
+    assert sorted(counts) == ["site0", "site1", "site2"] and sum(counts.values()) == len(full)
+    hashed = split_gallery(src, out.parent / "hashed", by="hash", shards=4)
+    assert sum(hashed.values()) == len(full) and len(hashed) <= 4
+    per_shard = [set(Gallery(out.parent / "hashed" / f"{n}.gallery").identities) for n in hashed]
+    assert sum(map(len, per_shard)) == len(full.identities)         # 同一人只在一個 shard
+    with pytest.raises(ValueError):
+        split_gallery(src, out, by="dept")
+
+
+def test_fanout_matches_single_gallery_and_allow(split):
+    out, src, full, queries = split
+    split_gallery(src, out, by="hash", shards=5)
+    sg = ShardedGallery(out, workers=3)
+    try:
+        assert not any(s.loaded for s in sg.shards.values())       # 第一次查詢才開啟
+        got, ref = sg.match(queries), full.match(queries)
+        assert [(m.name, m.best) for m in got] == [(m.name, m.best) for m in ref]
+        np.testing.assert_allclose([m.distance for m in got], [m.distance for m in ref], atol=1e-5)
+        np.testing.assert_allclose([m.margin for m in got], [m.margin for m in ref], atol=1e-5)
+        assert [[n for n, _ in r] for r in sg.topk(queries[:5], 3)] == \
+               [[n for n, _ in r] for r in full.topk(queries[:5], 3)]
+        assert len(sg) == len(full) and list(sg.identities) == list(full.identities)
+    finally:
+        sg.close()
+
+    only = ShardedGallery(out, allow=["h0*"])
+    assert list(only.shards) == ["h0"]
+    assert set(m.best for m in only.match(queries)) <= set(Gallery(out / "h0.gallery").identities)
+    only.close()
+    with pytest.raises(FileNotFoundError):
+        ShardedGallery(out, allow=["nope"])
+
+
+def test_reload_only_changed_shard(split):
+    out, src, full, queries = split
+    split_gallery(src, out, by="site")
+    sg = ShardedGallery(out, preload=True)
+    before = {n: s for n, s in sg.shards.items()}
+    g = Gallery(out / "site1.gallery")
+    write_gallery(out / "site1.gallery", np.vstack([g.embeddings, queries[:1]]), g.names + ["newbie"],
+                  g.sources + ["site1/newbie/0.jpg"])
+    os.utime(out / "site1.gallery", ns=(1, 1))                     # 確保 mtime 不同
+    assert sg.refresh() == ["site1"] and sg.reloads == 1
+    assert sg.shards["site0"] is before["site0"] and sg.shards["site1"] is not before["site1"]
+    assert sg.shards["site1"].loaded                                # 換上前已開好
+    assert sg.match(queries[:1])[0].name == "newbie"
+    (out / "site2.gallery").unlink()
+    assert sg.refresh() == ["site2"] and "site2" not in sg.shards
+    assert sg.refresh() == []
+    sg.close()
@@ -0,0 +1,58 @@
+"""
+test_startup.py – import 時間預算：src 套件不可在 import 時讀資料集或載入重型模型
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from src.jetsoncv import startup
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# 冷啟動 import 的時間上限（秒）；Jetson 上約為此機器的 3~5 倍，仍需在預算內
+IMPORT_BUDGET_S = 2.0
+
+MODULES = [
+    "src.facedb.face_database", "src.facedb.face_encoder", "src.facedb.face_matcher",
+    "src.facedb.gallery", "src.facedb.manifest", "src.facedb.enroll", "src.facedb.index",
+    "src.facedb.prototypes", "src.facedb.quant", "src.facedb.shards", "src.facedb.live",
+    "src.retinaface_infer.backends", "src.retinaface_infer.async_infer",
+    "src.retinaface_infer.retinaface_trt", "src.retinaface_infer.retinaface_demo_vis",
+    "src.retinaface_infer.face_detector_retina", "src.gui_main.camera", "src.gui_main.pipeline",
+    "src.gui_main.multicam", "src.gui_main.framebus", "src.gui_main.gui", "src.tools.bench",
+]
+HEAVY = ["face_recognition", "dlib", "tensorrt", "pycuda", "onnxruntime", "insightface"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{"seconds": time.perf_counter() - t0,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def test_import_stays_within_budget_and_lazy():
+    env = dict(os.environ, FACE_DATASET_DIR="/nonexistent")       # 不應在 import 時碰資料夾
+    out = subprocess.run([sys.executable, "-c", _PROBE.format(modules=MODULES, heavy=HEAVY)],
+                         cwd=ROOT, env=env, capture_output=True, text=True, timeout=60, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result["heavy"] == []
+    assert result["seconds"] < IMPORT_BUDGET_S, f"import 花了 {result['seconds']:.2f} s"
+
+
+def test_stage_and_importtime_parsing():
+    startup.reset()
+    with startup.stage("gallery load"):
+        pass
+    startup.mark("first frame")
+    names = [s.name for s in startup.stages()]
+    assert names == ["gallery load", "first frame"]
+
+    rows = startup.parse_importtime("import time: self [us] | cumulative | imported package\n"
+                                    "import time:       120 |        450 |   numpy\n"
+                                    "import time:      3000 |       3000 | cv2\n")
+    assert rows == [startup.ImportTime("numpy", 120e-6, 450e-6), startup.ImportTime("cv2", 3e-3, 3e-3)]
@@ -0,0 +1,55 @@
+"""
+test_tracker.py – FaceTracker：穩定的 track 編號與身分快取（特徵萃取次數）
+"""
+import numpy as np
+import pytest
+
+from src.facedb.face_matcher import Match
+from src.gui_main.tracker import FaceTracker
+
+
+def _crowd(frames=300, people=5, seed=0):
+    """people 張臉各自慢慢走動 + 偵測抖動；回傳每幀的 (boxes, 真實編號)"""
+    rng = np.random.default_rng(seed)
+    start = np.stack([np.arange(people) * 120.0 + 20, np.full(people, 100.0)], axis=1)
+    vel = rng.uniform(-1.5, 1.5, size=(people, 2))
+    for f in range(frames):
+        c = start + vel * f + rng.normal(scale=1.0, size=(people, 2))
+        order = rng.permutation(people)                     # 偵測順序每幀不同
+        yield np.hstack([c - 40, c + 40])[order], order
+
+
+@pytest.mark.parametrize("assignment", ["auto", "greedy"])
+def test_steady_crowd_keeps_ids_and_cuts_encodes(assignment):
+    tracker = FaceTracker(assignment=assignment)
+    owner = {}
+    for boxes, truth in _crowd():
+        tracks = tracker.update(boxes)
+        assert len(tracks) == 5
+        for t in tracks:
+            gt = truth[int(np.argmin(np.abs(boxes - t.box).sum(1)))]
+            assert owner.setdefault(t.track_id, gt) == gt   # 同一個 track 永遠是同一人
+            if tracker.needs_encoding(t):
+                tracker.set_identity(t, Match(f"p{gt}", f"p{gt}", 0.3, 0.2))
+    assert len(owner) == 5
+    naive = 300 * 5                                         # 每幀每張臉都萃取
+    assert tracker.encodes <= naive // 10
+
+
+def test_unknown_retries_sooner_and_lost_tracks_expire():
+    tracker = FaceTracker(reverify_every=30, retry_every=5, max_misses=3)
+    box = np.array([[0, 0, 80, 80]], np.float32)
+    (t,) = tracker.update(box)
+    tracker.set_identity(t, Match("Unknown", "amy", 0.7, 0.01))
+    due = [tracker.needs_encoding(tracker.update(box + i)[0]) for i in range(1, 6)]
+    assert due == [False] * 4 + [True]
+
+    # 快速移動（每幀 50 px，IoU < iou_thresh）仍靠中心距離 + 速度預測接上同一個 track
+    tid = t.track_id
+    for step in range(1, 10):
+        (t,) = tracker.update(box + [5 + step * 50, 0, 5 + step * 50, 0])
+        assert t.track_id == tid
+
+    for _ in range(4):
+        assert tracker.update(np.empty((0, 4))) == []
+    assert tracker.tracks == []
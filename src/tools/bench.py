@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""bench.py – 偵測 → 萃取 → 比對 全流程的 headless 基準測試
+
+    python -m src.tools.bench face-capture/dataset --detector hog --json-out runs/hog.json
+    python -m src.tools.bench clip.mp4 --detector retina --backend onnx --encoder none
+    python -m src.tools.bench face-capture/dataset --detector ssd --pipelined
+
+• 來源：圖片資料夾或影片；串行模式在量測區間內同步解碼（cv2.imread / VideoCapture.read），
+  --pipelined 走 camera.FrameSource（fifo、不丟幀、全速）
+• 偵測器：hog / cnn（face_recognition）、ssd（OpenCV-DNN res10，face_dnn_detect.py 的模型）、
+  retina（RetinaFace，--backend trt | onnx | cv2 | auto）
+• 萃取器：fr（dlib 128 維）或 none；比對用 FaceMatcher + faces.gallery / faces.pkl
+• 預設逐幀串行執行，分別量 decode / detect / encode / match 每一幀的耗時；
+  --pipelined 改跑 pipeline.RecognitionPipeline（lossless），量各階段與端到端延遲
+• 報告 p50 / p95 / p99、吞吐量（FPS）、峰值 RSS；--json-out 另存 JSON（含 git commit），
+  方便比較不同 commit 的結果
+"""
+from __future__ import annotations
+
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from src.gui_main.camera import IMAGE_EXTS, Frame, FrameSource
+from src.gui_main.pipeline import (Detector, Encoder, LatencyStats, Packet, RecognitionPipeline,
+                                   make_detector, make_encoder)
+from src.gui_main.tracker import FaceTracker
+from src.jetsoncv import startup
+
+ROOT = Path(__file__).resolve().parents[2]
+DETECTORS = ("hog", "cnn", "ssd", "retina")
+STAGES = ("decode", "detect", "encode", "match")
+
+
+def build_detector(name: str, backend: str = "auto", scale: float = 1.0) -> Detector:
+    if name in ("hog", "cnn"):
+        return make_detector("fr", scale, model=name)
+    if name == "ssd":
+        return make_detector("ssd")
+    if name == "retina":
+        return make_detector(backend)
+    raise ValueError(f"未知的偵測器：{name}（可用：{' / '.join(DETECTORS)}）")
+
+
+def peak_rss_mb() -> float:
+    """本行程的峰值 RSS（Linux ru_maxrss 單位為 KB，macOS 為 byte）"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+# ------------------------- 串行量測 ------------------------- #
+class SerialReader:
+    """不經背景執行緒、每次 read() 才解碼一張：decode 階段量到的是真正的解碼時間，
+    而不是等 FrameSource ring buffer 的時間"""
+
+    def __init__(self, source: str | Path):
+        self.source = source
+        self.name = Path(str(source)).name
+        self._files: list[Path] | None = None
+        self._cap = None
+        self._seq = 0
+
+    def __enter__(self) -> "SerialReader":
+        path = Path(str(self.source))
+        if path.is_dir():
+            self._files = sorted(p for p in path.rglob("*") if p.suffix.lower() in IMAGE_EXTS)
+            if not self._files:
+                raise RuntimeError(f"❌ 資料夾內沒有圖片：{self.source}")
+        else:
+            self._cap = cv2.VideoCapture(int(self.source) if str(self.source).isdigit() else str(self.source))
+            if not self._cap.isOpened():
+                raise RuntimeError(f"❌ 無法開啟來源：{self.source}")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def read(self) -> Frame | None:
+        """解碼下一張；讀完回傳 None（讀不出來的圖片略過）"""
+        img: np.ndarray | None = None
+        if self._files is not None:
+            while img is None and self._seq < len(self._files):
+                img = cv2.imread(str(self._files[self._seq]))
+                self._seq += 1
+        else:
+            ok, img = self._cap.read()
+            self._seq += 1
+            if not ok:
+                return None
+        return None if img is None else Frame(img, self._seq, time.monotonic(), self.name)
+
+
+def run_serial(source: SerialReader, detector: Detector, encoder: Encoder | None = None, matcher=None,
+               tracker: FaceTracker | None = None, warmup: int = 2,
+               max_frames: int | None = None) -> dict:
+    """逐幀執行 decode → detect → encode → match，分別記錄每一幀各階段耗時。
+
+    前 warmup 幀（模型載入、CUDA 初始化）不列入統計；tracker 給定時只萃取 encode_queue 的臉。
+    """
+    lat = {name: LatencyStats(window=None) for name in STAGES}
+    total = LatencyStats(window=None)
+    frames = faces = encoded = 0
+    t_start = None
+    with source:
+        while max_frames is None or frames < max_frames + warmup:
+            t0 = time.perf_counter()
+            frame = source.read()
+            if frame is None:
+                break
+            p = Packet(frame)
+            t1 = time.perf_counter()
+            boxes, landmarks = detector(p)
+            t2 = time.perf_counter()
+            tracks = None
+            todo = list(boxes)
+            if tracker is not None:
+                tracks = tracker.encode_queue(tracker.update(boxes, landmarks))
+                todo = [t.box for t in tracks]
+            vecs = encoder(p.rgb, todo) if encoder is not None and todo else None
+            t3 = time.perf_counter()
+            if vecs is not None and matcher is not None:
+                matches = matcher.match(vecs)
+                for t, m in zip(tracks or (), matches):
+                    tracker.set_identity(t, m)
+            t4 = time.perf_counter()
+
+            frames += 1
+            if frames <= warmup:
+                continue
+            if t_start is None:
+                t_start = t0
+            for name, dt in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                lat[name].add(dt)
+            total.add(t4 - t0)
+            faces += len(boxes)
+            encoded += 0 if vecs is None else len(vecs)
+
+    measured = max(0, frames - warmup)
+    elapsed = time.perf_counter() - t_start if t_start is not None else 0.0
+    stages = {name: lat[name].summary() for name in STAGES}
+    stages["total"] = total.summary()
+    return {"mode": "serial", "frames": measured, "warmup": min(frames, warmup),
+            "elapsed_s": elapsed, "fps": measured / elapsed if elapsed > 0 else 0.0,
+            "faces": faces, "encoded": encoded, "stages": stages}
+
+
+def run_pipelined(source: FrameSource, detector: Detector, encoder: Encoder | None = None,
+                  matcher=None, max_frames: int | None = None) -> dict:
+    pipe = RecognitionPipeline(source, detector, encoder, matcher, realtime=False, headless=True,
+                               latency_window=None)
+    stats = pipe.run(max_frames=max_frames)
+    return {"mode": "pipelined", **stats}
+
+
+# ------------------------- 入口 ------------------------- #
+def bench(source: str | Path, detector: str = "hog", backend: str = "auto", encoder: str = "fr",
+          db: Path | None = None, scale: float = 1.0, track: bool = False, pipelined: bool = False,
+          warmup: int = 2, max_frames: int | None = None,
+          detector_fn: Callable | None = None, encoder_fn: Callable | None = None, matcher=None) -> dict:
+    """跑一次基準測試並回傳結果 dict；*_fn / matcher 可直接注入（測試用）"""
+    det = detector_fn or build_detector(detector, backend, scale)
+    enc = encoder_fn
+    if enc is None and encoder != "none":
+        enc = make_encoder(encoder)
+    if enc is not None and matcher is None:
+        from src.facedb import face_database
+        matcher = face_database.load_matcher(db or face_database.DEFAULT_PKL)
+
+    if pipelined:
+        src = FrameSource(source, policy="fifo", drop=False, fps=0, name=Path(str(source)).name)
+        result = run_pipelined(src, det, enc, matcher, max_frames)
+    else:
+        result = run_serial(SerialReader(source), det, enc, matcher, FaceTracker() if track else None,
+                            warmup, max_frames)
+
+    result.update({
+        "source": str(source),
+        "detector": detector if detector != "retina" else f"retina:{backend}",
+        "encoder": "none" if enc is None else encoder,
+        "gallery_size": len(matcher) if matcher is not None else 0,
+        "scale": scale,
+        "track": track,
+        "peak_rss_mb": peak_rss_mb(),
+        "startup": [s._asdict() for s in startup.stages()],
+        "commit": git_commit(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    return result
+
+
+def format_result(r: dict) -> str:
+    lines = [f"🏁 {r['detector']} + {r['encoder']}（{r['mode']}）：{r['frames']} 幀，"
+             f"{r['fps']:.2f} FPS，峰值 RSS {r['peak_rss_mb']:.0f} MB"]
+    for name, s in r["stages"].items():
+        lines.append(f"   {name:<7} p50 {s['p50_ms']:8.2f}  p95 {s['p95_ms']:8.2f}  "
+                     f"p99 {s['p99_ms']:8.2f}  mean {s['mean_ms']:8.2f} ms")
+    if "latency" in r:
+        s = r["latency"]
+        lines.append(f"   端到端  p50 {s['p50_ms']:8.2f}  p95 {s['p95_ms']:8.2f}  p99 {s['p99_ms']:8.2f} ms")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="偵測 / 萃取 / 比對 全流程基準測試")
+    parser.add_argument("source", type=Path, help="圖片資料夾或影片檔")
+    parser.add_argument("--detector", choices=DETECTORS, default="hog")
+    parser.add_argument("--backend", default="auto", help="retina 用：trt | onnx | cv2 | auto")
+    parser.add_argument("--encoder", choices=("fr", "none"), default="fr")
+    parser.add_argument("--db", type=Path, default=None, help="faces.pkl / faces.gallery 路徑")
+    parser.add_argument("--scale", type=float, default=1.0, help="hog / cnn 偵測前縮放")
+    parser.add_argument("--track", action="store_true", help="串行模式下以 FaceTracker 只萃取需要的臉")
+    parser.add_argument("--pipelined", action="store_true", help="改跑多執行緒管線")
+    parser.add_argument("--warmup", type=int, default=2, help="不列入統計的前幾幀")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--json-out", type=Path, default=None, help="結果另存 JSON")
+    args = parser.parse_args(argv)
+
+    result = bench(args.source, args.detector, args.backend, args.encoder, args.db, args.scale,
+                   args.track, args.pipelined, args.warmup, args.max_frames)
+    print(format_result(result))
+    if args.json_out:
+        args.json_out.parent.mkdir(parents=True, exist_ok=True)
+        args.json_out.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+        print(f"💾 已寫入 {args.json_out}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,14 @@
         --engine retinaface.engine \
         --input-shape 1x3x640x640 \
         --fp16
+
+    # 多鏡頭：動態 batch profile（retinaface.onnx 為 NHWC），
+    # RetinaFaceTRT.infer_batch 會依每次張數設定 shape
+    python3 convert2trt.py \
+        --onnx retinaface.onnx \
+        --engine retinaface_b4.engine \
+        --input-shape 1x608x640x3 --opt-shape 4x608x640x3 --max-shape 4x608x640x3 \
+        --fp16
 """
 from __future__ import annotations
 import argparse